@@ -1,26 +1,41 @@
+import io
 import os
 import sys
+import re
+import csv
+import glob
+import heapq
+import math
+import time
+import array
 import logging
 import argparse
 import datetime
-import pytz
+import functools
+import itertools
+import collections
+import concurrent.futures
 
 import xml.sax
+import xml.parsers.expat
 
-logger = logging.getLogger(__name__)
+import clashes
+import localtime
+import filewatch
+import parsecache
 
-local_tz = pytz.timezone('Europe/Stockholm')  # beware of daylight saving
+logger = logging.getLogger(__name__)
 
+PARSE_VERSION = 2  # increase when the parsed lessons change, so old parse cache entries are not used
 
-def utc_to_local(utc_dt):
-    local_dt = utc_dt.replace(tzinfo=pytz.utc).astimezone(local_tz)
-    return local_tz.normalize(local_dt)  # .normalize might be unnecessary
+WEEKDAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')  # as strftime('%a') gives in the C locale
 
 
 class Lesson():
     """
     Class which describes a single lesson.
     """
+    __slots__ = ('name', 'description', 'start', 'stop', 'dt_start', 'dt_stop', 'all_day', 'room', 'teacher')
 
     def __init__(self):
         self.name = ""
@@ -29,6 +44,7 @@ class Lesson():
         self.stop = ""
         self.dt_start = None  # for datetime objects
         self.dt_stop = None
+        self.all_day = False  # lasts whole days, from local midnight to local midnight, without times
         self.room = ""
         self.teacher = ""
 
@@ -41,15 +57,125 @@ class Lesson():
         print("Teacher:".format(self.teacher))
 
 
+class StringColumn():
+    """
+    Column of strings, where each distinct string is only stored once.
+    """
+
+    def __init__(self):
+        self.values = []  # distinct strings
+        self.codes = array.array('I')  # index into self.values for each row
+        self._index = {}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, i):
+        return self.values[self.codes[i]]
+
+    def append(self, s):
+        code = self._index.get(s)
+        if code is None:
+            code = len(self.values)
+            self._index[s] = code
+            self.values.append(s)
+        self.codes.append(code)
+
+
+class LessonTable():
+    """
+    Compact columnar store of lessons, for large exports.
+
+    Start and stop times are kept as UTC epoch seconds (NaN if not set), the all_day flags as bytes, and
+    the text fields as StringColumns. Iterating over the table yields Lesson objects, so a LessonTable can be passed
+    to any of the writers instead of a list of lessons.
+    """
+    _epoch = datetime.datetime(1970, 1, 1)
+    _fields = ('name', 'description', 'room', 'teacher')
+
+    def __init__(self, lessons=()):
+        """
+        lessons: iterable of Lesson objects to store.
+        """
+        self.start = array.array('d')
+        self.stop = array.array('d')
+        self.all_day = bytearray()
+        for field in self._fields:
+            setattr(self, field, StringColumn())
+        self.extend(lessons)
+
+    def __len__(self):
+        return len(self.start)
+
+    def __iter__(self, block_size=4096):
+        # convert times to local time in blocks, which is much faster than one by one
+        for i0 in range(0, len(self), block_size):
+            i1 = min(i0 + block_size, len(self))
+            dt_starts = localtime.epochs_to_local(self.start[i0:i1])
+            dt_stops = localtime.epochs_to_local(self.stop[i0:i1])
+            for i in range(i0, i1):
+                yield self._lesson(i, dt_starts[i - i0], dt_stops[i - i0])
+
+    def __getitem__(self, i):
+        dt_start = dt_stop = None
+        if not math.isnan(self.start[i]):
+            dt_start = localtime.epoch_to_local(self.start[i])
+        if not math.isnan(self.stop[i]):
+            dt_stop = localtime.epoch_to_local(self.stop[i])
+        return self._lesson(i, dt_start, dt_stop)
+
+    def _lesson(self, i, dt_start, dt_stop):
+        """
+        Returns lesson i as a Lesson object, with the already converted local start and stop times.
+        """
+        cl = Lesson()
+        for field in self._fields:
+            setattr(cl, field, getattr(self, field)[i])
+        if dt_start:
+            cl.start = (self._epoch + datetime.timedelta(seconds=self.start[i])).strftime(localtime.DT_STR)
+            cl.dt_start = dt_start
+        if dt_stop:
+            cl.stop = (self._epoch + datetime.timedelta(seconds=self.stop[i])).strftime(localtime.DT_STR)
+            cl.dt_stop = dt_stop
+        cl.all_day = bool(self.all_day[i])
+        return cl
+
+    def append(self, lesson):
+        for field in self._fields:
+            getattr(self, field).append(getattr(lesson, field))
+        self.start.append(lesson.dt_start.timestamp() if lesson.dt_start else math.nan)
+        self.stop.append(lesson.dt_stop.timestamp() if lesson.dt_stop else math.nan)
+        self.all_day.append(lesson.all_day)
+
+    def extend(self, lessons):
+        for lesson in lessons:
+            self.append(lesson)
+
+    def sort(self):
+        """
+        Sort lessons by date in place. Lessons without a start time come first.
+        """
+        order = sorted(range(len(self)), key=lambda i: -math.inf if math.isnan(self.start[i]) else self.start[i])
+        self.start = array.array('d', (self.start[i] for i in order))
+        self.stop = array.array('d', (self.stop[i] for i in order))
+        self.all_day = bytearray(self.all_day[i] for i in order)
+        for field in self._fields:
+            col = getattr(self, field)
+            col.codes = array.array('I', (col.codes[i] for i in order))
+
+
 class StdoutWriter():
     """
     Writes lessons to standard out.
     """
+    fields = ('start', 'stop', 'all_day', 'name', 'teacher', 'room')  # Lesson fields which are shown
 
-    def __init__(self, lessons):
+    def __init__(self, lessons, f=None):
         """
-        Writes lessons to standard out.
+        Writes lessons to standard out, or to the file object f.
         """
+        if f is None:
+            f = sys.stdout
 
         # pretty print to stdout
         iw_saved = 1
@@ -61,43 +187,72 @@ class StdoutWriter():
                 iw = 1
             # add a newline if new week:
             if iw < iw_saved:
-                print("")
+                print("", file=f)
             iw_saved = iw
 
-            if l.dt_start and l.dt_stop:  # TODO: print also if only one of these are set
+            if l.dt_start and l.all_day:
+                print("{:29} {:55} {:30} {:20}".format(l.dt_start.strftime('%Y-%m-%d %a'),
+                                                       l.name,
+                                                       l.teacher,
+                                                       l.room), file=f)
+            elif l.dt_start and l.dt_stop:  # TODO: print also if only one of these are set
                 print("{}-{} {:55} {:30} {:20}".format(l.dt_start.strftime('%Y-%m-%d %a    %H:%M'),
                                                        l.dt_stop.strftime('%H:%M'),
                                                        l.name,
                                                        l.teacher,
-                                                       l.room))
+                                                       l.room), file=f)
             else:
                 print("{}-{} {:55} {:30} {:20}".format("",
                                                        "",
                                                        l.name,
                                                        l.teacher,
-                                                       l.room))
+                                                       l.room), file=f)
+
+
+def open_workbook(filename, constant_memory=False):
+    """
+    Returns a new xlsxwriter Workbook named filename and True, or filename and False if it already is a Workbook.
+    """
+    import xlsxwriter
+
+    if isinstance(filename, xlsxwriter.Workbook):
+        return filename, False
+    return xlsxwriter.Workbook(filename, {'constant_memory': constant_memory}), True
 
 
 class ExcelWriter():
     """
     Class for making excel files
     """
+    fields = ('start', 'stop', 'all_day', 'name', 'teacher', 'room')  # Lesson fields which are shown
 
-    def __init__(self, filename, lessons):
+    # format properties, an xlsxwriter Format is made from these for each workbook
+    format_props = {'bold': {'bold': True},
+                    'date_format': {'num_format': 'mmmm d yyyy'}}
+
+    def __init__(self, filename, lessons, constant_memory=True, sheet_name=None, courses=None):
         """
+        filename: name of the .xlsx file, or an open xlsxwriter Workbook to which a worksheet is added.
+                  An open Workbook is not closed.
+        constant_memory: flush each row to disk once it is written, instead of keeping all cells
+                         in memory until the workbook is closed. Rows are always written in order.
+        sheet_name: name of the worksheet, default is Sheet1, Sheet2, ...
+        courses: course code of each lesson, for sheets which mix several courses.
         """
-        import xlsxwriter
-
-        self.wb = xlsxwriter.Workbook(filename)
-        self.bold = self.wb.add_format({'bold': True})
-        self.date_format = self.wb.add_format({'num_format': 'mmmm d yyyy'})
-        self.ws = self.wb.add_worksheet()
-        self.write_lessons(lessons)
-        self.save()
-
-    def write_lessons(self, lessons):
+        self.wb, self.own_wb = open_workbook(filename, constant_memory)
+        for name, props in self.format_props.items():
+            setattr(self, name, self.wb.add_format(props))
+        self.ws = self.wb.add_worksheet(sheet_name)
+        self.write_lessons(lessons, courses)
+        if self.own_wb:
+            self.save()
+
+    def write_lessons(self, lessons, courses=None):
         """
         Write lessons to open worksheet.
+
+        If the course code of each lesson is given in courses, these are written in an extra column.
+        Cells are written strictly row by row, as needed in constant_memory mode.
         """
 
         row = 0
@@ -106,40 +261,41 @@ class ExcelWriter():
         col_week = col
         col_date = col + 1
         col_start = col + 2
-        col_stop = col + 3
-        col_name = col + 4
-        col_teacher = col + 5
-        col_room = col + 6
 
         iw_saved = 1
 
-        self.ws.write(row, col_date, "Date", self.bold)
-        self.ws.write(row, col_week, "Weekday", self.bold)
-        self.ws.write(row, col_start, "Start", self.bold)
-        self.ws.write(row, col_stop, "Stop", self.bold)
-        self.ws.write(row, col_name, "Title", self.bold)
-        self.ws.write(row, col_teacher, "Teacher", self.bold)
-        self.ws.write(row, col_room, "Location", self.bold)
+        header = ("Weekday", "Date", "Start", "Stop", "Title", "Teacher", "Location")
+        if courses is None:
+            courses = itertools.repeat(None)
+        else:
+            header += ("Course",)
+        self.ws.write_row(row, col_week, header, self.bold)
 
         row += 1
 
-        for l in lessons:
-            if l.dt_start:
-                iw = l.dt_start.isoweekday()
+        for l, course in zip(lessons, courses):
+            dt = l.dt_start
+            if dt:
+                iw = dt.isoweekday()
             else:
                 iw = 1
             if iw < iw_saved:
                 row += 1
             iw_saved = iw
-            if l.dt_start:
-                self.ws.write(row, col_date, l.dt_start.strftime('%Y-%m-%d'),  self.date_format)
-                self.ws.write(row, col_week, l.dt_start.strftime('%a'))
-                self.ws.write(row, col_start, l.dt_start.strftime('%H:%M'))
-            if l.dt_stop:
-                self.ws.write(row, col_stop, l.dt_stop.strftime('%H:%M'))
-            self.ws.write(row, col_name, l.name)
-            self.ws.write(row, col_teacher, l.teacher)
-            self.ws.write(row, col_room, l.room)
+            if dt:
+                self.ws.write(row, col_week, WEEKDAYS[iw - 1])
+                self.ws.write(row, col_date, "{:04d}-{:02d}-{:02d}".format(dt.year, dt.month, dt.day),
+                              self.date_format)
+                _start = "{:02d}:{:02d}".format(dt.hour, dt.minute)
+            else:
+                _start = None
+            if l.all_day:
+                _start = _stop = None
+            elif l.dt_stop:
+                _stop = "{:02d}:{:02d}".format(l.dt_stop.hour, l.dt_stop.minute)
+            else:
+                _stop = None
+            self.ws.write_row(row, col_start, (_start, _stop, l.name, l.teacher, l.room, course))
             row += 1
 
     def save(self):
@@ -161,57 +317,49 @@ class IulianaWriter():
              'Sun': 'Sön'
              }
 
-    def __init__(self, filename, lessons, course_name="", course_code=""):
-        """
-        """
-        import xlsxwriter
-
-        font_size = 12
-        font_name = 'Times New Roman'
-
-        self.wb = xlsxwriter.Workbook(filename)
-        self.wb.formats[0].set_font_size(font_size)
-        self.wb.formats[0].set_font_name(font_name)
-
-        # bold text
-        self.bold = self.wb.add_format({'bold': True})
-        self.bold.set_font_size(font_size)
-        self.bold.set_font_name(font_name)
+    fields = ('start', 'stop', 'all_day', 'name')  # Lesson fields which are shown
 
-        # fat overline
-        self.oline = self.wb.add_format()
-        self.oline.set_font_size(font_size)
-        self.oline.set_font_name(font_name)
-        self.oline.set_top(5)
+    font_size = 12
+    font_name = 'Times New Roman'
 
-        # fat overline bold
-        self.obline = self.wb.add_format({'bold': True})
-        self.obline.set_font_size(font_size)
-        self.obline.set_font_name(font_name)
-        self.obline.set_top(5)
+    # format properties, an xlsxwriter Format is made from these for each workbook
+    _font = {'font_size': font_size, 'font_name': font_name}
+    format_props = {'bold': dict(_font, bold=True),  # bold text
+                    'oline': dict(_font, top=5),  # fat overline
+                    'obline': dict(_font, bold=True, top=5),  # fat overline bold
+                    'norm': dict(_font),  # normal format
+                    'header': dict(_font, bold=True, bg_color='black', font_color='white')}  # header bar
 
-        # normal format
-        self.norm = self.wb.add_format()
-        self.norm.set_font_size(font_size)
-        self.norm.set_font_name(font_name)
-
-        # header bar
-        self.header = self.wb.add_format({'bold': True})
-        self.header.set_bg_color('black')
-        self.header.set_font_color('white')
-        self.header.set_font_size(font_size)
-        self.header.set_font_name(font_name)
+    def __init__(self, filename, lessons, course_name="", course_code="", constant_memory=True, sheet_name=None,
+                 courses=None):
+        """
+        filename: name of the .xlsx file, or an open xlsxwriter Workbook to which a worksheet is added.
+                  An open Workbook is not closed.
+        constant_memory: flush each row to disk once it is written, instead of keeping all cells
+                         in memory until the workbook is closed. Rows are always written in order.
+        sheet_name: name of the worksheet, default is Sheet1, Sheet2, ...
+        courses: (course name, course code) of each lesson, for sheets which mix several courses.
+        """
+        self.wb, self.own_wb = open_workbook(filename, constant_memory)
+        self.wb.formats[0].set_font_size(self.font_size)
+        self.wb.formats[0].set_font_name(self.font_name)
+        for name, props in self.format_props.items():
+            setattr(self, name, self.wb.add_format(props))
 
         # self.date_format = self.wb.add_format({'num_format': 'mmmm d yyyy'})
-        self.ws = self.wb.add_worksheet()
+        self.ws = self.wb.add_worksheet(sheet_name)
         self.cname = course_name
         self.ccode = course_code
-        self.write_lessons(lessons)
-        self.save()
+        self.write_lessons(lessons, courses)
+        if self.own_wb:
+            self.save()
 
-    def write_lessons(self, lessons):
+    def write_lessons(self, lessons, courses=None):
         """
         Write lessons to open worksheet.
+
+        courses: (course name, course code) of each lesson, default is self.cname and self.ccode for all.
+        Cells are written strictly row by row, as needed in constant_memory mode.
         """
 
         row = 0
@@ -224,18 +372,11 @@ class IulianaWriter():
         col_kurskod = col + 4
         col_aktivitet = col + 5
         col_foerel = col + 6
-        col_lokal = col + 7
 
         iw_saved = 1
 
-        self.ws.write(row, col_dag, "Dag", self.header)
-        self.ws.write(row, col_datum, "Datum", self.header)
-        self.ws.write(row, col_tid, "Tid", self.header)
-        self.ws.write(row, col_kurs, "Kurs", self.header)
-        self.ws.write(row, col_kurskod, "Kurskod", self.header)
-        self.ws.write(row, col_aktivitet, "Aktivitet", self.header)
-        self.ws.write(row, col_foerel, "Föreläsere", self.header)
-        self.ws.write(row, col_lokal, "Lokal", self.header)
+        self.ws.write_row(row, col_dag, ("Dag", "Datum", "Tid", "Kurs", "Kurskod", "Aktivitet", "Föreläsere", "Lokal"),
+                          self.header)
 
         self.ws.set_column(col_dag, col_dag, 5)
         self.ws.set_column(col_datum, col_datum, 5)
@@ -246,15 +387,20 @@ class IulianaWriter():
 
         row += 1
 
-        _new_day = True
         _last_day = None
         _format = self.norm
         _bformat = self.bold
+        _wdays = [IulianaWriter.wdict[wd] for wd in WEEKDAYS]
+
+        if courses is None:
+            courses = itertools.repeat((self.cname, self.ccode))
+
+        for l, (cname, ccode) in zip(lessons, courses):
+            dt = l.dt_start
 
-        for l in lessons:
             # check if we reached a new week
-            if l.dt_start:
-                iw = l.dt_start.isocalendar()[1]
+            if dt:
+                iw = dt.isocalendar()[1]
             else:
                 iw = 1
             if iw != iw_saved:
@@ -267,40 +413,27 @@ class IulianaWriter():
                 _bformat = self.bold
             iw_saved = iw
 
-            # check for new day:
-            if _last_day:
-                if l.dt_start.date() == _last_day.date():
-                    _new_day = False
-                else:
-                    _new_day = True
-
-            _last_day = l.dt_start
-
-            if l.dt_start:
+            _tid = None
+            if dt:
                 # only write date, if we have a new day
-                if _new_day:
-                    self.ws.write(row, col_dag, IulianaWriter.wdict[l.dt_start.strftime('%a')], _format)
-                    # self.ws.write(row, col_datum, l.dt_start.strftime('%d.%m'),  self.date_format)
-                    self.ws.write(row, col_datum, l.dt_start.strftime('%d.%m'), _format)
-                _start = l.dt_start.strftime('%H:%M')
-            if l.dt_stop:
-                _date = _start + "-" + l.dt_stop.strftime('%H:%M')
-                self.ws.write(row, col_tid, _date, _format)
-
-            self.ws.write(row, col_kurs, self.cname, _format)
-            self.ws.write(row, col_kurskod, self.ccode, _format)
+                _day = dt.date()
+                if _day != _last_day:
+                    self.ws.write_row(row, col_dag, (_wdays[dt.weekday()], "{:02d}.{:02d}".format(dt.day, dt.month)),
+                                      _format)
+                _last_day = _day
+                if l.dt_stop and not l.all_day:
+                    _tid = "{:02d}:{:02d}-{:02d}:{:02d}".format(dt.hour, dt.minute, l.dt_stop.hour, l.dt_stop.minute)
+
+            self.ws.write_row(row, col_tid, (_tid, cname, ccode), _format)
 
             # check if any exam is happening, and translate accordingly
             if l.name.lower() == "exam":
                 self.ws.write(row, col_aktivitet, "TENTAMEN", _bformat)
-                self.ws.write(row, col_foerel, "", _format)
-                self.ws.write(row, col_foerel, "", _format)
+                self.ws.write_row(row, col_foerel, ("", ""), _format)
             else:
                 self.ws.write(row, col_aktivitet, "Föreläsning", _format)
-                self.ws.write(row, col_foerel, l.teacher, _format)
-                self.ws.write(row, col_foerel, "SU", _format)
+                self.ws.write_row(row, col_foerel, ("SU", ""), _format)
 
-            self.ws.write(row, col_lokal, "", _format)
             row += 1
 
     def save(self):
@@ -309,21 +442,209 @@ class IulianaWriter():
         self.wb.close()
 
 
+class ICSWriter():
+    """
+    Class for making iCal .ics files.
+
+    Lessons are serialized directly to text and written to the file event by event, so memory use does not
+    grow with the number of lessons. Times are written in UTC and all-day lessons as dates, and every event
+    gets a UID which is stable as long as the course code (or without one, the input file name), start time
+    and name of the lesson stay the same.
+    """
+    # Lesson fields which are shown
+    fields = ('start', 'stop', 'all_day', 'name', 'description', 'teacher', 'room')
+
+    max_line = 75  # octets per line, longer lines are folded
+
+    def __init__(self, filename, lessons, course_name="", course_code="", description="", source="",
+                 dtstamp=None):
+        """
+        filename: name of the .ics file.
+        course_name, course_code: written as calendar name, the course code also goes into the UIDs.
+        description: written as calendar description.
+        source: name of the input file, the UIDs are based on its base name if there is no course code.
+                Default is filename.
+        dtstamp: datetime of DTSTAMP, default is now.
+        """
+        if dtstamp is None:
+            dtstamp = datetime.datetime.now(datetime.timezone.utc)
+        self.stamp = "DTSTAMP:" + dtstamp.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.ccode = course_code or ""
+        self.source = os.path.basename(source or filename)
+        with open(filename, 'w', encoding='utf-8', newline='') as f:
+            lines = ["BEGIN:VCALENDAR", "VERSION:2.0", "PRODID:-//msftools//athena2xlsx//EN", "CALSCALE:GREGORIAN"]
+            calname = " ".join(s for s in (course_code, course_name) if s)
+            if calname:
+                lines.append(self.fold("X-WR-CALNAME:" + self.escape(calname)))
+            if description:
+                lines.append(self.fold("X-WR-CALDESC:" + self.escape(description)))
+            f.write("\r\n".join(lines) + "\r\n")
+            self.write_lessons(f, lessons)
+            f.write("END:VCALENDAR\r\n")
+
+    @staticmethod
+    def escape(text):
+        """
+        Returns text escaped as iCal TEXT value.
+        """
+        return text.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\r\n", "\\n") \
+            .replace("\n", "\\n")
+
+    @staticmethod
+    def utc(s):
+        """
+        Returns a UTC time string in DT_STR format as iCal UTC DATE-TIME.
+        """
+        return s[0:4] + s[5:7] + s[8:13] + s[14:16] + s[17:19] + "Z"
+
+    def fold(self, line):
+        """
+        Returns line folded to lines of at most max_line octets, without splitting UTF-8 characters.
+        """
+        if len(line) <= self.max_line and line.isascii():
+            return line
+        data = line.encode('utf-8')
+        parts = []
+        i = 0
+        n = self.max_line
+        while len(data) - i > n:
+            j = i + n
+            while data[j] & 0xC0 == 0x80:  # do not break before a UTF-8 continuation byte
+                j -= 1
+            parts.append(data[i:j])
+            i = j
+            n = self.max_line - 1  # room for the leading space of continuation lines
+        parts.append(data[i:])
+        return b"\r\n ".join(parts).decode('utf-8')
+
+    def write_lessons(self, f, lessons):
+        """
+        Write lessons as VEVENTs to the open file f. Lessons without a start time are skipped.
+        """
+        import uuid
+
+        if self.ccode:
+            uid_base = uuid.uuid5(uuid.NAMESPACE_URL, "msftools:" + self.ccode)
+        else:
+            uid_base = uuid.uuid5(uuid.NAMESPACE_URL, "msftools-file:" + self.source)
+        seen = collections.Counter()
+        fold = self.fold
+        escape = self.escape
+        utc = self.utc
+        for cl in lessons:
+            if not cl.start:
+                continue
+            # the n-th lesson of the same start and name gets the same UID each time
+            key = (cl.start, cl.name)
+            seen[key] += 1
+            uid = uuid.uuid5(uid_base, "{}/{}/{}".format(cl.start, cl.name, seen[key]))
+            if cl.all_day:
+                lines = ["BEGIN:VEVENT", "UID:{}".format(uid), self.stamp,
+                         "DTSTART;VALUE=DATE:" + cl.dt_start.strftime("%Y%m%d")]
+                if cl.dt_stop:
+                    lines.append("DTEND;VALUE=DATE:" + cl.dt_stop.strftime("%Y%m%d"))
+            else:
+                lines = ["BEGIN:VEVENT", "UID:{}".format(uid), self.stamp, "DTSTART:" + utc(cl.start)]
+                if cl.stop:
+                    lines.append("DTEND:" + utc(cl.stop))
+            lines.append(fold("SUMMARY:" + escape(cl.name)))
+            if cl.room:
+                lines.append(fold("LOCATION:" + escape(cl.room)))
+            description = "\n".join(s for s in (cl.teacher and "Teacher: " + cl.teacher, cl.description) if s)
+            if description:
+                lines.append(fold("DESCRIPTION:" + escape(description)))
+            lines.append("END:VEVENT\r\n")
+            f.write("\r\n".join(lines))
+
+
+class CourseBookWriter():
+    """
+    Class for making a single excel file with a worksheet for each course, and one with all courses.
+    """
+    all_sheet_name = "All courses"
+
+    def __init__(self, filename, courses, iuliana_format=False, constant_memory=True):
+        """
+        courses: list of (course code, course name, lessons) for each course, lessons must be sorted by date.
+        iuliana_format: write the worksheets with IulianaWriter instead of ExcelWriter.
+        constant_memory: flush each row to disk once it is written, each worksheet is written in order.
+
+        The sheet with all courses is merged from the already sorted lessons, they are not sorted again.
+        """
+        self.wb, own_wb = open_workbook(filename, constant_memory)
+        sheet_names = self.sheet_names(courses)
+
+        # (lesson, course code, course name) of all courses in order of time
+        merged = list(heapq.merge(*(zip(lessons, itertools.repeat(code), itertools.repeat(name))
+                                    for code, name, lessons in courses),
+                                  key=lambda x: x[0].start))
+
+        if iuliana_format:
+            IulianaWriter(self.wb, (m[0] for m in merged), sheet_name=self.all_sheet_name,
+                          courses=((m[2], m[1]) for m in merged))
+            for (code, name, lessons), sheet_name in zip(courses, sheet_names):
+                IulianaWriter(self.wb, lessons, course_name=name, course_code=code, sheet_name=sheet_name)
+        else:
+            ExcelWriter(self.wb, (m[0] for m in merged), sheet_name=self.all_sheet_name,
+                        courses=(m[1] for m in merged))
+            for (code, name, lessons), sheet_name in zip(courses, sheet_names):
+                ExcelWriter(self.wb, lessons, sheet_name=sheet_name)
+
+        if own_wb:
+            self.save()
+
+    def sheet_names(self, courses):
+        """
+        Returns a valid and unique worksheet name for each course, from the course code or name.
+        """
+        names = []
+        used = {self.all_sheet_name.lower()}
+        for i, (code, name, _) in enumerate(courses):
+            base = re.sub(r'[\[\]:*?/\\]', '_', code or name or "Course {}".format(i + 1))[:31]
+            sheet_name = base
+            j = 1
+            while sheet_name.lower() in used:
+                j += 1
+                suffix = " ({})".format(j)
+                sheet_name = base[:31 - len(suffix)] + suffix
+            used.add(sheet_name.lower())
+            names.append(sheet_name)
+        return names
+
+    def save(self):
+        """
+        """
+        self.wb.close()
+
+
 class PlanHandler(xml.sax.ContentHandler):
     """
     How to parse the XML file exported from Athena.
     """
 
-    def __init__(self):
+    def __init__(self, callback=None):
+        """
+        callback: called with each Lesson as soon as its element closes.
+                  Default is to collect them in self.lessons.
+        """
         self.CurrentData = ""
-        self.skip = False
+        self.skip = 0  # nesting depth of <objectives>, which are ignored
         self.lessons = []
         self.cl = None  # current lesson
-        self._dt_str = '%Y-%m-%dT%H:%M:%S'  # date time string format in XML file
+        self._buf = []  # character chunks of the current element
+        if callback:
+            self.callback = callback
+        else:
+            self.callback = self.lessons.append
 
     # Call when an element starts
     def startElement(self, tag, attributes):
+        if tag == "objectives":
+            self.skip += 1
+        if self.skip:
+            return
         self.CurrentData = tag
+        self._buf = []
         if tag == "lesson":
             self.cl = Lesson()
             logger.debug("Found a new lesson")
@@ -331,39 +652,459 @@ class PlanHandler(xml.sax.ContentHandler):
             logger.debug(attributes.items())
             if "colName" in attributes:
                 self.CurrentData = attributes["colName"].lower()
-        if tag == "objectives":
-            self.skip = True
 
     # Call when an elements ends
     def endElement(self, tag):
         if tag == "objectives":
-            self.skip = False
+            self.skip -= 1
+            return
         if self.skip:
             return
+        if self.cl and self._buf:
+            self.set_field(self.CurrentData, "".join(self._buf))
         if tag == "lesson":  # end current lesson
-            self.lessons.append(self.cl)
+            self.callback(self.cl)
+            self.cl = None
         self.CurrentData = ""
+        self._buf = []
 
-    # Call when a character is read
+    # Call when a character is read, large text nodes may arrive in several chunks
     def characters(self, content):
-        # cl = self.lessons[-1]  # current lesson being parsed
-        if self.CurrentData == "name":
+        if self.CurrentData and not self.skip:
+            self._buf.append(content)
+
+    def set_field(self, field, content):
+        """
+        Set a field of the current lesson from the complete text of an element.
+        """
+        if field == "name":
             self.cl.name = content
-        elif self.CurrentData == "description":
+        elif field == "description":
             self.cl.description = content
-        elif self.CurrentData == "start":
+        elif field == "start":
             self.cl.start = content
-            self.cl.dt_start = utc_to_local(datetime.datetime.strptime(content, self._dt_str))
-            logger.debug(self.cl.dt_start.date(), self.cl.dt_start.time())
-        elif self.CurrentData == "stop":
+            self.cl.dt_start = localtime.str_to_local(content)
+            logger.debug("{} {}".format(self.cl.dt_start.date(), self.cl.dt_start.time()))
+        elif field == "stop":
             self.cl.stop = content
-            self.cl.dt_stop = utc_to_local(datetime.datetime.strptime(content, self._dt_str))
-        elif self.CurrentData == "room" or self.CurrentData == "location":  # are made lower case before
+            self.cl.dt_stop = localtime.str_to_local(content)
+        elif field == "room" or field == "location":  # are made lower case before
             self.cl.room = content
-        elif self.CurrentData == "teacher":
+        elif field == "teacher":
             self.cl.teacher = content
 
 
+class ExpatReader():
+    """
+    SAX style parser on pyexpat, without namespaces, which reports elements and text to a ContentHandler.
+
+    Used instead of xml.sax.make_parser(), whose expat reader imports urllib, email and ssl, which takes
+    longer than parsing a typical course. Errors are raised as xml.sax.SAXParseException, as that reader
+    does, also for an empty file ("no element found"). The reader is the locator of its exceptions.
+    """
+
+    def __init__(self, handler):
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.StartElementHandler = handler.startElement
+        self.parser.EndElementHandler = handler.endElement
+        self.parser.CharacterDataHandler = handler.characters
+        self.system_id = None
+
+    def _call(self, parse, *args):
+        try:
+            parse(*args)
+        except xml.parsers.expat.ExpatError as e:
+            raise xml.sax.SAXParseException(xml.parsers.expat.ErrorString(e.code), e, self)
+
+    def feed(self, data):
+        self._call(self.parser.Parse, data, False)
+
+    def close(self):
+        self._call(self.parser.Parse, b"", True)
+
+    def parse(self, source):
+        """
+        Parse a whole file, source is a filename or binary file object.
+        """
+        if hasattr(source, "read"):
+            self.system_id = getattr(source, "name", None)
+            self._call(self.parser.ParseFile, source)
+        else:
+            self.system_id = source
+            with open(source, 'rb') as f:
+                self._call(self.parser.ParseFile, f)
+
+    def getColumnNumber(self):
+        return self.parser.ErrorColumnNumber
+
+    def getLineNumber(self):
+        return self.parser.ErrorLineNumber
+
+    def getPublicId(self):
+        return None
+
+    def getSystemId(self):
+        return self.system_id
+
+
+def make_parser(handler):
+    """
+    Returns a parser for Athena XML files, which reports to handler.
+    """
+    return ExpatReader(handler)
+
+
+def iter_lessons(source, chunk_size=65536):
+    """
+    Generator which yields each Lesson of an Athena XML file as soon as it has been parsed.
+
+    The file is fed to the parser in chunks of chunk_size bytes, so memory usage does not grow
+    with the size of the file. Lessons are yielded in the order they appear in the file.
+
+    source: filename or binary file object.
+    """
+    pending = collections.deque()
+    parser = make_parser(PlanHandler(callback=pending.append))
+
+    if hasattr(source, "read"):
+        f = source
+    else:
+        f = open(source, 'rb')
+    parser.system_id = getattr(f, "name", None)
+
+    try:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            parser.feed(chunk)
+            while pending:
+                yield pending.popleft()
+        parser.close()
+    finally:
+        if f is not source:
+            f.close()
+
+    while pending:
+        yield pending.popleft()
+
+
+def read_lessons(source, cache=None):
+    """
+    Returns a list of all lessons in an Athena XML file, sorted by date.
+
+    cache: optional ParseCache, which is used if source is a filename.
+    """
+    if cache and not hasattr(source, "read"):
+        return cache.load(source, read_lessons, "athena2xlsx {}".format(PARSE_VERSION))
+    return sorted(iter_lessons(source), key=lambda x: getattr(x, 'start'))
+
+
+def _write_text(filename, s):
+    with open(filename, 'w', encoding='utf-8') as f:
+        StdoutWriter(s, f=f)
+
+
+def output_writers(outputs=(), course_name="", course_code="", iuliana_format=False, constant_memory=True, f=None,
+                   source=""):
+    """
+    Returns a list of (name, fields, render) for the outputs, where render(lessons) writes the output and
+    fields are the Lesson fields it shows. source is the name of the input file, see ICSWriter.
+
+    outputs: list of output filenames. Files with the .xlsx suffix are spreadsheets, in Iuliana's format if
+             iuliana_format is set, files with the .txt suffix are text schedules, and "-" is a text schedule
+             written to the file object f (default standard out). Files with the .ics suffix are iCal
+             calendars. The format can also be given as xlsx:FILENAME, iuliana:FILENAME, text:FILENAME or
+             ics:FILENAME.
+    """
+    writers = []
+    for oup in outputs:
+        fmt, sep, filename = oup.partition(":")
+        if not sep or fmt not in ("xlsx", "iuliana", "text", "ics"):
+            filename = oup
+            fmt = {".xlsx": "iuliana" if iuliana_format else "xlsx",
+                   ".txt": "text",
+                   ".ics": "ics"}.get(os.path.splitext(oup)[-1].lower())
+        if oup == "-":
+            writers.append(("text", StdoutWriter.fields, lambda s: StdoutWriter(s, f=f)))
+        elif fmt == "text":
+            writers.append((filename, StdoutWriter.fields, functools.partial(_write_text, filename)))
+        elif fmt == "xlsx":
+            writers.append((filename, ExcelWriter.fields,
+                            functools.partial(ExcelWriter, filename, constant_memory=constant_memory)))
+        elif fmt == "iuliana":
+            writers.append((filename, IulianaWriter.fields,
+                            functools.partial(IulianaWriter, filename, course_name=course_name,
+                                              course_code=course_code, constant_memory=constant_memory)))
+        elif fmt == "ics":
+            writers.append((filename, ICSWriter.fields,
+                            functools.partial(ICSWriter, filename, course_name=course_name, course_code=course_code,
+                                              source=source)))
+        else:
+            raise ValueError("Unknown output format of {}, use .xlsx, .txt or .ics".format(oup))
+    return writers
+
+
+def _render(name, render, s):
+    t = time.perf_counter()
+    render(s)
+    logger.info("Wrote {} in {:.3f} s".format(name, time.perf_counter() - t))
+
+
+def run_writers(writers, s):
+    """
+    Render all (name, fields, render) writers of the same lessons s.
+
+    Several writers run in a pool of threads. They only read the lessons, and most of the time of the
+    spreadsheet writers goes to zlib compression, which releases the GIL.
+    """
+    if len(writers) == 1:
+        name, _, render = writers[0]
+        _render(name, render, s)
+        return
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(writers)) as pool:
+        futures = [pool.submit(_render, name, render, s) for name, _, render in writers]
+    for future in futures:
+        future.result()  # raise the exceptions of the writers
+
+
+def convert(inp, oup=None, course_name="", course_code="", iuliana_format=False, unsorted=False, cache=None,
+            f=None, quiet=False, constant_memory=True):
+    """
+    Convert a single Athena XML file.
+
+    The schedule is written as text to the file object f (default standard out) unless quiet is set, and
+    also to the outputs oup, a filename or a list of them as described in output_writers().
+    Returns the lessons.
+
+    cache: optional ParseCache for the sorted lessons.
+    constant_memory: stream the rows of spreadsheets to disk, see ExcelWriter.
+    """
+    if isinstance(oup, str):
+        oup = [oup]
+    writers = output_writers(oup or (), course_name=course_name, course_code=course_code,
+                             iuliana_format=iuliana_format, constant_memory=constant_memory, f=f, source=inp)
+    if not quiet:
+        writers.append(("text", StdoutWriter.fields, lambda s: StdoutWriter(s, f=f)))
+
+    if unsorted:
+        # keep document order, lessons are only held in memory if more than one writer needs them
+        s = iter_lessons(inp)
+        if len(writers) > 1:
+            s = LessonTable(s)
+    else:
+        # sort by date
+        s = read_lessons(inp, cache)
+
+    if writers:
+        run_writers(writers, s)
+    return s
+
+
+def diff_lessons(old, new):
+    """
+    Compare two lists of lessons.
+
+    Lessons are identified by their start time and name (and how often these occur before), so a lesson
+    which got another teacher or room is changed, but a lesson which moved in time is removed and added.
+    Returns the number of (added, removed, changed) lessons.
+    """
+    def records(lessons):
+        seen = collections.Counter()
+        recs = {}
+        for cl in lessons:
+            key = (cl.start, cl.name)
+            seen[key] += 1
+            recs[key + (seen[key],)] = tuple(getattr(cl, field) for field in Lesson.__slots__)
+        return recs
+
+    old_recs = records(old)
+    new_recs = records(new)
+    added = len(new_recs.keys() - old_recs.keys())
+    removed = len(old_recs.keys() - new_recs.keys())
+    changed = sum(1 for key in new_recs.keys() & old_recs.keys() if new_recs[key] != old_recs[key])
+    return added, removed, changed
+
+
+class Watcher():
+    """
+    Renders a single Athena XML file again whenever it changes.
+
+    Only the outputs which show a field of a lesson that has changed are rendered again.
+    """
+
+    def __init__(self, inp, oup=None, course_name="", course_code="", iuliana_format=False, quiet=False):
+        """
+        oup: output filename or list of them, see output_writers(). The text schedule is written to standard
+             out, unless quiet is set.
+        """
+        self.inp = inp
+        self.lessons = []
+        self.rendered = {}  # fields shown by each output, as they were last rendered
+
+        if isinstance(oup, str):
+            oup = [oup]
+        self.outputs = output_writers(oup or (), course_name=course_name, course_code=course_code,
+                                      iuliana_format=iuliana_format, source=inp)
+        if not quiet:
+            self.outputs.insert(0, ("text", StdoutWriter.fields, lambda s: StdoutWriter(s)))
+
+    def update(self, mtime=None):
+        """
+        Parse the input file and render the affected outputs.
+
+        mtime: modification time of the input file, to report the latency from the change.
+        """
+        s = read_lessons(self.inp)
+        added, removed, changed = diff_lessons(self.lessons, s)
+        self.lessons = s
+
+        names = []
+        writers = []
+        for name, fields, render in self.outputs:
+            shown = [tuple(getattr(cl, field) for field in fields) for cl in s]
+            if shown != self.rendered.get(name):
+                writers.append((name, fields, render))
+                self.rendered[name] = shown
+                names.append(name)
+        if writers:
+            run_writers(writers, s)
+
+        if mtime is None:
+            return
+        if names:
+            rendered = "rendered {} {:.3f} s after the change".format(", ".join(names), time.time() - mtime)
+        else:
+            rendered = "nothing to render"
+        print("{}: {} added, {} removed, {} changed lessons, {}".format(self.inp, added, removed, changed, rendered),
+              file=sys.stderr)
+
+
+def find_inputs(paths):
+    """
+    Returns the list of XML files given by paths, which may be filenames, directories or glob patterns.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.xml"))))
+        elif glob.has_magic(path):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    return files
+
+
+def read_metadata(filename):
+    """
+    Read course codes and names for a batch from a CSV file with lines
+
+        input.xml,FK5031,Radiation Dosimetry
+
+    Returns a dict mapping the basename of the input file to (course code, course name).
+    """
+    meta = {}
+    with open(filename, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith('#'):
+                continue
+            row += [""] * (3 - len(row))
+            meta[os.path.basename(row[0].strip())] = (row[1].strip(), row[2].strip())
+    return meta
+
+
+def _convert_job(job):
+    """
+    Run convert() for one file of a batch, in a worker process.
+
+    job: arguments of convert(), whether the lessons should be returned, whether to skip the text schedule
+         and whether to stream spreadsheets.
+    Returns the text schedule, the time it took and the sorted lessons or None.
+    """
+    args, keep_lessons, quiet, constant_memory = job
+    t = time.perf_counter()
+    f = io.StringIO()
+    s = convert(*args, f=f, quiet=quiet, constant_memory=constant_memory)
+    if not keep_lessons:
+        s = None
+    return f.getvalue(), time.perf_counter() - t, s
+
+
+def convert_batch(infiles, outdir=None, metadata=None, course_name="", course_code="", iuliana_format=False,
+                  unsorted=False, jobs=None, workbook=None, cache=None, check_clashes=False, quiet=False,
+                  constant_memory=True):
+    """
+    Convert many Athena XML files in parallel, using a pool of jobs processes (default: one per CPU).
+
+    If outdir is set, a spreadsheet named after each input file is written there. Text schedules are
+    written to standard out in the order of infiles, unless quiet is set, followed by a timing summary on
+    standard error.
+    If workbook is set, all courses are also written to a single spreadsheet with CourseBookWriter.
+    If check_clashes is set, rooms and teachers booked twice across all files are reported on standard error.
+
+    metadata: dict as returned by read_metadata(), course code and name default to course_code and course_name.
+    constant_memory: stream the rows of the spreadsheets to disk, see ExcelWriter.
+    """
+    metadata = metadata or {}
+    job_list = []
+    courses = []
+    for inp in infiles:
+        ccode, cname = metadata.get(os.path.basename(inp), (course_code, course_name))
+        if outdir:
+            oup = os.path.join(outdir, os.path.splitext(os.path.basename(inp))[0] + ".xlsx")
+        else:
+            oup = None
+        job_list.append(((inp, oup, cname, ccode, iuliana_format, unsorted, cache), bool(workbook or check_clashes),
+                         quiet, constant_memory))
+        courses.append((ccode, cname))
+
+    t = time.perf_counter()
+    if jobs == 1:
+        results = map(_convert_job, job_list)
+        timings, lessons = _print_batch(infiles, results, quiet)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            timings, lessons = _print_batch(infiles, pool.map(_convert_job, job_list), quiet)
+
+    if workbook:
+        CourseBookWriter(workbook, [(code, name, s) for (code, name), s in zip(courses, lessons)],
+                         iuliana_format=iuliana_format, constant_memory=constant_memory)
+    if check_clashes:
+        index = clashes.ClashIndex()
+        for inp, (code, _), s in zip(infiles, courses, lessons):
+            index.add_lessons(s, code or os.path.splitext(os.path.basename(inp))[0])
+        report_clashes(index)
+    t = time.perf_counter() - t
+
+    print("", file=sys.stderr)
+    for inp, dt in zip(infiles, timings):
+        print("{:8.3f} s  {}".format(dt, inp), file=sys.stderr)
+    print("{:8.3f} s  total for {} files ({:.3f} s cpu)".format(t, len(infiles), sum(timings)), file=sys.stderr)
+
+
+def report_clashes(index):
+    """
+    Print the clashes of a ClashIndex to standard error.
+    """
+    print("", file=sys.stderr)
+    n = clashes.print_report(index.clashes(), f=sys.stderr)
+    print("{} clashes of rooms or teachers".format(n), file=sys.stderr)
+
+
+def _print_batch(infiles, results, quiet=False):
+    """
+    Print text schedules of a batch as they arrive, unless quiet is set, and return the lists of timings
+    and lessons.
+    """
+    timings = []
+    lessons = []
+    for inp, (text, dt, s) in zip(infiles, results):
+        if not quiet:
+            print("==> {} <==".format(inp))
+            sys.stdout.write(text)
+            print("")
+        timings.append(dt)
+        lessons.append(s)
+    return timings, lessons
+
+
 def main(args=sys.argv[1:]):
     """
     Main function
@@ -372,15 +1113,43 @@ def main(args=sys.argv[1:]):
     parser = argparse.ArgumentParser(description='Convert an XML file exported from itslearning.com to a nicely '
                                      + 'formatted schedule, chronologically sorted.',
                                      epilog="example: athena2xml.py input.xml  | a2ps -1 -r -l144 -o output.ps")
-    parser.add_argument("infile", help="input XML filename, exported from itslearning.com -> plan -> import/export",
-                        type=str)
+    parser.add_argument("infile", help="input XML filename, exported from itslearning.com -> plan -> import/export. "
+                        + "Several files, directories or glob patterns will be converted as a batch.",
+                        type=str, nargs='+')
     parser.add_argument("-v", "--verbosity", action='count', help="increase output verbosity", default=0)
-    parser.add_argument('-o', '--outfile', nargs='?', type=str,
-                        help='output filename, if suffix is .xlsx then output as spreadsheet')
+    parser.add_argument('-o', '--outfile', action='append', type=str,
+                        help='output filename, if suffix is .xlsx then output as spreadsheet, if .txt as text, '
+                        + 'if .ics as iCal calendar. '
+                        + 'Can be given several times, the outputs are written concurrently. Use iuliana:FILENAME '
+                        + 'or xlsx:FILENAME to choose the spreadsheet format of each output')
     parser.add_argument("-c", "--course-code", help="Course code, e.g. FK5031", type=str)
     parser.add_argument("-n", "--course-name", help="Course name, e.g. Radiation Dosimetry", type=str)
     parser.add_argument("-i", "--iuliana-format", action='store_true',
                         help="output to Iuliana style formatted Excell .xlsx file")
+    parser.add_argument("-q", "--quiet", action='store_true',
+                        help="do not write the schedule to standard out")
+    parser.add_argument("-u", "--unsorted", action='store_true',
+                        help="keep the order of the XML file and stream lessons as they are parsed, "
+                        + "for very large exports")
+    parser.add_argument("--in-memory", action='store_true',
+                        help="keep spreadsheets in memory until they are saved, instead of streaming their rows "
+                        + "to disk")
+    parser.add_argument("-d", "--outdir", type=str,
+                        help="batch mode: write an .xlsx file for each input file to this directory")
+    parser.add_argument("-m", "--metadata", type=str,
+                        help="batch mode: CSV file with lines 'input.xml,course code,course name'")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="batch mode: number of parallel processes, default is one per CPU")
+    parser.add_argument("-w", "--workbook", type=str,
+                        help="batch mode: also write all courses to this .xlsx file, one sheet per course "
+                        + "and one with all courses")
+    parser.add_argument("--watch", action='store_true',
+                        help="keep running, and render the outputs again whenever the input file changes")
+    parser.add_argument("--clashes", action='store_true',
+                        help="report rooms and teachers which are booked twice at the same time, across all "
+                        + "input files, on standard error")
+    parser.add_argument("--no-cache", action='store_true', help="do not use the parse cache")
+    parser.add_argument("--clear-cache", action='store_true', help="clear the parse cache before converting")
 
     parsed_args = parser.parse_args(args)
 
@@ -395,34 +1164,59 @@ def main(args=sys.argv[1:]):
     ccode = parsed_args.course_code
     iform = parsed_args.iuliana_format
 
-    inp = parsed_args.infile
-    oup = parsed_args.outfile
-    if oup:
-        oup_ext = os.path.splitext(oup)[-1].lower()
-    else:
-        oup_ext = ""
+    infiles = find_inputs(parsed_args.infile)
 
-    parser = xml.sax.make_parser()
-    # turn off namepsaces
-    parser.setFeature(xml.sax.handler.feature_namespaces, 0)
-
-    # override the default ContextHandler
-    handler = PlanHandler()
-    parser.setContentHandler(handler)
-    parser.parse(inp)
-
-    # sort by date
-    s = sorted(handler.lessons, key=lambda x: getattr(x, 'start'))
-
-    if oup_ext == ".xlsx":
-        if iform:
-            IulianaWriter(oup, s, course_name=cname, course_code=ccode)
+    if parsed_args.no_cache:
+        cache = None
+    else:
+        cache = parsecache.ParseCache()
+        if parsed_args.clear_cache:
+            cache.clear()
+
+    try:
+        output_writers(parsed_args.outfile or ())
+    except ValueError as e:
+        parser.error(str(e))
+
+    if parsed_args.clashes and parsed_args.unsorted:
+        parser.error("--clashes cannot be used with -u/--unsorted")
+
+    if len(infiles) > 1 or parsed_args.outdir or parsed_args.metadata or parsed_args.workbook:
+        if parsed_args.outfile:
+            parser.error("use -d/--outdir instead of -o/--outfile for several input files")
+        if parsed_args.watch:
+            parser.error("--watch works with a single input file")
+        if parsed_args.workbook and parsed_args.unsorted:
+            parser.error("-w/--workbook needs lessons sorted by date, it cannot be used with -u/--unsorted")
+        if parsed_args.outdir:
+            os.makedirs(parsed_args.outdir, exist_ok=True)
+        if parsed_args.metadata:
+            metadata = read_metadata(parsed_args.metadata)
         else:
-            ExcelWriter(oup, s)
-
-    StdoutWriter(s)
+            metadata = None
+        convert_batch(infiles, parsed_args.outdir, metadata, course_name=cname, course_code=ccode,
+                      iuliana_format=iform, unsorted=parsed_args.unsorted, jobs=parsed_args.jobs,
+                      workbook=parsed_args.workbook, cache=cache, check_clashes=parsed_args.clashes,
+                      quiet=parsed_args.quiet, constant_memory=not parsed_args.in_memory)
+    elif parsed_args.watch:
+        w = Watcher(infiles[0], parsed_args.outfile, course_name=cname, course_code=ccode, iuliana_format=iform,
+                    quiet=parsed_args.quiet)
+        w.update()
+        filewatch.watch(infiles[0], w.update)
+    else:
+        s = convert(infiles[0], parsed_args.outfile, course_name=cname, course_code=ccode, iuliana_format=iform,
+                    unsorted=parsed_args.unsorted, cache=cache, quiet=parsed_args.quiet,
+                    constant_memory=not parsed_args.in_memory)
+        if parsed_args.clashes:
+            index = clashes.ClashIndex()
+            index.add_lessons(s, ccode or os.path.splitext(os.path.basename(infiles[0]))[0])
+            report_clashes(index)
+        if cache:
+            logger.info(cache.stats())
 
 
 if __name__ == '__main__':
-    logging.basicConfig()
-    sys.exit(main(sys.argv[1:]))
+    # run the imported module, so Lessons in the parse cache are pickled as athena2xlsx.Lesson,
+    # which the other tools can load, and not as __main__.Lesson
+    import athena2xlsx
+    sys.exit(athena2xlsx.main(sys.argv[1:]))
@@ -0,0 +1,311 @@
+"""
+Benchmarks for athena2xlsx on synthetic itslearning exports.
+
+example: python benchmarks/bench_athena2xlsx.py parse -s 10000 100000 1000000
+"""
+import os
+import sys
+import time
+import argparse
+import resource
+import datetime
+import tempfile
+import tracemalloc
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import athena2xlsx  # noqa: E402
+import localtime  # noqa: E402
+
+
+def write_export(filename, nlessons):
+    """
+    Write a synthetic Athena XML export with nlessons lessons, four per working day.
+    """
+    t0 = datetime.datetime(2018, 1, 1, 8, 0, 0)
+    with open(filename, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<plan>\n<lessons>\n')
+        for i in range(nlessons):
+            day, slot = divmod(i, 4)
+            week, wday = divmod(day, 5)
+            start = t0 + datetime.timedelta(weeks=week, days=wday, hours=2 * slot)
+            stop = start + datetime.timedelta(hours=1, minutes=45)
+            f.write('<lesson>\n'
+                    '  <name>Lecture {0}: Radiation dosimetry</name>\n'
+                    '  <description>Chapter {1} and exercises &amp; problems {0}</description>\n'
+                    '  <start>{2:%Y-%m-%dT%H:%M:%S}</start>\n'
+                    '  <stop>{3:%Y-%m-%dT%H:%M:%S}</stop>\n'
+                    '  <objectives><objective><name>Objective {0}</name></objective></objectives>\n'
+                    '  <customs>\n'
+                    '    <custom colName="Room">FA{4}</custom>\n'
+                    '    <custom colName="Teacher">Teacher {5}</custom>\n'
+                    '  </customs>\n'
+                    '</lesson>\n'.format(i, i % 20, start, stop, 30 + i % 4, i % 7))
+        f.write('</lessons>\n</plan>\n')
+
+
+def maxrss_mb():
+    """
+    Peak resident set size of this process in MB.
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+def run_parse(filename, engine):
+    """
+    Parse filename with the given engine and return (number of lessons, seconds).
+    """
+    t = time.perf_counter()
+    if engine == "sax":
+        # the old way: collect all lessons, then sort
+        handler = athena2xlsx.PlanHandler()
+        athena2xlsx.make_parser(handler).parse(filename)
+        n = len(sorted(handler.lessons, key=lambda x: getattr(x, 'start')))
+    else:
+        n = 0
+        for _ in athena2xlsx.iter_lessons(filename):
+            n += 1
+    return n, time.perf_counter() - t
+
+
+def bench_parse(sizes):
+    print("{:>10} {:>8} {:>12} {:>10}".format("lessons", "engine", "lessons/s", "RSS [MB]"))
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, "export.xml")
+            write_export(fn, size)
+            for engine in ("sax", "stream"):
+                # new process for each run, so peak RSS is not shared
+                out = subprocess.check_output([sys.executable, __file__, "_parse", fn, engine])
+                n, dt, rss = out.split()
+                print("{:>10} {:>8} {:12.0f} {:10.1f}".format(int(n), engine, int(n) / float(dt), float(rss)))
+
+
+def run_xlsx(filename, writer, constant_memory):
+    """
+    Stream the lessons of filename into an xlsx writer and return (number of rows, seconds).
+    """
+    rows = []
+
+    def lessons():
+        for cl in athena2xlsx.iter_lessons(filename):
+            rows.append(None)  # just count
+            yield cl
+
+    with tempfile.TemporaryDirectory() as d:
+        oup = os.path.join(d, "out.xlsx")
+        t = time.perf_counter()
+        if writer == "excel":
+            athena2xlsx.ExcelWriter(oup, lessons(), constant_memory=constant_memory)
+        else:
+            athena2xlsx.IulianaWriter(oup, lessons(), course_name="Radiation Dosimetry", course_code="FK5031",
+                                      constant_memory=constant_memory)
+        return len(rows), time.perf_counter() - t
+
+
+def bench_xlsx(sizes):
+    print("{:>10} {:>8} {:>16} {:>10} {:>10}".format("rows", "writer", "constant_memory", "rows/s", "RSS [MB]"))
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, "export.xml")
+            write_export(fn, size)
+            for writer in ("excel", "iuliana"):
+                for cm in ("0", "1"):
+                    out = subprocess.check_output([sys.executable, __file__, "_xlsx", fn, writer, cm])
+                    n, dt, rss = out.split()
+                    rate = int(n) / float(dt)
+                    print("{:>10} {:>8} {:>16} {:10.0f} {:10.1f}".format(int(n), writer, str(cm == "1"),
+                                                                         rate, float(rss)))
+
+
+class DictLesson():
+    """
+    Lesson as it was before __slots__, with a per-instance __dict__.
+    """
+
+    def __init__(self, lesson):
+        self.name = lesson.name
+        self.description = lesson.description
+        self.start = lesson.start
+        self.stop = lesson.stop
+        self.dt_start = lesson.dt_start
+        self.dt_stop = lesson.dt_stop
+        self.room = lesson.room
+        self.teacher = lesson.teacher
+
+
+def measure(build, *args):
+    """
+    Returns the memory in MB held by the object returned by build(*args).
+    """
+    tracemalloc.start()
+    obj = build(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size / 1024.0**2
+
+
+def bench_memory(sizes):
+    stores = (("dict Lesson list", lambda fn: [DictLesson(cl) for cl in athena2xlsx.iter_lessons(fn)]),
+              ("slots Lesson list", lambda fn: list(athena2xlsx.iter_lessons(fn))),
+              ("LessonTable", lambda fn: athena2xlsx.LessonTable(athena2xlsx.iter_lessons(fn))))
+    print("{:>10} {:>20} {:>12} {:>14}".format("lessons", "store", "memory [MB]", "bytes/lesson"))
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as d:
+            fn = os.path.join(d, "export.xml")
+            write_export(fn, size)
+            for name, build in stores:
+                mb = measure(build, fn)
+                print("{:>10} {:>20} {:12.1f} {:14.0f}".format(size, name, mb, mb * 1024.0**2 / size))
+
+
+def make_lessons(nlessons):
+    """
+    Returns a list of nlessons Lessons, four per working day, with long and non-ASCII names every so often.
+    """
+    t0 = datetime.datetime(2018, 1, 1, 7, 0, 0)  # UTC
+    lessons = []
+    for i in range(nlessons):
+        day, slot = divmod(i, 4)
+        week, wday = divmod(day, 5)
+        start = t0 + datetime.timedelta(weeks=week, days=wday, hours=2 * slot)
+        stop = start + datetime.timedelta(hours=1, minutes=45)
+        cl = athena2xlsx.Lesson()
+        cl.name = "Lecture {}: Radiation dosimetry".format(i)
+        if i % 10 == 0:
+            cl.name += ", Föreläsning om strålningsdosimetri; kalibrering av jonkammare och Monte Carlo-metoder"
+        cl.description = "Chapter {} and exercises & problems {}\nBring a calculator".format(i % 20, i)
+        cl.start = start.strftime(localtime.DT_STR)
+        cl.stop = stop.strftime(localtime.DT_STR)
+        cl.dt_start = localtime.utc_to_local(start.replace(tzinfo=datetime.timezone.utc))
+        cl.dt_stop = localtime.utc_to_local(stop.replace(tzinfo=datetime.timezone.utc))
+        cl.room = "FA{}".format(30 + i % 4)
+        cl.teacher = "Teacher {}".format(i % 7)
+        lessons.append(cl)
+    return lessons
+
+
+def write_icalendar(filename, lessons, course_name, course_code):
+    """
+    Write lessons with an icalendar.Calendar, as ICSWriter does.
+    """
+    import uuid
+    from icalendar import Calendar, Event
+
+    cal = Calendar()
+    cal.add('prodid', '-//msftools//athena2xlsx//EN')
+    cal.add('version', '2.0')
+    cal.add('x-wr-calname', course_code + " " + course_name)
+    stamp = datetime.datetime.now(datetime.timezone.utc)
+    for cl in lessons:
+        ev = Event()
+        ev.add('uid', str(uuid.uuid4()))
+        ev.add('dtstamp', stamp)
+        ev.add('dtstart', datetime.datetime.strptime(cl.start, localtime.DT_STR).replace(tzinfo=datetime.timezone.utc))
+        ev.add('dtend', datetime.datetime.strptime(cl.stop, localtime.DT_STR).replace(tzinfo=datetime.timezone.utc))
+        ev.add('summary', cl.name)
+        ev.add('location', cl.room)
+        ev.add('description', "Teacher: " + cl.teacher + "\n" + cl.description)
+        cal.add_component(ev)
+    with open(filename, 'wb') as f:
+        f.write(cal.to_ical())
+
+
+def check_ics(filename):
+    """
+    Check an ICSWriter file against the lessons it was made from, by parsing it with icalendar.
+    """
+    from icalendar import Calendar
+
+    lessons = make_lessons(200)
+    athena2xlsx.ICSWriter(filename, lessons, course_name="Radiation Dosimetry", course_code="FK5031")
+    with open(filename, 'rb') as f:
+        data = f.read()
+    assert all(len(line) <= 75 for line in data.split(b"\r\n")), "line longer than 75 octets"
+    cal = Calendar.from_ical(data)
+    assert str(cal['X-WR-CALNAME']) == "FK5031 Radiation Dosimetry"
+    events = cal.walk('VEVENT')
+    assert len(events) == len(lessons)
+    for ev, cl in zip(events, lessons):
+        assert str(ev['SUMMARY']) == cl.name
+        assert str(ev['LOCATION']) == cl.room
+        assert str(ev['DESCRIPTION']) == "Teacher: " + cl.teacher + "\n" + cl.description
+        assert ev.decoded('DTSTART') == cl.dt_start, (ev.decoded('DTSTART'), cl.dt_start)
+        assert ev.decoded('DTEND') == cl.dt_stop
+    # same UIDs when written again
+    athena2xlsx.ICSWriter(filename + "2", lessons, course_name="Radiation Dosimetry", course_code="FK5031")
+    with open(filename + "2", 'rb') as f:
+        again = Calendar.from_ical(f.read()).walk('VEVENT')
+    assert [str(ev['UID']) for ev in events] == [str(ev['UID']) for ev in again]
+    assert len(set(str(ev['UID']) for ev in events)) == len(events)
+    print("ICSWriter output of {} lessons parses to the same events with icalendar".format(len(lessons)))
+
+
+def bench_ics(sizes):
+    with tempfile.TemporaryDirectory() as d:
+        check_ics(os.path.join(d, "check.ics"))
+        print("{:>10} {:>12} {:>10} {:>12}".format("lessons", "writer", "time [s]", "lessons/s"))
+        for size in sizes:
+            lessons = make_lessons(size)
+            for name, write in (("ICSWriter", lambda fn: athena2xlsx.ICSWriter(fn, lessons, "Radiation Dosimetry",
+                                                                               "FK5031")),
+                                ("icalendar", lambda fn: write_icalendar(fn, lessons, "Radiation Dosimetry",
+                                                                         "FK5031"))):
+                fn = os.path.join(d, name + ".ics")
+                t = time.perf_counter()
+                write(fn)
+                dt = time.perf_counter() - t
+                print("{:>10} {:>12} {:10.3f} {:12.0f}".format(size, name, dt, size / dt))
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Benchmarks for athena2xlsx.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("parse", help="parse throughput and peak memory, list vs. streaming reader")
+    p.add_argument("-s", "--sizes", nargs='+', type=int, default=[10000, 100000],
+                   help="number of lessons in synthetic exports")
+
+    p = sub.add_parser("memory", help="memory held by the parsed lessons, objects vs. LessonTable")
+    p.add_argument("-s", "--sizes", nargs='+', type=int, default=[100000],
+                   help="number of lessons in synthetic exports")
+
+    p = sub.add_parser("xlsx", help="xlsx writer throughput and peak memory, default vs. constant_memory mode")
+    p.add_argument("-s", "--sizes", nargs='+', type=int, default=[100000],
+                   help="number of lessons in synthetic exports")
+
+    p = sub.add_parser("ics", help="ICSWriter against building an icalendar.Calendar, after a correctness check")
+    p.add_argument("-s", "--sizes", nargs='+', type=int, default=[100000],
+                   help="number of lessons")
+
+    p = sub.add_parser("_xlsx")  # internal, runs a single writer
+    p.add_argument("filename")
+    p.add_argument("writer")
+    p.add_argument("constant_memory")
+
+    p = sub.add_parser("_parse")  # internal, runs a single parse
+    p.add_argument("filename")
+    p.add_argument("engine")
+
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.bench == "parse":
+        bench_parse(parsed_args.sizes)
+    elif parsed_args.bench == "memory":
+        bench_memory(parsed_args.sizes)
+    elif parsed_args.bench == "xlsx":
+        bench_xlsx(parsed_args.sizes)
+    elif parsed_args.bench == "ics":
+        bench_ics(parsed_args.sizes)
+    elif parsed_args.bench == "_xlsx":
+        n, dt = run_xlsx(parsed_args.filename, parsed_args.writer, parsed_args.constant_memory == "1")
+        print(n, dt, maxrss_mb())
+    elif parsed_args.bench == "_parse":
+        n, dt = run_parse(parsed_args.filename, parsed_args.engine)
+        print(n, dt, maxrss_mb())
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,97 @@
+"""
+Benchmark of the clash detection on synthetic department schedules.
+
+example: python benchmarks/bench_clashes.py -c 2000 -l 100
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import datetime
+import itertools
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import clashes  # noqa: E402
+import localtime  # noqa: E402
+
+
+def schedule(ncourses, nlessons, nrooms, nteachers, seed=1):
+    """
+    Returns a list of (course, name, start, stop, room, teacher) of random lessons in the slots of one term.
+    """
+    rng = random.Random(seed)
+    t0 = localtime.local_tz.localize(datetime.datetime(2019, 9, 2, 8, 0))
+    slots = [t0 + datetime.timedelta(days=7 * w + d, hours=2 * h)
+             for w in range(20) for d in range(5) for h in range(5)]
+    lessons = []
+    for c in range(ncourses):
+        for i in range(nlessons):
+            start = rng.choice(slots)
+            stop = start + datetime.timedelta(minutes=rng.choice((45, 105, 165)))
+            room = "R{}".format(rng.randrange(nrooms))
+            teacher = "Teacher {}".format(rng.randrange(nteachers))
+            lessons.append(("C{}".format(c), "Lesson {}".format(i), start, stop, room, teacher))
+    return lessons
+
+
+def brute_force(lessons):
+    """
+    Returns the clashes as a set of (kind, resource, lesson, lesson), by comparing all pairs.
+    """
+    found = set()
+    for a, b in itertools.combinations(range(len(lessons)), 2):
+        la, lb = lessons[a], lessons[b]
+        if la[2] < lb[3] and lb[2] < la[3]:
+            for kind, k in (("room", 4), ("teacher", 5)):
+                if la[k] == lb[k]:
+                    found.add((kind, la[k]) + tuple(sorted(((la[0], la[1]), (lb[0], lb[1])))))
+    return found
+
+
+def index(lessons):
+    ix = clashes.ClashIndex()
+    for course, name, start, stop, room, teacher in lessons:
+        ix.add(course, name, start, stop, [room], [teacher])
+    return ix
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Benchmark of clashes.ClashIndex.")
+    parser.add_argument("-c", "--courses", type=int, default=2000, help="number of courses")
+    parser.add_argument("-l", "--lessons", type=int, default=100, help="lessons per course")
+    parser.add_argument("-r", "--rooms", type=int, default=400, help="number of rooms")
+    parser.add_argument("-t", "--teachers", type=int, default=1500, help="number of teachers")
+    parsed_args = parser.parse_args(args)
+
+    # correctness against all pairs, on a small department
+    small = schedule(20, 30, 10, 20)
+    found = set((c.kind, c.resource) + tuple(sorted(((c.first.course, c.first.name), (c.second.course, c.second.name))))
+                for c in index(small).clashes())
+    reference = brute_force(small)
+    assert found == reference, (len(found), len(reference))
+    print("{} lessons: sweep and all pairs agree on {} clashes".format(len(small), len(found)))
+
+    lessons = schedule(parsed_args.courses, parsed_args.lessons, parsed_args.rooms, parsed_args.teachers)
+    t = time.perf_counter()
+    ix = index(lessons)
+    t_index = time.perf_counter() - t
+
+    t = time.perf_counter()
+    n = sum(1 for _ in ix.clashes())
+    t_sweep = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for course, name, start, stop, room, teacher in lessons[:10000]:
+        ix.overlapping("room", room, start, stop)
+    t_query = (time.perf_counter() - t) / min(len(lessons), 10000)
+
+    print("{} lessons of {} courses, {} clashes".format(len(lessons), parsed_args.courses, n))
+    print("{:>20} {:10.3f} s".format("build index", t_index))
+    print("{:>20} {:10.3f} s".format("sweep", t_sweep))
+    print("{:>20} {:10.1f} us".format("overlapping()", t_query * 1e6))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,330 @@
+"""
+Benchmarks for icalpdf and icalnewcourse on synthetic iCal files.
+
+example: python benchmarks/bench_ical.py pdf -n 5000
+"""
+import io
+import os
+import math
+import re
+import sys
+import time
+import argparse
+import datetime
+import tempfile
+import contextlib
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import icalpdf  # noqa: E402
+import icalreader  # noqa: E402
+import icalnewcourse  # noqa: E402
+import termshift  # noqa: E402
+
+
+def write_calendar(filename, nevents):
+    """
+    Write a synthetic iCal file with nevents events, three per day, with long summaries and descriptions.
+    """
+    t0 = datetime.datetime(2018, 11, 19, 8, 0, 0)
+    with open(filename, 'w', newline='') as f:
+        f.write("BEGIN:VCALENDAR\r\n"
+                "VERSION:2.0\r\n"
+                "PRODID:-//msftools//bench//EN\r\n"
+                "X-WR-CALNAME:FK5031 Radiation Dosimetry 2018\r\n"
+                "X-WR-CALDESC:FA3: Lecture hall FA31\\nFB4: Seminar room FB41\r\n")
+        for i in range(nevents):
+            start = t0 + datetime.timedelta(days=i // 3, hours=2 * (i % 3))
+            stop = start + datetime.timedelta(hours=1, minutes=45)
+            f.write("BEGIN:VEVENT\r\n"
+                    "DTSTART:{0:%Y%m%dT%H%M%SZ}\r\n"
+                    "DTEND:{1:%Y%m%dT%H%M%SZ}\r\n"
+                    "DTSTAMP:20180101T000000Z\r\n"
+                    "UID:event-{2}@msftools\r\n"
+                    "SUMMARY:Lecture {2}: interaction of photons and charged particles with matter\r\n"
+                    "LOCATION:{3}\r\n"
+                    "DESCRIPTION:Read chapter {4} in Attix\\, and solve the exercises at the end of \r\n"
+                    " the chapter before the lecture\r\n"
+                    "END:VEVENT\r\n".format(start, stop, i, ("FA3", "FB4")[i % 2], i % 20))
+        f.write("END:VCALENDAR\r\n")
+
+
+def count_pdf_pages(filename):
+    """
+    Count the page objects in a PDF file written by reportlab.
+    """
+    with open(filename, 'rb') as f:
+        return len(re.findall(rb'/Type /Page\b', f.read()))
+
+
+def render_drawstring(fn_out, pages):
+    """
+    Draw the pages with one drawString() per string, as icalpdf did before, for comparison.
+    """
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(fn_out, pagesize=icalpdf.PAGESIZE)
+    for page in pages:
+        for size, x, y, text in page.strings:
+            c.setFont('Helvetica', size)
+            c.drawString(x, y, text)
+        for x0, x1, y in page.lines:
+            c.line(x0, y, x1, y)
+        c.showPage()
+    c.save()
+
+
+def bench_pdf(nevents):
+    with tempfile.TemporaryDirectory() as d:
+        fn_in = os.path.join(d, "cal.ics")
+        fn_out = os.path.join(d, "cal.pdf")
+        write_calendar(fn_in, nevents)
+
+        t = time.perf_counter()
+        calname, caldesc, events = icalpdf.read_calendar(fn_in)
+        t_read = time.perf_counter() - t
+
+        t = time.perf_counter()
+        pages = icalpdf.layout(calname, caldesc, events)
+        t_layout = time.perf_counter() - t
+
+        t = time.perf_counter()
+        npages = icalpdf.render(fn_out, pages)
+        t_render = time.perf_counter() - t
+        assert npages == len(pages) == count_pdf_pages(fn_out), "page count does not match the layout"
+
+        t = time.perf_counter()
+        render_drawstring(fn_out, pages)
+        t_drawstring = time.perf_counter() - t
+
+    print("{} events, {} pages (layout, render and PDF agree)".format(len(events), len(pages)))
+    print("{:>28} {:10.3f} s".format("read_calendar", t_read))
+    print("{:>28} {:10.3f} s".format("layout", t_layout))
+    print("{:>28} {:10.3f} s".format("render, text objects", t_render))
+    print("{:>28} {:10.3f} s".format("render, drawString", t_drawstring))
+
+
+def read_icalendar(filename):
+    """
+    Full parse with icalendar, as icalpdf did before, returning the same properties as icalreader.
+    """
+    from icalendar import Calendar
+
+    with open(filename, 'rb') as g:
+        gcal = Calendar.from_ical(g.read())
+    return [(str(c['SUMMARY']), c.decoded('dtstart'), c.decoded('dtend'), str(c['LOCATION']), str(c['DESCRIPTION']))
+            for c in gcal.walk('VEVENT')]
+
+
+def bench_read(nevents):
+    with tempfile.TemporaryDirectory() as d:
+        fn = os.path.join(d, "cal.ics")
+        write_calendar(fn, nevents)
+
+        t = time.perf_counter()
+        reference = read_icalendar(fn)
+        t_ref = time.perf_counter() - t
+
+        t = time.perf_counter()
+        events = [(ev.summary, ev.dtstart, ev.dtend, ev.location, ev.description)
+                  for ev in icalreader.iter_events(fn)]
+        t_all = time.perf_counter() - t
+
+        # one month out of the middle of the calendar
+        start = (reference[len(reference) // 2][1]).date()
+        end = start + datetime.timedelta(days=30)
+        t = time.perf_counter()
+        n_range = sum(1 for _ in icalreader.iter_events(fn, start, end))
+        t_range = time.perf_counter() - t
+
+    print("{} events, tests/test_icalreader.py checks that icalreader and icalendar agree".format(len(events)))
+    print("{:>34} {:10.3f} s {:10.0f} events/s".format("icalendar Calendar.from_ical", t_ref, len(events) / t_ref))
+    print("{:>34} {:10.3f} s {:10.0f} events/s".format("icalreader.iter_events", t_all, len(events) / t_all))
+    name = "icalreader, {} events in 30 days".format(n_range)
+    print("{:>34} {:10.3f} s {:10.0f} events/s".format(name, t_range, len(events) / t_range))
+
+
+def shift_icalendar(fn_in, fn_out, new_start_date):
+    """
+    Shift a calendar with icalendar, as icalnewcourse did before, for comparison.
+    """
+    from icalendar import Calendar
+
+    with open(fn_in, 'rb') as g:
+        gcal = Calendar.from_ical(g.read())
+    old_start_date = min(icalreader.local_date(c['dtstart'].dt) for c in gcal.walk('VEVENT'))
+    delta = datetime.timedelta(days=(new_start_date - old_start_date).days)
+    for component in gcal.walk('VEVENT'):
+        component['dtstart'].dt += delta
+        component['dtend'].dt += delta
+        component['dtstamp'].dt = datetime.datetime.now()
+    with open(fn_out, 'wb') as f:
+        f.write(gcal.to_ical())
+
+
+def shift_streaming(fn_in, fn_out, new_start_date):
+    """
+    Shift a calendar as icalnewcourse.main does.
+    """
+    with icalnewcourse.read_mapped(fn_in) as data:
+        first = icalnewcourse.find_start(data)
+        with open(fn_out, 'wb') as fout:
+            icalnewcourse.shift_calendar(data, fout, (new_start_date - first).days, first.year, new_start_date.year)
+
+
+def bench_shift(nevents):
+    new_start_date = datetime.date(2019, 11, 20)
+    with tempfile.TemporaryDirectory() as d:
+        fn_in = os.path.join(d, "cal.ics")
+        fn_out = os.path.join(d, "new.ics")
+        fn_ref = os.path.join(d, "ref.ics")
+        write_calendar(fn_in, nevents)
+        size = os.path.getsize(fn_in) / 1024**2
+
+        t = time.perf_counter()
+        shift_icalendar(fn_in, fn_ref, new_start_date)
+        t_ref = time.perf_counter() - t
+
+        t = time.perf_counter()
+        shift_streaming(fn_in, fn_out, new_start_date)
+        t_shift = time.perf_counter() - t
+
+        with icalnewcourse.read_mapped(fn_in) as data:
+            t = time.perf_counter()
+            icalnewcourse.find_start(data)
+            t_scan = time.perf_counter() - t
+
+        # again, for the memory use without the time overhead of tracemalloc
+        tracemalloc.start()
+        shift_streaming(fn_in, fn_out, new_start_date)
+        peak = tracemalloc.get_traced_memory()[1] / 1024**2
+        tracemalloc.stop()
+
+        new = [(ev.dtstart, ev.dtend) for ev in icalreader.iter_events(fn_out)]
+        ref = [(ev.dtstart, ev.dtend) for ev in icalreader.iter_events(fn_ref)]
+        assert new == ref, "streaming shift and icalendar disagree"
+
+    print("{} events, {:.1f} MB (streaming shift and icalendar agree)".format(nevents, size))
+    print("{:>28} {:10.3f} s {:10.1f} MB/s".format("icalendar", t_ref, size / t_ref))
+    print("{:>28} {:10.3f} s {:10.1f} MB/s".format("find_start", t_scan, size / t_scan))
+    print("{:>28} {:10.3f} s {:10.1f} MB/s".format("find_start + shift_calendar", t_shift, size / t_shift))
+    print("{:>28} {:10.2f} MB".format("peak heap memory, streaming", peak))
+
+
+def bench_batch(ncalendars, nterms, nevents, jobs):
+    with tempfile.TemporaryDirectory() as d:
+        entries = []
+        for i in range(ncalendars):
+            fn = os.path.join(d, "course{}.ics".format(i))
+            write_calendar(fn, nevents)
+            entries += [(fn, datetime.date(2019 + k, 11, 20), None) for k in range(nterms)]
+
+        t = time.perf_counter()
+        for fn, start, _ in entries:
+            shift_streaming(fn, icalnewcourse.output_name(fn, start), start)
+        t_single = time.perf_counter() - t
+
+        t = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            icalnewcourse.shift_batch(entries, os.path.join(d, "out"), jobs)
+        t_batch = time.perf_counter() - t
+
+    print("{} calendars of {} events, {} start dates each".format(ncalendars, nevents, nterms))
+    print("{:>28} {:10.3f} s".format("one run per output", t_single))
+    print("{:>28} {:10.3f} s".format("shift_batch", t_batch))
+
+
+def map_dates_python(dates, old_start, new_start):
+    """
+    termshift.map_dates() with per-event date arithmetic, for comparison.
+    """
+    holidays = {}
+    weeks = datetime.timedelta(weeks=math.ceil((new_start - old_start).days / 7))
+
+    def is_holiday(d):
+        if d.year not in holidays:
+            holidays[d.year] = termshift.holidays(d.year)
+        return d in holidays[d.year]
+
+    new = []
+    for d in dates:
+        d = d + weeks
+        if is_holiday(d):
+            while is_holiday(d) or d.weekday() >= 5:
+                d += datetime.timedelta(days=1)
+        new.append(d)
+    return new
+
+
+def bench_weekdays(nevents):
+    # Easter and the holidays around it, Midsummer and New Year
+    assert [termshift.easter(y) for y in (2019, 2020, 2024, 2025)] == [
+        datetime.date(2019, 4, 21), datetime.date(2020, 4, 12), datetime.date(2024, 3, 31), datetime.date(2025, 4, 20)]
+    h = termshift.holidays(2025)
+    assert h[datetime.date(2025, 5, 29)] == "Ascension Day" and h[datetime.date(2025, 6, 20)] == "Midsummer Eve"
+    old = termshift.to_days([datetime.date(2019, 4, 15), datetime.date(2019, 4, 12), datetime.date(2019, 4, 13),
+                             datetime.date(2018, 12, 31), None])
+    new = termshift.map_dates(old, datetime.date(2019, 4, 15), datetime.date(2020, 4, 13))
+    # Easter Monday and Good Friday 2020 move to Tuesday, Saturdays are kept unless they are holidays
+    assert [str(d) for d in new] == ["2020-04-14", "2020-04-14", "2020-04-11", "2019-12-30", "NaT"], new
+    new = termshift.map_dates(old, datetime.date(2019, 4, 15), datetime.date(2020, 1, 1))
+    assert str(new[3]) == "2019-09-23", new
+
+    # events on every day of three years
+    old_start = datetime.date(2018, 1, 1)
+    dates = [old_start + datetime.timedelta(days=i % 1095) for i in range(nevents)]
+    new_start = datetime.date(2019, 1, 2)
+
+    t = time.perf_counter()
+    reference = map_dates_python(dates, old_start, new_start)
+    t_ref = time.perf_counter() - t
+
+    t = time.perf_counter()
+    new = termshift.map_dates(termshift.to_days(dates), old_start, new_start)
+    t_np = time.perf_counter() - t
+    assert list(new) == list(termshift.to_days(reference)), "termshift and the reference disagree"
+
+    print("{} events (checks passed, termshift and per-event mapping agree)".format(nevents))
+    print("{:>28} {:10.3f} s {:10.0f} events/s".format("per event", t_ref, nevents / t_ref))
+    print("{:>28} {:10.3f} s {:10.0f} events/s".format("to_days + map_dates", t_np, nevents / t_np))
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Benchmarks for icalpdf and icalnewcourse.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("pdf", help="layout and rendering time of icalpdf")
+    p.add_argument("-n", "--number", type=int, default=5000, help="number of events")
+
+    p = sub.add_parser("read", help="icalreader against a full parse with icalendar")
+    p.add_argument("-n", "--number", type=int, default=50000, help="number of events")
+
+    p = sub.add_parser("shift", help="icalnewcourse streaming shift against icalendar, after correctness checks")
+    p.add_argument("-n", "--number", type=int, default=50000, help="number of events")
+
+    p = sub.add_parser("batch", help="icalnewcourse batch mode against shifting one file at a time")
+    p.add_argument("-c", "--calendars", type=int, default=40, help="number of calendars")
+    p.add_argument("-t", "--terms", type=int, default=3, help="number of start dates per calendar")
+    p.add_argument("-n", "--number", type=int, default=2000, help="number of events per calendar")
+    p.add_argument("-j", "--jobs", type=int, default=None, help="number of processes")
+
+    p = sub.add_parser("weekdays", help="termshift weekday and holiday mapping against per-event date arithmetic")
+    p.add_argument("-n", "--number", type=int, default=1000000, help="number of events")
+
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.bench == "pdf":
+        bench_pdf(parsed_args.number)
+    elif parsed_args.bench == "read":
+        bench_read(parsed_args.number)
+    elif parsed_args.bench == "shift":
+        bench_shift(parsed_args.number)
+    elif parsed_args.bench == "batch":
+        bench_batch(parsed_args.calendars, parsed_args.terms, parsed_args.number, parsed_args.jobs)
+    elif parsed_args.bench == "weekdays":
+        bench_weekdays(parsed_args.number)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,68 @@
+"""
+Micro-benchmark of localtime against the former strptime + pytz astimezone + normalize path.
+
+example: python benchmarks/bench_localtime.py -n 100000
+"""
+import os
+import sys
+import time
+import argparse
+import datetime
+import pytz
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import localtime  # noqa: E402
+
+
+def old_utc_to_local(utc_dt):
+    local_dt = utc_dt.replace(tzinfo=pytz.utc).astimezone(localtime.local_tz)
+    return localtime.local_tz.normalize(local_dt)
+
+
+def timestamps(n, unique):
+    """
+    Returns n UTC time strings, spread over a few years so DST transitions are crossed.
+
+    unique: number of distinct time strings, as schedules have many repeated times.
+    """
+    t0 = datetime.datetime(2017, 1, 1, 8, 0, 0)
+    return [(t0 + datetime.timedelta(minutes=15 * 97 * (i % unique))).strftime(localtime.DT_STR) for i in range(n)]
+
+
+def timeit(func, strings):
+    t = time.perf_counter()
+    result = func(strings)
+    return result, time.perf_counter() - t
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Benchmark of UTC to local time conversion.")
+    parser.add_argument("-n", "--number", type=int, default=100000, help="number of timestamps")
+    parser.add_argument("-u", "--unique", type=int, default=5000, help="number of distinct timestamps")
+    parsed_args = parser.parse_args(args)
+
+    strings = timestamps(parsed_args.number, parsed_args.unique)
+
+    engines = (
+        ("strptime + pytz", lambda ss: [old_utc_to_local(datetime.datetime.strptime(s, localtime.DT_STR))
+                                        for s in ss]),
+        ("str_to_local (cold)", lambda ss: [localtime.str_to_local(s) for s in ss]),
+        ("str_to_local (warm)", lambda ss: [localtime.str_to_local(s) for s in ss]),
+        ("epochs_to_local", lambda ss: localtime.epochs_to_local(
+            [(localtime.parse(s) - datetime.datetime(1970, 1, 1)).total_seconds() for s in ss])),
+    )
+
+    reference = None
+    print("{:>22} {:>14} {:>8}".format("engine", "timestamps/s", "speedup"))
+    for name, func in engines:
+        result, dt = timeit(func, strings)
+        if reference is None:
+            reference, dt_ref = result, dt
+        # check both the time and the tzinfo
+        assert [(r, r.tzname()) for r in result] == [(r, r.tzname()) for r in reference], name
+        print("{:>22} {:14.0f} {:8.1f}".format(name, len(strings) / dt, dt_ref / dt))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,134 @@
+"""
+Benchmark of the conversion service against running the command line tools, per conversion.
+
+example: python benchmarks/bench_service.py -n 20 -l 200
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+import concurrent.futures
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import convertd  # noqa: E402
+from bench_athena2xlsx import write_export  # noqa: E402
+from bench_ical import write_calendar  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def start_service(jobs, socket_path=None):
+    """
+    Start the service in a new process, and return the process and a function which makes a Client.
+    """
+    cmd = [sys.executable, os.path.join(ROOT, "convertd.py"), "-j", str(jobs)]
+    cmd += ["-s", socket_path] if socket_path else ["-p", "0"]
+    proc = subprocess.Popen(cmd, stderr=subprocess.PIPE, universal_newlines=True)
+    for line in proc.stderr:
+        if line.startswith("Serving"):
+            break
+    else:
+        raise RuntimeError("service did not start")
+    print(line.strip())
+    if socket_path:
+        return proc, lambda: convertd.Client(socket_path=socket_path)
+    port = int(re.search(r"localhost:(\d+)", line).group(1))
+    return proc, lambda: convertd.Client(port=port)
+
+
+def cases(d, nlessons):
+    """
+    Returns a list of (name, CLI command, output file, converter, input file, parameters) of the conversions.
+    """
+    xml = os.path.join(d, "course.xml")
+    ics = os.path.join(d, "course.ics")
+    write_export(xml, nlessons)
+    write_calendar(ics, nlessons)
+    return [("athena2xlsx xlsx", ["athena2xlsx.py", xml, "-q", "--no-cache", "-o", os.path.join(d, "out.xlsx")],
+             os.path.join(d, "out.xlsx"), "athena2xlsx", xml, {'format': 'xlsx'}),
+            ("athena2xlsx text", ["athena2xlsx.py", xml, "--no-cache", "-o", "text:" + os.path.join(d, "out.txt"),
+                                  "-q"],
+             os.path.join(d, "out.txt"), "athena2xlsx", xml, {'format': 'text'}),
+            ("icalpdf", ["icalpdf.py", ics, "--no-cache"], os.path.join(d, "course.pdf"), "icalpdf", ics, {}),
+            ("icalnewcourse", ["icalnewcourse.py", ics, "02.09.2019", os.path.join(d, "new.ics")],
+             os.path.join(d, "new.ics"), "icalnewcourse", ics, {'start': '02.09.2019'})]
+
+
+def comparable(name, data):
+    """
+    Returns data without the parts which change from run to run.
+    """
+    if name.startswith("icalnewcourse"):
+        return re.sub(rb"DTSTAMP:[^\r\n]*", b"", data)
+    if name.startswith("icalpdf"):
+        return None  # has creation times and IDs
+    if name.endswith("xlsx"):
+        return None  # zip file with times
+    return data
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Latency of convertd requests against command line runs.")
+    parser.add_argument("-n", "--number", type=int, default=20, help="number of conversions of each kind")
+    parser.add_argument("-l", "--lessons", type=int, default=200, help="lessons or events per course")
+    parser.add_argument("-j", "--jobs", type=int, default=2, help="worker processes of the service")
+    parser.add_argument("-c", "--clients", type=int, default=4, help="concurrent clients in the throughput test")
+    parser.add_argument("-s", "--socket", action='store_true', help="use a Unix socket instead of TCP")
+    parsed_args = parser.parse_args(args)
+    n = parsed_args.number
+
+    with tempfile.TemporaryDirectory() as d:
+        proc, client = start_service(parsed_args.jobs, os.path.join(d, "convertd.sock") if parsed_args.socket else None)
+        try:
+            c = client()
+            print("{:>18} {:>14} {:>14} {:>8}".format("conversion", "CLI [ms]", "service [ms]", "speedup"))
+            for name, cmd, fn_out, conv, fn_in, params in cases(d, parsed_args.lessons):
+                with open(fn_in, 'rb') as f:
+                    data = f.read()
+                cli = []
+                for _ in range(n):
+                    t = time.perf_counter()
+                    subprocess.run([sys.executable, os.path.join(ROOT, cmd[0])] + cmd[1:], check=True,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+                    cli.append(time.perf_counter() - t)
+                with open(fn_out, 'rb') as f:
+                    expected = f.read()
+                service = []
+                for _ in range(n):
+                    t = time.perf_counter()
+                    out = c.convert(conv, data, **params)
+                    service.append(time.perf_counter() - t)
+                assert comparable(name, out) == comparable(name, expected), name
+                t_cli = statistics.median(cli)
+                t_service = statistics.median(service)
+                print("{:>18} {:14.1f} {:14.1f} {:8.1f}".format(name, t_cli * 1e3, t_service * 1e3, t_cli / t_service))
+            c.close()
+
+            # throughput with concurrent clients, each with its own connection
+            with open(os.path.join(d, "course.ics"), 'rb') as f:
+                data = f.read()
+
+            def work(k):
+                cc = client()
+                for _ in range(n):
+                    cc.convert("icalpdf", data)
+                cc.close()
+
+            t = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(parsed_args.clients) as pool:
+                list(pool.map(work, range(parsed_args.clients)))
+            t = time.perf_counter() - t
+            print("{} clients, {} icalpdf conversions in {:.3f} s, {:.1f} per second".format(
+                parsed_args.clients, parsed_args.clients * n, t, parsed_args.clients * n / t))
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,114 @@
+"""
+Startup time of the command line tools, with python -X importtime.
+
+Every tool is run with --help and on a small input, and the modules it imports are checked against the
+heavy dependencies that run may need. The exit status is 1 if a run imports a heavy module it should not,
+or takes longer to import than the given budget, so this can guard against startup regressions.
+
+example: python benchmarks/bench_startup.py -n 5
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from bench_athena2xlsx import write_export  # noqa: E402
+from bench_ical import write_calendar  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+HEAVY = ('numpy', 'scipy', 'pytz', 'reportlab', 'xlsxwriter', 'icalendar', 'hashlib', 'uuid', 'pickle')
+
+_import_re = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)')
+
+
+def cases(d):
+    """
+    Returns a list of (name, command line arguments, heavy modules the run may import).
+    """
+    xml = os.path.join(d, "course.xml")
+    ics = os.path.join(d, "course.ics")
+    write_export(xml, 20)
+    write_calendar(ics, 20)
+    cases = []
+    for tool in ("athena2xlsx", "icalpdf", "icalnewcourse", "clashes", "schedule"):
+        cases.append(("{} --help".format(tool), [tool + ".py", "--help"], ()))
+    cases += [("athena2xlsx text", ["athena2xlsx.py", xml, "--no-cache"], ('pytz',)),
+              ("athena2xlsx xlsx", ["athena2xlsx.py", xml, "--no-cache", "-q", "-o", os.path.join(d, "c.xlsx")],
+               ('pytz', 'xlsxwriter', 'hashlib')),
+              ("athena2xlsx cached", ["athena2xlsx.py", xml], ('pytz', 'hashlib', 'pickle')),
+              ("icalpdf", ["icalpdf.py", ics, "--no-cache"], ('pytz', 'reportlab', 'hashlib', 'pickle')),
+              ("icalnewcourse", ["icalnewcourse.py", ics, "02.09.2019", os.path.join(d, "new.ics")], ('pytz',)),
+              ("clashes", ["clashes.py", xml, ics, "--no-cache"], ('pytz',))]
+    return cases
+
+
+def run(args):
+    """
+    Run a tool, and return the wall clock time, the total import time in seconds and the set of imported
+    top level packages. The imports are taken from a second run with -X importtime, which slows down imports.
+    """
+    cmd = [sys.executable, os.path.join(ROOT, args[0])] + args[1:]
+    t = time.perf_counter()
+    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT)
+    t = time.perf_counter() - t
+    proc = subprocess.run(cmd[:1] + ["-X", "importtime"] + cmd[1:], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                          universal_newlines=True, cwd=ROOT)
+    total = 0
+    modules = set()
+    for line in proc.stderr.splitlines():
+        m = _import_re.match(line)
+        if not m:
+            continue
+        if not m.group(3):  # imported at top level, its cumulative time includes all nested imports
+            total += int(m.group(2))
+        modules.add(m.group(4).split(".")[0])
+    return t, total * 1e-6, modules
+
+
+def python_startup():
+    """
+    Returns the wall clock time of starting Python without running anything.
+    """
+    t = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"])
+    return time.perf_counter() - t
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Startup time of the command line tools.")
+    parser.add_argument("-n", "--number", type=int, default=5,
+                        help="number of runs of each case, the median is shown")
+    parser.add_argument("-b", "--budget", type=float, default=None,
+                        help="fail if the --help runs take longer than this many ms to import")
+    parsed_args = parser.parse_args(args)
+
+    status = 0
+    with tempfile.TemporaryDirectory() as d:
+        base = statistics.median(python_startup() for _ in range(parsed_args.number))
+        print("{:>20} {:>10} {:>12}  {}".format("case", "wall [ms]", "imports [ms]", "heavy modules"))
+        print("{:>20} {:10.1f} {:>12}".format("python -c pass", base * 1e3, ""))
+        for name, cmd, allowed in cases(d):
+            runs = [run(cmd) for _ in range(parsed_args.number)]
+            wall = statistics.median(r[0] for r in runs)
+            imports = statistics.median(r[1] for r in runs)
+            heavy = sorted(runs[0][2].intersection(HEAVY))
+            unexpected = set(heavy) - set(allowed)
+            print("{:>20} {:10.1f} {:12.1f}  {}".format(name, wall * 1e3, imports * 1e3, " ".join(heavy)))
+            if unexpected:
+                print("{:>20} imports {}, which it should not".format("", " ".join(sorted(unexpected))))
+                status = 1
+            if parsed_args.budget and name.endswith("--help") and imports * 1e3 > parsed_args.budget:
+                print("{:>20} imports take more than {} ms".format("", parsed_args.budget))
+                status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
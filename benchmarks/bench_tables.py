@@ -0,0 +1,275 @@
+"""
+Accuracy and speed of the numerical engines behind the tables in tables/.
+
+example: python benchmarks/bench_tables.py expint -n 100000
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tables"))
+
+from expint import expint, expint_scaled  # noqa: E402
+from sievert import sievert_grid, sievert_points  # noqa: E402
+from lookup import SievertTable, ExpintTable  # noqa: E402
+from prettyfloat import pretty, pretty_array  # noqa: E402
+from tablewriter import SievertResult, WRITERS  # noqa: E402
+
+
+def expint_quad(n, x):
+    """
+    E_n(x) as computed by table_exp_integral.py before, one adaptive integration per x.
+    """
+    from scipy.integrate import quad
+
+    return quad(lambda t: np.exp(-x * t) / t**n, 1, np.inf, epsrel=1e-10)[0]
+
+
+def expint_scaled_quad(n, x):
+    """
+    Reference for x exp(x) E_n(x) = x int_1^inf exp(-x (t - 1)) / t^n dt, which does not overflow.
+    The integrand is split at t = 1 + 50 / x, where it has dropped by exp(-50).
+    """
+    from scipy.integrate import quad
+
+    def f(t):
+        return x * np.exp(-x * (t - 1.0)) / t**n
+
+    t1 = 1.0 + 50.0 / x
+    return quad(f, 1, t1, epsabs=0, epsrel=1e-13, limit=200)[0] + quad(f, t1, np.inf, epsabs=0, epsrel=1e-13)[0]
+
+
+def bench_expint(npoints):
+    """
+    Accuracy and speed of expint, the accuracy is checked in tests/test_tables.py.
+    """
+    from scipy import special
+
+    x = np.logspace(-2, 3, 2001)
+    worst = 0.0
+    print("{:>3} {:>14} {:>14}".format("n", "E_n rel.err.", "scaled rel.err."))
+    for n in range(1, 6):
+        ref = special.expn(n, x)
+        ok = ref > 1e-290  # E_n underflows for large x
+        err = np.max(np.abs(expint(n, x[ok]) / ref[ok] - 1.0))
+        xs = x[::20]
+        ref_scaled = np.array([expint_scaled_quad(n, xx) for xx in xs])
+        err_scaled = np.max(np.abs(expint_scaled(n, xs) / ref_scaled - 1.0))
+        print("{:3d} {:14.2e} {:14.2e}".format(n, err, err_scaled))
+        worst = max(worst, err, err_scaled)
+    print("largest relative error {:.2e} over x = 1e-2 .. 1e3, against scipy.special.expn and quad".format(worst))
+
+    x = np.logspace(-2, 3, npoints)
+    nquad = min(npoints, 1000)
+    t = time.perf_counter()
+    for xx in x[::max(1, npoints // nquad)][:nquad]:
+        expint_quad(1, xx)
+    t_quad = (time.perf_counter() - t) / nquad
+    t = time.perf_counter()
+    expint(1, x)
+    expint(2, x)
+    t_new = (time.perf_counter() - t) / (2 * npoints)
+    t = time.perf_counter()
+    special.expn(1, x)
+    special.expn(2, x)
+    t_scipy = (time.perf_counter() - t) / (2 * npoints)
+    print("{:>32} {:12.3f} us per value".format("np.vectorize(quad)", t_quad * 1e6))
+    print("{:>32} {:12.3f} us per value".format("expint", t_new * 1e6))
+    print("{:>32} {:12.3f} us per value".format("scipy.special.expn", t_scipy * 1e6))
+    print("E_1 and E_2 at {} points: {:.1f} ms instead of {:.1f} s".format(
+        npoints, 2 * npoints * t_new * 1e3, 2 * npoints * t_quad))
+    return 0
+
+
+def sievert_quad(b, theta, **kwargs):
+    """
+    S(b, theta) as computed by table_sievert_integral.py before, one adaptive integration per cell.
+    kwargs are passed on to quad, e.g. for tighter tolerances.
+    """
+    from scipy.integrate import quad
+
+    return quad(lambda t: np.exp(-b / np.cos(t)), 0, theta, **kwargs)[0]
+
+
+def bench_sievert(nb, ntheta):
+    """
+    Accuracy and speed of sievert_grid, the accuracy is checked in tests/test_tables.py.
+    """
+    # accuracy against tight quad, on the printed table and on random points
+    rng = np.random.default_rng(1)
+    bs = np.concatenate(([0.0, 0.001, 0.01, 0.05, 0.1, 0.5, 1, 2, 5, 10, 20, 50, 75], rng.uniform(0, 75, 20)))
+    thetas = np.concatenate((np.radians([0, 1, 2.5, 5, 10, 20, 45, 60, 80, 89, 89.9, 90]),
+                             rng.uniform(0, np.pi / 2, 20)))
+    values, errors = sievert_grid(bs, thetas)
+    ref = np.array([[sievert_quad(b, th, epsabs=0, epsrel=1e-13, limit=500) for th in thetas] for b in bs])
+    err = np.abs(values - ref)
+    rel = np.max(err / np.maximum(ref, 1e-300))
+    print("{} x {} grid: largest error {:.2e} (relative {:.2e}), largest error estimate {:.2e}".format(
+        bs.size, thetas.size, err.max(), rel, errors.max()))
+
+    # per cell quad, as the table was made before, against the grid engine on a dense grid
+    bd = np.linspace(0, 75, nb)
+    td = np.linspace(0, np.pi / 2, ntheta)
+    ncells = 200
+    t = time.perf_counter()
+    for b, th in zip(rng.choice(bd, ncells), rng.choice(td, ncells)):
+        sievert_quad(b, th)
+    t_quad = (time.perf_counter() - t) / ncells
+    t = time.perf_counter()
+    values, errors = sievert_grid(bd, td)
+    t_grid = time.perf_counter() - t
+    print("{:>32} {:12.3f} us per cell".format("quad per cell", t_quad * 1e6))
+    print("{:>32} {:12.3f} us per cell".format("sievert_grid", t_grid / values.size * 1e6))
+    print("{} x {} grid in {:.3f} s instead of {:.0f} s, largest error estimate {:.2e}".format(
+        nb, ntheta, t_grid, t_quad * values.size, errors.max()))
+    return 0
+
+
+def bench_lookup(npoints):
+    """
+    Builds the lookup tables in an empty directory, loads them again, and compares random lookups with the
+    direct evaluation. The accuracy is checked in tests/test_tables.py.
+    """
+    rng = np.random.default_rng(1)
+    with tempfile.TemporaryDirectory() as d:
+        for name, make, direct, args in (
+                ("sievert", SievertTable, sievert_points,
+                 (rng.uniform(0, 120, npoints), rng.uniform(0, np.pi / 2, npoints))),
+                ("expint", ExpintTable, expint,
+                 (rng.integers(1, 6, npoints), np.exp(rng.uniform(np.log(1e-5), np.log(2e3), npoints))))):
+            t = time.perf_counter()
+            make(directory=d)
+            t_build = time.perf_counter() - t
+            t = time.perf_counter()
+            table = make(directory=d)
+            t_load = time.perf_counter() - t
+            t = time.perf_counter()
+            values = table(*args)
+            t_table = (time.perf_counter() - t) / npoints
+            t = time.perf_counter()
+            ref = direct(*args)
+            t_direct = (time.perf_counter() - t) / npoints
+            if name == "sievert":
+                err = np.max(np.abs(values - ref))
+            else:
+                ok = ref > 1e-300  # E_n underflows for large x
+                err = np.max(np.abs(values[ok] / ref[ok] - 1.0))
+            print("{}: built in {:.3f} s, loaded in {:.2f} ms, {:.2%} of the cells computed directly".format(
+                name, t_build, t_load * 1e3, table.direct.mean()))
+            print("{:>32} {:12.3f} us per value".format("table", t_table * 1e6))
+            print("{:>32} {:12.3f} us per value".format(direct.__name__, t_direct * 1e6))
+            print("{:>32} {:12.2e} (tolerance {:.0e})".format("largest error", err, table.tol))
+    return 0
+
+
+def bench_pretty(npoints):
+    """
+    pretty_array against pretty on each value, on random values over many decades and on the values next to
+    the powers of ten, where the number of digits changes. The strings are checked in tests/test_tables.py.
+    """
+    rng = np.random.default_rng(1)
+    powers = 10.0**np.arange(-12, 13)
+    x = np.concatenate((10**rng.uniform(-10, 10, npoints) * rng.choice([-1, 1], npoints), [0.0, -1.0, 1.0],
+                        powers, np.nextafter(powers, 0), np.nextafter(powers, np.inf), -powers))
+    for min_digits, exponent in ((4, 2), (6, 2), (3, -1)):
+        t = time.perf_counter()
+        ref = [pretty(v, min_digits=min_digits, exponent=exponent) for v in x]
+        t_loop = (time.perf_counter() - t) / x.size
+        t = time.perf_counter()
+        new = pretty_array(x, min_digits=min_digits, exponent=exponent)
+        t_array = (time.perf_counter() - t) / x.size
+        different = sum(a != b for a, b in zip(ref, new.tolist()))
+        print("min_digits={} exponent={}: {} of {} strings differ".format(min_digits, exponent, different, x.size))
+        print("{:>32} {:12.3f} us per value".format("pretty", t_loop * 1e6))
+        print("{:>32} {:12.3f} us per value".format("pretty_array", t_array * 1e6))
+    return 0
+
+
+def latex_print(bs, degs, s, f):
+    """
+    The LaTeX block as table_sievert_integral.py printed it before, with print() and pretty() per cell.
+    """
+    rads = (degs / 180.0) * np.pi
+    print("   $\\theta [^\\circ]\\rightarrow$", end=' & ', file=f)
+    for j, d in enumerate(degs):
+        print("{:6.1f}$^\\circ$".format(d), end='\\\\\n' if j >= len(degs) - 1 else ' & ', file=f)
+    print("    $b \\downarrow \\theta [rad] \\rightarrow$ ", end=' & ', file=f)
+    for j, r in enumerate(rads):
+        print(pretty(r, min_digits=6), end='\\\\\n' if j >= len(degs) - 1 else ' & ', file=f)
+    print("\\hline\n\\hline", file=f)
+    for i, b in enumerate(bs):
+        print("{:6.2f}".format(b), end=' & ', file=f)
+        for j in range(len(degs)):
+            print(pretty(s[i][j], min_digits=6), end='\\\\\n' if j >= len(degs) - 1 else ' & ', file=f)
+    print("\n\n", file=f)
+
+
+def bench_writers(nb, ntheta):
+    """
+    The table writers on a large Sievert table, against printing each cell.
+    """
+    import io
+
+    bs = np.linspace(0, 75, nb)
+    degs = np.linspace(0, 90, ntheta)
+    s, errors = sievert_grid(bs, (degs / 180.0) * np.pi)
+    table = SievertResult(bs, degs, s, errors)
+
+    status = 0
+    f = io.StringIO()
+    t = time.perf_counter()
+    for j0 in range(0, ntheta, 6):
+        latex_print(bs, degs[j0:j0 + 6], s[:, j0:j0 + 6], f)
+    t_print = time.perf_counter() - t
+    print("{:>32} {:10.3f} s".format("print and pretty per cell", t_print))
+    for name, write in sorted(WRITERS.items()):
+        t = time.perf_counter()
+        data = write(table)
+        print("{:>32} {:10.3f} s {:12d} bytes".format(name, time.perf_counter() - t, len(data)))
+        if name == "latex" and data != f.getvalue().encode():
+            print("{:>32} differs from the printed table".format(""))
+            status = 1
+    return status
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Benchmarks for the table engines.")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("expint", help="expint against scipy.special.expn and np.vectorize(quad)")
+    p.add_argument("-n", "--number", type=int, default=100000, help="number of x values in the timing")
+
+    p = sub.add_parser("sievert", help="sievert_grid against quad per cell")
+    p.add_argument("-b", "--b-values", type=int, default=2000, help="number of b values in the timing")
+    p.add_argument("-a", "--angles", type=int, default=200, help="number of theta values in the timing")
+
+    p = sub.add_parser("lookup", help="interpolation tables against direct evaluation")
+    p.add_argument("-n", "--number", type=int, default=1000000, help="number of random lookups")
+
+    p = sub.add_parser("pretty", help="pretty_array against pretty for each value")
+    p.add_argument("-n", "--number", type=int, default=1000000, help="number of random values")
+
+    p = sub.add_parser("writers", help="table writers against printing each cell")
+    p.add_argument("-b", "--b-values", type=int, default=2000, help="number of b values")
+    p.add_argument("-a", "--angles", type=int, default=180, help="number of theta values")
+
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.bench == "expint":
+        return bench_expint(parsed_args.number)
+    elif parsed_args.bench == "sievert":
+        return bench_sievert(parsed_args.b_values, parsed_args.angles)
+    elif parsed_args.bench == "lookup":
+        return bench_lookup(parsed_args.number)
+    elif parsed_args.bench == "pretty":
+        return bench_pretty(parsed_args.number)
+    elif parsed_args.bench == "writers":
+        return bench_writers(parsed_args.b_values, parsed_args.angles)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,294 @@
+"""
+Detection of room and teacher double-bookings across schedules.
+
+The bookings of all courses are sorted by room or teacher and start time, and overlapping bookings are
+found in a single sweep, so whole departments can be checked in O(n log n) time (plus the clashes found).
+
+example: python clashes.py courses/*.xml calendars/*.ics
+"""
+import os
+import re
+import sys
+import glob
+import time
+import heapq
+import array
+import bisect
+import logging
+import argparse
+
+import localtime
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('room', 'teacher')
+
+_split_re = re.compile(r'\s*[,;/&]\s*|\s+(?:and|och)\s+')
+
+
+def resources(field):
+    """
+    Returns the list of rooms or teachers in a field of a lesson, which may name several of them
+    separated by , ; / & "and" or "och".
+    """
+    return [r for r in _split_re.split(field.strip()) if r]
+
+
+def _local(dt):
+    """
+    Returns a datetime in local time, naive datetimes are taken as local time already.
+    """
+    if getattr(dt.tzinfo, 'zone', None) == localtime.local_tz.zone:  # e.g. Lessons, nothing to convert
+        return dt
+    return localtime.to_local(dt)
+
+
+class Booking():
+    """
+    A lesson or event which books a room or teacher.
+    """
+    __slots__ = ('course', 'name', 'dt_start', 'dt_stop')
+
+    def __init__(self, course, name, dt_start, dt_stop):
+        self.course = course
+        self.name = name
+        self.dt_start = dt_start  # local time
+        self.dt_stop = dt_stop
+
+
+class Clash():
+    """
+    Two bookings of the same room or teacher which overlap in time.
+    """
+    __slots__ = ('kind', 'resource', 'first', 'second', 'dt_start', 'dt_stop')
+
+    def __init__(self, kind, resource, first, second):
+        self.kind = kind  # 'room' or 'teacher'
+        self.resource = resource
+        self.first = first  # Booking which starts first
+        self.second = second
+        self.dt_start = second.dt_start  # the time both are booked
+        self.dt_stop = min(first.dt_stop, second.dt_stop)
+
+
+class ClashIndex():
+    """
+    Index of the bookings of rooms and teachers.
+
+    Bookings are kept in flat arrays: the start and stop times in epoch seconds, and for each booking
+    the code of its room or teacher. A lesson with several rooms and teachers has one entry for each.
+    """
+
+    def __init__(self):
+        self.start = array.array('d')
+        self.stop = array.array('d')
+        self.codes = array.array('I')  # index into self.keys
+        self.bookings = []  # Booking of each entry
+        self.keys = []  # distinct (kind, resource name in lower case)
+        self.names = []  # resource name as first seen, for each key
+        self._index = {}
+        self._sorted = None  # per key sorted starts, running maximum of stops and entries, for overlapping()
+
+    def __len__(self):
+        return len(self.start)
+
+    def _code(self, kind, resource):
+        key = (kind, resource.casefold())
+        code = self._index.get(key)
+        if code is None:
+            code = len(self.keys)
+            self._index[key] = code
+            self.keys.append(key)
+            self.names.append(resource)
+        return code
+
+    def add(self, course, name, dt_start, dt_stop, rooms=(), teachers=()):
+        """
+        Add a booking of rooms and teachers from dt_start to dt_stop (datetimes, naive ones are local time).
+
+        Bookings without start or stop time, or which end before they start, are ignored.
+        """
+        if dt_start is None or dt_stop is None:
+            return
+        dt_start = _local(dt_start)
+        dt_stop = _local(dt_stop)
+        start = dt_start.timestamp()
+        stop = dt_stop.timestamp()
+        if stop <= start:
+            return
+        booking = Booking(course, name, dt_start, dt_stop)
+        codes = dict.fromkeys(self._code(kind, resource)  # a room given twice is booked once
+                              for kind, names in zip(KINDS, (rooms, teachers)) for resource in names)
+        for code in codes:
+            self.start.append(start)
+            self.stop.append(stop)
+            self.codes.append(code)
+            self.bookings.append(booking)
+        self._sorted = None
+
+    def add_lessons(self, lessons, course=""):
+        """
+        Add the room and teacher bookings of athena2xlsx Lessons (or a LessonTable).
+        """
+        for cl in lessons:
+            self.add(course, cl.name, cl.dt_start, cl.dt_stop, resources(cl.room), resources(cl.teacher))
+
+    def add_events(self, events, course=""):
+        """
+        Add the room bookings of icalreader Events, with their location as room. All-day events are ignored.
+        """
+        for ev in events:
+            if not hasattr(ev.dtstart, 'hour') or not hasattr(ev.dtend, 'hour'):
+                continue
+            self.add(course, ev.summary, ev.dtstart, ev.dtend, resources(ev.location or ""))
+
+    def clashes(self):
+        """
+        Generator of all Clashes, by room or teacher and time.
+
+        All entries are sorted by room or teacher and start time, and swept with a heap of the bookings
+        which have started but not ended; every new booking clashes with those.
+        """
+        codes, start, stop = self.codes, self.start, self.stop
+        order = sorted(range(len(self)), key=lambda i: (codes[i], start[i]))
+        current = None
+        active = []  # heap of (stop, entry) of the current room or teacher
+        for i in order:
+            if codes[i] != current:
+                current = codes[i]
+                active = []
+            while active and active[0][0] <= start[i]:
+                heapq.heappop(active)
+            for _, j in sorted(active, key=lambda a: start[a[1]]):
+                kind = self.keys[current][0]
+                yield Clash(kind, self.names[current], self.bookings[j], self.bookings[i])
+            heapq.heappush(active, (stop[i], i))
+
+    def overlapping(self, kind, resource, dt_start, dt_stop):
+        """
+        Returns the list of Bookings of a room or teacher which overlap the time from dt_start to dt_stop.
+        """
+        code = self._index.get((kind, resource.casefold()))
+        if code is None:
+            return []
+        if self._sorted is None:
+            self._build()
+        starts, max_stops, entries = self._sorted[code]
+        t0 = _local(dt_start).timestamp()
+        t1 = _local(dt_stop).timestamp()
+        # entries before first end before t0, entries from last on start after t1
+        first = bisect.bisect_right(max_stops, t0)
+        last = bisect.bisect_left(starts, t1)
+        return [self.bookings[i] for i in entries[first:last] if self.stop[i] > t0]
+
+    def _build(self):
+        groups = [[] for _ in self.keys]
+        for i, code in enumerate(self.codes):
+            groups[code].append(i)
+        self._sorted = []
+        for entries in groups:
+            entries.sort(key=lambda i: self.start[i])
+            max_stops = []
+            m = -float('inf')
+            for i in entries:
+                m = max(m, self.stop[i])
+                max_stops.append(m)
+            self._sorted.append(([self.start[i] for i in entries], max_stops, entries))
+
+
+def print_report(clashes, f=None):
+    """
+    Print a list of Clashes to the file object f (default standard out), and return their number.
+    """
+    if f is None:
+        f = sys.stdout
+    n = 0
+    for c in clashes:
+        print("{} {}: {:%Y-%m-%d %a %H:%M}-{:%H:%M}".format(c.kind, c.resource, c.dt_start, c.dt_stop), file=f)
+        for b in (c.first, c.second):
+            print("    {:%H:%M}-{:%H:%M}  {}  {}".format(b.dt_start, b.dt_stop, b.course, b.name), file=f)
+        n += 1
+    return n
+
+
+def find_inputs(paths):
+    """
+    Returns the list of Athena XML and iCal files given by paths, which may be filenames, directories or
+    glob patterns.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.xml")) + glob.glob(os.path.join(path, "*.ics"))))
+        elif glob.has_magic(path):
+            files.extend(sorted(glob.glob(path)))
+        else:
+            files.append(path)
+    return files
+
+
+def index_files(filenames, cache=None):
+    """
+    Returns a ClashIndex of the bookings in Athena XML (.xml) and iCal (.ics) files.
+
+    Lessons of an XML file are labelled with the basename of the file, events of an iCal file with the
+    calendar name if it has one.
+    """
+    import athena2xlsx
+    import icalreader
+
+    index = ClashIndex()
+    for filename in filenames:
+        course = os.path.splitext(os.path.basename(filename))[0]
+        if filename.lower().endswith(".ics"):
+            calprops = {}
+            events = list(icalreader.iter_events(filename, calprops=calprops))
+            index.add_events(events, calprops.get("X-WR-CALNAME") or course)
+        else:
+            index.add_lessons(athena2xlsx.read_lessons(filename, cache), course)
+    return index
+
+
+def main(args=sys.argv[1:]):
+    """
+    Report the room and teacher double-bookings in Athena XML and iCal files.
+    """
+    parser = argparse.ArgumentParser(description="Find rooms and teachers which are booked twice at the same time "
+                                     + "in Athena XML exports and iCal calendars.",
+                                     epilog="The exit status is 1 if there are clashes.")
+    parser.add_argument("infile", help="Athena XML (.xml) or iCal (.ics) files, directories or glob patterns",
+                        type=str, nargs='+')
+    parser.add_argument("-v", "--verbosity", action='count', help="increase output verbosity", default=0)
+    parser.add_argument("-k", "--kind", choices=KINDS, help="only report clashes of rooms or of teachers")
+    parser.add_argument("--no-cache", action='store_true', help="do not use the parse cache for XML files")
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.verbosity == 1:
+        logging.basicConfig(level=logging.INFO)
+    elif parsed_args.verbosity > 1:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig()
+
+    cache = None
+    if not parsed_args.no_cache:
+        import parsecache
+        cache = parsecache.ParseCache()
+
+    infiles = find_inputs(parsed_args.infile)
+    t = time.perf_counter()
+    index = index_files(infiles, cache)
+    t_read = time.perf_counter() - t
+
+    t = time.perf_counter()
+    found = (c for c in index.clashes() if parsed_args.kind in (None, c.kind))
+    n = print_report(found)
+    t_sweep = time.perf_counter() - t
+
+    logger.info("Read {} bookings from {} files in {:.3f} s, found {} clashes in {:.3f} s".format(
+        len(index), len(infiles), t_read, n, t_sweep))
+    return 1 if n else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,357 @@
+"""
+Local conversion service, which keeps the converters warm between requests.
+
+Importing pytz, numpy, reportlab and xlsxwriter, and filling the time zone and font caches, takes much
+longer than converting a single course. The service does this once per worker, and then converts files
+sent to it over HTTP on localhost or on a Unix socket. Each request is a POST with the input file as body
+and the options as query string, and the response body is the output file:
+
+    python convertd.py -p 8750 &
+    curl --data-binary @FK5031.xml 'http://localhost:8750/athena2xlsx?format=xlsx' -o FK5031.xlsx
+    curl --data-binary @FK5031.ics 'http://localhost:8750/icalpdf?from=01.09.2019' -o FK5031.pdf
+    curl --data-binary @FK5031.ics 'http://localhost:8750/icalnewcourse?start=02.09.2019&weekdays=1' -o new.ics
+    curl --data-binary @FK5031.xml 'http://localhost:8750/schedule?from=xml&to=pdf' -o FK5031.pdf
+
+GET / lists the converters.
+"""
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import logging
+import argparse
+import datetime
+import tempfile
+import http.client
+import http.server
+import socketserver
+import urllib.parse
+import concurrent.futures
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {'.xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                 '.pdf': 'application/pdf',
+                 '.ics': 'text/calendar; charset=utf-8',
+                 '.txt': 'text/plain; charset=utf-8'}
+
+CONVERTERS = {}  # name: function(input filename, output directory, query parameters) returning the output filename
+
+
+def converter(func):
+    """
+    Register func as converter, under its name without the leading convert_.
+    """
+    CONVERTERS[func.__name__[len("convert_"):]] = func
+    return func
+
+
+def _date(params, key):
+    if key not in params:
+        return None
+    return datetime.datetime.strptime(params[key], '%d.%m.%Y').date()
+
+
+@converter
+def convert_athena2xlsx(fn_in, outdir, params):
+    """
+    Athena XML to format=xlsx (default), iuliana, ics or text, with the course code and name.
+    """
+    import athena2xlsx
+
+    fmt = params.get('format', 'xlsx')
+    if fmt not in ('xlsx', 'iuliana', 'ics', 'text'):
+        raise ValueError("Unknown format {}, use xlsx, iuliana, ics or text".format(fmt))
+    fn_out = os.path.join(outdir, "out" + {'iuliana': '.xlsx', 'text': '.txt'}.get(fmt, '.' + fmt))
+    athena2xlsx.convert(fn_in, "{}:{}".format(fmt, fn_out), course_name=params.get('name', ""),
+                        course_code=params.get('code', ""), quiet=True)
+    return fn_out
+
+
+@converter
+def convert_icalpdf(fn_in, outdir, params):
+    """
+    iCal to PDF, optionally only the events from and to (DD.MM.YYYY, inclusive).
+    """
+    import icalpdf
+
+    start = _date(params, 'from')
+    end = _date(params, 'to')
+    if end:
+        end += datetime.timedelta(days=1)
+    fn_out = os.path.join(outdir, "out.pdf")
+    icalpdf.write_pdf(fn_out, *icalpdf.read_calendar(fn_in, None, start, end))
+    return fn_out
+
+
+@converter
+def convert_icalnewcourse(fn_in, outdir, params):
+    """
+    iCal shifted to a new course start (DD.MM.YYYY), keeping weekdays if weekdays=1.
+    """
+    import icalnewcourse
+
+    if 'start' not in params:
+        raise ValueError("the new start date is required, as start=DD.MM.YYYY")
+    fn_out = os.path.join(outdir, "out.ics")
+    icalnewcourse.shift_file(fn_in, fn_out, _date(params, 'start'), params.get('weekdays', '0') not in ('', '0'))
+    return fn_out
+
+
+@converter
+def convert_schedule(fn_in, outdir, params):
+    """
+    Any schedule input (from=xml or ics) to any output (to=text, xlsx, iuliana, pdf, ical), see schedule.py.
+    """
+    import schedule
+
+    fmt = params.get('to', 'text')
+    if fmt not in schedule.WRITERS:
+        raise ValueError("Unknown output format {}, use one of {}".format(fmt, ", ".join(sorted(schedule.WRITERS))))
+    suffix = {v: k for k, v in schedule.SUFFIXES.items()}.get(fmt, '.xlsx')
+    fn_out = os.path.join(outdir, "out" + suffix)
+    info = {key: params[key] for key in ('name', 'code', 'description') if key in params}
+    schedule.convert(fn_in, [(fmt, fn_out)], info)
+    return fn_out
+
+
+INPUT_SUFFIXES = {'athena2xlsx': '.xml', 'icalpdf': '.ics', 'icalnewcourse': '.ics'}
+
+
+def convert(name, data, params):
+    """
+    Run the converter name on the input file contents data, with the query parameters params.
+
+    Returns the output file contents and its suffix. Raises KeyError for unknown converters and ValueError
+    for bad input or parameters.
+    """
+    func = CONVERTERS[name]
+    if name == 'schedule':
+        suffix = "." + params.get('from', 'xml').lstrip('.')
+    else:
+        suffix = INPUT_SUFFIXES[name]
+    with tempfile.TemporaryDirectory(prefix="convertd") as d:
+        fn_in = os.path.join(d, "in" + suffix)
+        with open(fn_in, 'wb') as f:
+            f.write(data)
+        fn_out = func(fn_in, d, params)
+        with open(fn_out, 'rb') as f:
+            return f.read(), os.path.splitext(fn_out)[1]
+
+
+def warm():
+    """
+    Import all converters and run each once on a small schedule, so the first request is as fast as any.
+    """
+    t = time.perf_counter()
+    import athena2xlsx  # noqa: F401
+    import icalpdf  # noqa: F401
+    import icalnewcourse  # noqa: F401
+    import termshift  # noqa: F401
+    import schedule  # noqa: F401
+    import xlsxwriter  # noqa: F401
+
+    xml = (b'<?xml version="1.0" encoding="utf-8"?>\n<plan><lessons><lesson><name>Lecture</name>'
+           + b'<start>2019-09-02T08:00:00</start><stop>2019-09-02T09:45:00</stop></lesson></lessons></plan>\n')
+    logging.disable(logging.INFO)  # the warm-up conversions are not worth logging
+    try:
+        for fmt in ('xlsx', 'iuliana', 'ics'):
+            ics, _ = convert('athena2xlsx', xml, {'format': fmt})
+        convert('icalpdf', ics, {})
+        convert('icalnewcourse', ics, {'start': '07.09.2020', 'weekdays': '1'})
+    finally:
+        logging.disable(logging.NOTSET)
+    logger.info("Worker {} warm after {:.3f} s".format(os.getpid(), time.perf_counter() - t))
+
+
+def _run(job):
+    """
+    Run convert() in a worker process, returning (output, suffix) or (None, error message).
+    """
+    try:
+        return convert(*job)
+    except (ValueError, OSError) as e:
+        return None, str(e)
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """
+    HTTP requests to the service, converted by the pool of the server.
+    """
+    protocol_version = "HTTP/1.1"  # keep connections open for scripted clients
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _reply(self, code, body, content_type='text/plain; charset=utf-8'):
+        self.send_response(code)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.strip("/"):
+            self._reply(404, b"Unknown path, GET / lists the converters\n")
+            return
+        info = {name: func.__doc__.strip() for name, func in sorted(CONVERTERS.items())}
+        self._reply(200, json.dumps(info, indent=1).encode('utf-8'), 'application/json')
+
+    def do_POST(self):
+        url = urllib.parse.urlsplit(self.path)
+        name = url.path.strip("/")
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if name not in CONVERTERS:
+            self._reply(404, "Unknown converter {}, use one of {}\n".format(
+                name, ", ".join(sorted(CONVERTERS))).encode('utf-8'))
+            return
+        params = dict(urllib.parse.parse_qsl(url.query, keep_blank_values=True))
+        t = time.perf_counter()
+        try:
+            out, suffix = self.server.run((name, data, params))
+        except Exception as e:
+            logger.exception("{} failed".format(name))
+            self._reply(500, "{}: {}\n".format(type(e).__name__, e).encode('utf-8'))
+            return
+        if out is None:
+            self._reply(400, (suffix + "\n").encode('utf-8'))
+            return
+        self._reply(200, out, CONTENT_TYPES.get(suffix, 'application/octet-stream'))
+        logger.info("{} {} bytes -> {} bytes in {:.3f} s".format(name, len(data), len(out), time.perf_counter() - t))
+
+
+class PoolMixIn():
+    """
+    Server which runs the conversions in a pool of jobs warm worker processes, or in the request thread of
+    this process if jobs is 1.
+    """
+
+    def start_pool(self, jobs=None):
+        if jobs == 1:
+            warm()
+            self.pool = None
+        else:
+            self.pool = concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=warm)
+            # start and warm up all workers now, not on the first requests
+            for f in [self.pool.submit(time.sleep, 0.01) for _ in range(self.pool._max_workers)]:
+                f.result()
+
+    def run(self, job):
+        if self.pool is None:
+            return _run(job)
+        return self.pool.submit(_run, job).result()
+
+    def server_close(self):
+        super().server_close()
+        if self.pool is not None:
+            self.pool.shutdown()
+
+
+class HTTPServer(PoolMixIn, http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class UnixServer(PoolMixIn, socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix socket.
+    """
+
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class Client():
+    """
+    Client of the service, on a TCP port of localhost or on a Unix socket. The connection is kept open.
+    """
+
+    def __init__(self, port=None, socket_path=None, timeout=600):
+        if socket_path:
+            self.conn = UnixHTTPConnection(socket_path, timeout=timeout)
+        else:
+            self.conn = http.client.HTTPConnection("localhost", port, timeout=timeout)
+
+    def convert(self, name, data, **params):
+        """
+        Returns the output of converter name for the input file contents data. Raises ValueError on errors.
+        """
+        self.conn.request("POST", "/{}?{}".format(name, urllib.parse.urlencode(params)), body=data)
+        resp = self.conn.getresponse()
+        body = resp.read()
+        if resp.status != 200:
+            raise ValueError(body.decode('utf-8', 'replace').strip())
+        return body
+
+    def close(self):
+        self.conn.close()
+
+
+def main(args=sys.argv[1:]):
+    """
+    Run the conversion service until interrupted.
+    """
+    parser = argparse.ArgumentParser(description="Local service converting schedules with athena2xlsx, icalpdf, "
+                                     + "icalnewcourse and schedule, with warm imports.",
+                                     epilog="example: curl --data-binary @FK5031.ics "
+                                     + "'http://localhost:8750/icalpdf' -o FK5031.pdf")
+    parser.add_argument("-p", "--port", type=int, default=8750, help="TCP port on localhost, default 8750")
+    parser.add_argument("-s", "--socket", type=str, help="listen on this Unix socket instead of a TCP port")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes, default is one per CPU. With 1, conversions run in "
+                        + "the server process")
+    parser.add_argument("-v", "--verbosity", action='count', help="increase output verbosity", default=0)
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.verbosity == 1:
+        logging.basicConfig(level=logging.INFO)
+    elif parsed_args.verbosity > 1:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig()
+
+    if parsed_args.socket:
+        if os.path.exists(parsed_args.socket):
+            os.unlink(parsed_args.socket)
+        server = UnixServer(parsed_args.socket, Handler)
+        where = parsed_args.socket
+    else:
+        server = HTTPServer(("127.0.0.1", parsed_args.port), Handler)  # local only
+        where = "http://localhost:{}".format(server.server_address[1])
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    # shut down the worker processes also when terminated, they would keep running otherwise
+    signal.signal(signal.SIGTERM, stop)
+
+    t = time.perf_counter()
+    server.start_pool(parsed_args.jobs)
+    print("Serving {} on {}, ready after {:.3f} s".format(", ".join(sorted(CONVERTERS)), where,
+                                                          time.perf_counter() - t), file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if parsed_args.socket:
+            os.unlink(parsed_args.socket)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
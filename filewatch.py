@@ -0,0 +1,43 @@
+"""
+Polling file watcher for the --watch modes of the tools.
+"""
+import os
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def stat_key(filename):
+    """
+    Returns (modification time in ns, size) of filename, or None if it does not exist.
+    """
+    try:
+        st = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def watch(filename, callback, interval=0.2):
+    """
+    Poll filename every interval seconds, and call callback(mtime) when it has changed, until interrupted by Ctrl-C.
+
+    mtime is the modification time of the file in seconds since the epoch, as time.time(), so callbacks
+    can report the latency from the change to the updated output.
+    """
+    last = stat_key(filename)
+    logger.info("Watching {}, press Ctrl-C to stop.".format(filename))
+    try:
+        while True:
+            time.sleep(interval)
+            key = stat_key(filename)
+            if key is None or key == last:
+                continue
+            last = key
+            try:
+                callback(key[0] / 1e9)
+            except Exception as e:  # e.g. the file was read while half written, wait for the next change
+                logger.error("Could not process {}: {}".format(filename, e))
+    except KeyboardInterrupt:
+        pass
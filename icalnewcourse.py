@@ -1,22 +1,457 @@
+"""
+Shift the events of an iCal calendar to a new course start date.
+
+Only the DTSTART, DTEND and DTSTAMP lines of the events, and the year in X-WR-CALNAME, are rewritten.
+All other bytes of the file are copied unchanged. The file is memory mapped and scanned with a regular
+expression for the few lines which may change, so calendars of any size are shifted in one pass (plus a
+quick scan for the first start date) without reading them into memory.
+
+In batch mode, many calendars are shifted to new start dates listed in a manifest, in parallel.
+"""
+import os
+import re
+import csv
 import sys
+import json
+import mmap
+import time
+import numbers
 import logging
 import argparse
-import pytz  # timezones
-
-from icalendar import Calendar
-from datetime import datetime
-from datetime import timedelta
+import datetime
+import functools
+import contextlib
+import collections
+import concurrent.futures
 
+import icalreader
 
 logger = logging.getLogger(__name__)
 
-# local_tz = pytz.timezone('CET')
-local_tz = pytz.timezone('Europe/Stockholm')  # beware of daylight saving
+REWRITTEN_PROPERTIES = (b'DTSTART', b'DTEND', b'DTSTAMP')
+MAX_LINE = 75  # octets per line, longer lines are folded
+
+# content lines which begin or end components, or which may be changed, with their continuation lines
+_line_re = re.compile(rb'^(BEGIN|END|DTSTART|DTEND|DTSTAMP|X-WR-CALNAME)([;:][^\r\n]*(?:\r?\n[ \t][^\r\n]*)*)(\r?\n)?',
+                      re.MULTILINE | re.IGNORECASE)
+_fold_re = re.compile(rb'\r?\n[ \t]')
+
+
+@contextlib.contextmanager
+def read_mapped(filename):
+    """
+    Context manager giving the content of filename as read-only memory map, so it is not read into memory.
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:  # empty files cannot be mapped
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def scan(data):
+    """
+    Generator of (component, name, line, match) for the content lines of the iCal text data (bytes or mmap)
+    which begin or end components, or which are rewritten when shifting.
+
+    component: name of the innermost component the line is in. BEGIN and END lines belong to the component
+               they begin or end.
+    name: upper case property name.
+    line: the unfolded content line, without line ending.
+    match: the match of the line in data, group 3 is the line ending.
+
+    All other lines are skipped by the regular expression, without looking at them in Python.
+    """
+    stack = []
+    for m in _line_re.finditer(data):
+        name, rest, _ = m.groups()
+        line = name + (_fold_re.sub(b"", rest) if b"\n" in rest else rest)
+        name = name.upper()
+        if name == b'BEGIN':
+            stack.append(line[6:].strip().upper())
+            yield stack[-1], name, line, m
+        elif name == b'END':
+            yield (stack.pop() if stack else None), name, line, m
+        else:
+            yield (stack[-1] if stack else None), name, line, m
+
+
+def find_start(data):
+    """
+    Returns the earliest start date (in local time) of the events in the iCal text data, or None if there are none.
+    """
+    first = None
+    skip = None  # written dates after this are more than a UTC offset after first, and need not be decoded
+    for component, name, line, _ in scan(data):
+        if component == b"VEVENT" and name == b'DTSTART':
+            _, params, value = icalreader.split_line(line)
+            if skip is not None and value[:8] > skip:
+                continue
+            d = icalreader.local_date(icalreader.decode_datetime(value, params))
+            if first is None or d < first:
+                first = d
+                skip = (first + datetime.timedelta(days=1)).strftime('%Y%m%d').encode()
+    return first
+
+
+def start_date(line):
+    """
+    Returns the date in local time of a DTSTART content line.
+    """
+    _, params, value = icalreader.split_line(line)
+    return icalreader.local_date(icalreader.decode_datetime(value, params))
+
+
+def event_dates(data):
+    """
+    Returns a list of the start dates (in local time) of the events in the iCal text data, in the order
+    of the file, with None for events without DTSTART.
+    """
+    dates = []
+    for component, name, line, _ in scan(data):
+        if component == b"VEVENT":
+            if name == b'BEGIN':
+                dates.append(None)
+            elif name == b'DTSTART' and dates:
+                dates[-1] = start_date(line)
+    return dates
+
+
+def weekday_days(dates, new_start):
+    """
+    Returns a numpy array of the number of days to shift each event by, for a new course starting on
+    new_start, so every event keeps its weekday and its week of the course, and is moved off Swedish
+    public holidays. See termshift.map_dates().
+
+    dates: start dates of the events as from event_dates().
+    """
+    import termshift
+
+    old_start = min(d for d in dates if d is not None)
+    days = termshift.shift_days(termshift.to_days(dates), old_start, new_start)
+    weeks = termshift.shift_days(termshift.to_days([old_start]), old_start, new_start, avoid_holidays=False)[0]
+    logger.info("New course will be {} weeks later, {} events moved off holidays.".format(
+        weeks // 7, int((days[[d is not None for d in dates]] != weeks).sum())))
+    return days
+
+
+def shift_value(value, delta):
+    """
+    Returns a DATE or DATE-TIME value as bytes, shifted by the timedelta delta of whole days.
+
+    Only the date part is changed, so the time, and a trailing Z of UTC times, are kept as they are.
+    """
+    return _shift_date(value[:8], delta) + value[8:]
+
+
+@functools.lru_cache(maxsize=4096)
+def _shift_date(value, delta):
+    d = datetime.date(int(value[0:4]), int(value[4:6]), int(value[6:8])) + delta
+    return "{:04d}{:02d}{:02d}".format(d.year, d.month, d.day).encode()
+
+
+def fold(line, eol):
+    """
+    Returns a content line folded to MAX_LINE octets per line, with line ending eol.
+    """
+    chunks = []
+    limit = MAX_LINE
+    while len(line) > limit:
+        cut = limit
+        while cut > 1 and (line[cut] & 0xC0) == 0x80:  # do not split a UTF-8 character
+            cut -= 1
+        chunks.append(line[:cut])
+        line = b" " + line[cut:]
+    chunks.append(line)
+    return eol.join(chunks) + eol
+
+
+def rewritten(component, name):
+    """
+    Returns True if the property name in component is rewritten when shifting.
+    """
+    return ((component == b"VEVENT" and name in REWRITTEN_PROPERTIES)
+            or (component == b"VCALENDAR" and name == b'X-WR-CALNAME'))
+
+
+def _shift_args(days, old_year, new_year, dtstamp):
+    if isinstance(days, numbers.Integral):
+        delta = datetime.timedelta(days=int(days))
+    else:
+        delta = [datetime.timedelta(days=int(d)) for d in days]
+    if dtstamp is None:
+        dtstamp = datetime.datetime.now(datetime.timezone.utc)
+    stamp = dtstamp.strftime('%Y%m%dT%H%M%SZ').encode()
+    years = None
+    if old_year is not None:
+        years = str(old_year).encode(), str(new_year).encode()
+    return delta, stamp, years
 
 
-def utc_to_local(utc_dt):
-    local_dt = utc_dt.replace(tzinfo=pytz.utc).astimezone(local_tz)
-    return local_tz.normalize(local_dt)  # .normalize might be unnecessary
+def _rewrite(name, line, delta, stamp, years):
+    """
+    Returns the rewritten content line, or None if it stays as it is.
+    """
+    value = icalreader.split_line(line)[2]
+    head = line[:len(line) - len(value)]
+    if name == b'DTSTAMP':
+        return head + stamp
+    if name == b'X-WR-CALNAME':
+        if years is None or years[0] not in value:
+            return None
+        logger.info("Replacing year in calendar title ...")
+        return head + value.replace(*years)
+    return head + shift_value(value.strip(), delta)
+
+
+def shift_calendar(data, fout, days, old_year=None, new_year=None, dtstamp=None):
+    """
+    Write the iCal text data (bytes or mmap) to the binary file object fout, with all events shifted by days days.
+
+    days: number of days, or a sequence of the number of days for each event, in the order of the file
+          as from event_dates().
+    old_year, new_year: if given, old_year is replaced by new_year in X-WR-CALNAME.
+    dtstamp: DTSTAMP of the shifted events as datetime in UTC, default now.
+
+    Returns the number of shifted events.
+    """
+    delta, stamp, years = _shift_args(days, old_year, new_year, dtstamp)
+    per_event = isinstance(delta, list)
+    event = -1
+    nevents = 0
+    pos = 0  # data before pos has been written
+    for component, name, line, m in scan(data):
+        if name == b'BEGIN' and component == b"VEVENT":
+            event += 1
+            continue
+        if not rewritten(component, name):
+            continue
+        line = _rewrite(name, line, delta[event] if per_event else delta, stamp, years)
+        if line is None:
+            continue
+        nevents += name == b'DTSTART'
+        fout.write(data[pos:m.start()])
+        fout.write(fold(line, m.group(3) or b"\r\n"))
+        pos = m.end()
+    fout.write(data[pos:])
+    return nevents
+
+
+class Template():
+    """
+    An iCal file split into the bytes which are copied unchanged and the lines which are rewritten, so it
+    can be shifted to several start dates after a single scan.
+
+    Unlike shift_calendar(), the whole file is kept in memory.
+    """
+
+    def __init__(self, data):
+        self.chunks = []  # unchanged bytes before each of the rewritten lines, and after the last one
+        self.lines = []  # (name, unfolded line, raw bytes, index of the event) of the rewritten lines
+        self.dates = []  # start date of each event in local time, as event_dates()
+        pos = 0
+        for component, name, line, m in scan(data):
+            if name == b'BEGIN' and component == b"VEVENT":
+                self.dates.append(None)
+                continue
+            if not rewritten(component, name):
+                continue
+            self.chunks.append(bytes(data[pos:m.start()]))
+            self.lines.append((name, line, m.group(0), len(self.dates) - 1))
+            pos = m.end()
+            if name == b'DTSTART':
+                self.dates[-1] = start_date(line)
+        self.chunks.append(bytes(data[pos:]))
+        self.start = min((d for d in self.dates if d is not None), default=None)
+
+    def write(self, fout, days, old_year=None, new_year=None, dtstamp=None):
+        """
+        Write the calendar to the binary file object fout, shifted as with shift_calendar().
+
+        Returns the number of shifted events.
+        """
+        delta, stamp, years = _shift_args(days, old_year, new_year, dtstamp)
+        per_event = isinstance(delta, list)
+        nevents = 0
+        for chunk, (name, line, raw, event) in zip(self.chunks, self.lines):
+            fout.write(chunk)
+            line = _rewrite(name, line, delta[event] if per_event else delta, stamp, years)
+            if line is None:
+                fout.write(raw)
+                continue
+            nevents += name == b'DTSTART'
+            fout.write(fold(line, raw[len(raw.rstrip(b"\r\n")):] or b"\r\n"))
+        fout.write(self.chunks[-1])
+        return nevents
+
+
+def shift_file(fn_in, fn_out, new_start_date, weekdays=False, dtstamp=None):
+    """
+    Shift the calendar fn_in to a course starting on new_start_date, and write it to fn_out.
+
+    weekdays: keep the weekdays of the events and avoid holidays, see weekday_days().
+    Returns the number of events. Raises ValueError if fn_in has no events.
+    """
+    with read_mapped(fn_in) as data:
+        if weekdays:
+            dates = event_dates(data)
+            old_start_date = min((d for d in dates if d is not None), default=None)
+        else:
+            old_start_date = find_start(data)
+        if old_start_date is None:
+            raise ValueError("No events found in {}".format(fn_in))
+
+        logger.info("Last years course started {}".format(old_start_date))
+        if weekdays:
+            days = weekday_days(dates, new_start_date)
+        else:
+            days = (new_start_date - old_start_date).days
+            logger.info("New course will be {} days later.".format(days))
+
+        with open(fn_out, 'wb') as fout:
+            return shift_calendar(data, fout, days, old_start_date.year, new_start_date.year, dtstamp)
+
+
+def parse_date(s):
+    """
+    Returns the date of a string in DD.MM.YYYY format.
+    """
+    return datetime.datetime.strptime(s.strip(), '%d.%m.%Y').date()
+
+
+def read_manifest(filename):
+    """
+    Read a batch of calendars to shift from a CSV file with lines
+
+        FK5031_2018.ics,20.11.2019,FK5031_2019.ics
+
+    or, if filename ends with .json, from a list of objects
+    {"input": "FK5031_2018.ics", "start": "20.11.2019", "output": "FK5031_2019.ics"}.
+    The output filename is optional. Relative filenames are relative to the directory of the manifest.
+
+    Returns a list of (input filename, new start date, output filename or None).
+    """
+    base = os.path.dirname(filename)
+    with open(filename, newline='', encoding='utf-8') as f:
+        if filename.lower().endswith(".json"):
+            rows = [(e["input"], e["start"], e.get("output") or "") for e in json.load(f)]
+        else:
+            rows = []
+            for row in csv.reader(f):
+                if not row or row[0].startswith('#'):
+                    continue
+                row += [""] * (3 - len(row))
+                rows.append(row[:3])
+
+    entries = []
+    for inp, start, oup in rows:
+        oup = oup.strip()
+        entries.append((os.path.join(base, inp.strip()), parse_date(start), os.path.join(base, oup) if oup else None))
+    return entries
+
+
+def output_name(inp, start, outdir=None):
+    """
+    Returns the default output filename for inp shifted to start: FK5031_2018.ics -> FK5031_2018_20191120.ics,
+    in outdir or else next to the input file.
+    """
+    name = "{}_{:%Y%m%d}.ics".format(os.path.splitext(os.path.basename(inp))[0], start)
+    return os.path.join(outdir if outdir else os.path.dirname(inp), name)
+
+
+def _shift_job(job):
+    """
+    Shift one input file to all its new start dates, in a worker process.
+
+    job: (input filename, list of (new start date, output filename), DTSTAMP, weekdays).
+    Returns a list of (output filename, smallest and largest shift in days, number of events), the error
+    message if the input could not be shifted (else None), and the time it took.
+    """
+    inp, targets, dtstamp, weekdays = job
+    t = time.perf_counter()
+    results = []
+    try:
+        with read_mapped(inp) as data:
+            template = Template(data)
+        if template.start is None:
+            raise ValueError("No events found in {}".format(inp))
+        for start, oup in targets:
+            if weekdays:
+                days = weekday_days(template.dates, start)
+                span = int(days.min()), int(days.max())
+            else:
+                days = (start - template.start).days
+                span = days, days
+            with open(oup, 'wb') as fout:
+                n = template.write(fout, days, template.start.year, start.year, dtstamp)
+            results.append((oup, span, n))
+    except (OSError, ValueError) as e:  # one bad input does not stop the batch
+        return results, str(e), time.perf_counter() - t
+    return results, None, time.perf_counter() - t
+
+
+def shift_batch(entries, outdir=None, jobs=None, weekdays=False):
+    """
+    Shift many calendars in parallel, using a pool of jobs processes (default: one per CPU).
+
+    entries: list of (input filename, new start date, output filename or None) as from read_manifest().
+             An input file which is shifted to several start dates is read and scanned only once.
+    outdir: directory of the output files without a filename, see output_name().
+    weekdays: keep the weekdays of the events and avoid holidays, see weekday_days().
+
+    The written files are listed on standard out as they are done, followed by a timing summary on standard
+    error. Inputs which cannot be shifted are reported, and the others are shifted anyway.
+    Returns the list of input files which failed.
+    """
+    if outdir:
+        os.makedirs(outdir, exist_ok=True)
+    targets = collections.OrderedDict()
+    for inp, start, oup in entries:
+        targets.setdefault(inp, []).append((start, oup or output_name(inp, start, outdir)))
+    dtstamp = datetime.datetime.now(datetime.timezone.utc)
+    job_list = [(inp, tl, dtstamp, weekdays) for inp, tl in targets.items()]
+
+    t = time.perf_counter()
+    if jobs == 1:
+        timings, failed = _print_batch((job[0], _shift_job(job)) for job in job_list)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(_shift_job, job): job[0] for job in job_list}
+            done = concurrent.futures.as_completed(futures)
+            timings, failed = _print_batch((futures[future], future.result()) for future in done)
+    t = time.perf_counter() - t
+
+    print("", file=sys.stderr)
+    for inp in targets:
+        print("{:8.3f} s  {}{}".format(timings[inp], inp, " (failed)" if inp in failed else ""), file=sys.stderr)
+    print("{:8.3f} s  total for {} files ({:.3f} s cpu)".format(t, len(targets), sum(timings.values())),
+          file=sys.stderr)
+    if failed:
+        print("{} of {} files failed: {}".format(len(failed), len(targets), ", ".join(failed)), file=sys.stderr)
+    return failed
+
+
+def _print_batch(results):
+    """
+    Print the written files of a batch as they arrive, from results of (input filename, result of
+    _shift_job()), and log the errors.
+
+    Returns a dict of the timings by input filename, and the list of input files which failed.
+    """
+    timings = {}
+    failed = []
+    for inp, (written, error, dt) in results:
+        for oup, (lo, hi), n in written:
+            if lo == hi:
+                print("{} -> {}: {} events, {:+d} days".format(inp, oup, n, lo))
+            else:
+                print("{} -> {}: {} events, {:+d} to {:+d} days".format(inp, oup, n, lo, hi))
+        if error:
+            logger.error(error)
+            failed.append(inp)
+        timings[inp] = dt
+    return timings, failed
 
 
 def main(args=sys.argv[1:]):
@@ -25,12 +460,26 @@ def main(args=sys.argv[1:]):
     """
 
     parser = argparse.ArgumentParser()
-    parser.add_argument("inputfile", help="iCal .ics file from which new schedule will be produced.", type=str)
-    parser.add_argument("startdate", help="New course starting date in DD.MM.YYYY format.", type=str)
+    parser.add_argument("inputfile", help="iCal .ics file from which new schedule will be produced.", type=str,
+                        nargs='?', default=None)
+    parser.add_argument("startdate", help="New course starting date in DD.MM.YYYY format.", type=str,
+                        nargs='?', default=None)
     parser.add_argument("outputfile", help="Filename of output iCal .ics file.", type=str, nargs='?', default=None)
     parser.add_argument("-v", "--verbosity", action='count',
                         help="increase output verbosity",
                         default=0)
+    parser.add_argument("-m", "--manifest", type=str,
+                        help="batch mode: CSV file with lines 'input.ics,DD.MM.YYYY,output.ics', or a JSON file, "
+                        + "instead of the positional arguments")
+    parser.add_argument("-d", "--outdir", type=str,
+                        help="batch mode: directory of output files not named in the manifest")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="batch mode: number of parallel processes, default is one per CPU")
+    parser.add_argument("-w", "--weekdays", action='store_true',
+                        help="keep the weekday and the week of the course of every event, and move events "
+                        + "off Swedish public holidays, instead of shifting all events by the same number of days. "
+                        + "The course starts on the first day from the start date on with the weekday of the "
+                        + "first event")
     parsed_args = parser.parse_args(args)
 
     if parsed_args.verbosity == 1:
@@ -40,64 +489,31 @@ def main(args=sys.argv[1:]):
     else:
         logging.basicConfig()
 
+    if parsed_args.manifest:
+        if parsed_args.inputfile:
+            parser.error("give either a manifest or an input file and start date")
+        if shift_batch(read_manifest(parsed_args.manifest), parsed_args.outdir, parsed_args.jobs,
+                       parsed_args.weekdays):
+            return 1
+        return
+    if not parsed_args.startdate:
+        parser.error("the input file and the new start date are required")
+
     fn_in = parsed_args.inputfile
     if parsed_args.outputfile:
         fn_out = parsed_args.outputfile
     else:
         fn_out = "new.ics"
 
-    if parsed_args.startdate:
-        new_start_date = datetime.strptime(parsed_args.startdate, '%d.%m.%Y')
-        new_start_date = new_start_date.replace(tzinfo=local_tz)
-        print(new_start_date)
-    else:
-        new_start_date = datetime(2018, 11, 19, 9, 0, 0, tzinfo=local_tz)
-
-    old_start_date = new_start_date
-
-    with open(fn_in, 'rb') as g:
-        gcal = Calendar.from_ical(g.read())
-
-    # first scan for the oldest date in the calendar
-    for component in gcal.walk():
-        if component.name == "VEVENT":
-            # print(component['summary'].dt)
-            _d = component['dtstart'].dt
-            if _d < old_start_date:
-                old_start_date = _d
-
-    delta = new_start_date - old_start_date
-    delta = timedelta(days=delta.days + 1)
-    logger.info("Last years course started {}".format(utc_to_local(old_start_date)))
-    logger.info("New course will be {} days later.".format(delta.days))
-
-    new = old_start_date + delta
-    logger.info("Course start: {}".format(utc_to_local(new)))
-
-    for component in gcal.walk():
-        if component.name == "VCALENDAR":
-            _calname = component["X-WR-CALNAME"]
-            logger.info("_calname: {}".format(_calname))
-            _old_start_year = old_start_date.strftime("%Y")
-            _new_start_year = new_start_date.strftime("%Y")
-            logger.info("_old_start_year: {}".format(_old_start_year))
-            logger.info("_new_start_year: {}".format(_new_start_year))
-            if _old_start_year in _calname:
-                logger.info("Replacing year in calendar title ...")
-                component["X-WR-CALNAME"] = _calname.replace(_old_start_year, _new_start_year)
-
-        if component.name == "VEVENT":
-            logger.info("")
-            logger.info("{}".format(component['summary']))
-            logger.info("Old date: {}".format(component['dtstart'].dt))
-            component['dtstart'].dt += delta
-            logger.info("New date: {}".format(component['dtstart'].dt))
-            if "dtend" in component:
-                component['dtend'].dt += delta
-            component['dtstamp'].dt = datetime.now()
-
-    with open(fn_out, 'wb') as f:
-        f.write(gcal.to_ical())
+    new_start_date = parse_date(parsed_args.startdate)
+    print(new_start_date)
+
+    try:
+        nevents = shift_file(fn_in, fn_out, new_start_date, parsed_args.weekdays)
+    except ValueError as e:
+        logger.error(str(e))
+        return 1
+    logger.info("Shifted {} events".format(nevents))
     logger.info("Wrote {}".format(fn_out))
 
 
@@ -1,85 +1,70 @@
 import sys
+import time
 import logging
 import argparse
 import datetime
-import pytz
-
-import numpy as np
-from icalendar import Calendar
-
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4, landscape
+import textwrap
+import functools
+import collections
 
+from localtime import to_local
+from icalreader import Event
+import clashes
+import icalreader
+import filewatch
+import parsecache
 
 logger = logging.getLogger(__name__)
 
-local_tz = pytz.timezone('Europe/Stockholm')  # beware of daylight saving
-
+PAGESIZE = (841.8897637795277, 595.2755905511812)  # landscape A4 in points, as reportlab landscape(A4)
 
-def utc_to_local(utc_dt):
-    local_dt = utc_dt.replace(tzinfo=pytz.utc).astimezone(local_tz)
-    return local_tz.normalize(local_dt)  # .normalize might be unnecessary
+PARSE_VERSION = 3  # increase when Event or read_calendar() change, so old parse cache entries are not used
 
 
-def main(args=sys.argv[1:]):
-    """
-    Read an iCal calendar file and convert it to a PDF which is ready to be handed out to students.
-
-    Note: locations should be a 3-letter code which is elaborated in the calendar description.
+def read_calendar(filename, cache=None, start=None, end=None):
     """
+    Read an iCal file.
 
-    parser = argparse.ArgumentParser()
-    parser.add_argument("inputfile", help="iCal file from which PDF schedule will be produced.", type=str)
-    parser.add_argument("-v", "--verbosity", action='count',
-                        help="increase output verbosity",
-                        default=0)
-    parsed_args = parser.parse_args(args)
-
-    if parsed_args.verbosity == 1:
-        logging.basicConfig(level=logging.INFO)
-    elif parsed_args.verbosity > 1:
-        logging.basicConfig(level=logging.DEBUG)
-    else:
-        logging.basicConfig()
-
-    fn_in = parsed_args.inputfile
-    fn_out = fn_in.replace("ics", "pdf")
-
-    with open(fn_in, 'rb') as g:
-        gcal = Calendar.from_ical(g.read())
-
-    c = canvas.Canvas(fn_out, pagesize=landscape(A4))
+    Returns the calendar name, the calendar description and the list of Events sorted by start time,
+    where all-day events come first on their day.
 
-    margin = 50.0  # marin in points
-    xmax, ymax = np.array(landscape(A4)) - margin
-    xmin, ymin = np.zeros(2) + margin
-
-    dates = []
-    events = []
+    cache: optional ParseCache.
+    start, end: optional datetime.date, only events starting on or after start and before end are read.
+    """
+    if cache:
+        return cache.load(filename, functools.partial(read_calendar, start=start, end=end),
+                          "icalpdf {} {} {}".format(PARSE_VERSION, start, end))
 
-    for i, _c in enumerate(gcal.walk()):
+    calprops = {}
+    events = list(icalreader.iter_events(filename, start, end, calprops))
+    events.sort(key=lambda ev: icalreader.sort_key(ev.dtstart))
+    return calprops.get("X-WR-CALNAME", ""), calprops.get("X-WR-CALDESC", ""), events
 
-        if _c.name == "VCALENDAR":
-            calname = _c["X-WR-CALNAME"]
-            caldesc = _c["X-WR-CALDESC"]
 
-        if _c.name == "VEVENT":
-            logger.info("")
-            logger.info("{}".format(_c['summary']))
-            dates.append(_c.decoded('dtstart'))
-            events.append(_c)
+class Page():
+    """
+    Everything which is drawn on one page of the PDF schedule.
+    """
+    __slots__ = ('strings', 'lines')
 
-    idxarr = np.argsort(dates)
+    def __init__(self):
+        self.strings = []  # (font size, x, y, text)
+        self.lines = []  # horizontal lines (x0, x1, y)
 
-    c.setFont('Helvetica', 20)
-    c.drawString(xmin, ymax - 10, calname)
 
-    c.setFont('Helvetica', 6)
+def layout(calname, caldesc, events, timestamp="", pagesize=PAGESIZE, margin=50.0):
+    """
+    Compute the position of all text and lines of the PDF schedule, without drawing anything.
 
-    c.drawString(xmin + 700, ymax, "Autogenerated")
-    c.drawString(xmin + 700, ymax - 8, datetime.datetime.now().strftime("%m.%d.%Y-%H:%M"))
+    Long summaries and descriptions are wrapped, and an event always starts on a new page
+    if all of its lines do not fit on the current page.
 
-    c.setFont('Helvetica', 12)
+    timestamp: shown in the upper right corner of the first page.
+    Returns a list of Pages.
+    """
+    width, height = pagesize
+    xmin, ymin = margin, margin
+    xmax, ymax = width - margin, height - margin
 
     # positions
     xoff_date = 0
@@ -91,90 +76,233 @@ def main(args=sys.argv[1:]):
 
     maxchar = 60  # maximum characters per line
     maxchar_desc = 40  # maximum characters per line
-
-    ypos = 0
-    j = 0
-    for i, idx in enumerate(idxarr):
-        _c = events[idx]
-        _name = _c['SUMMARY']
-
-        _dt = utc_to_local(_c['DTSTART'].dt)
+    wrap_name = textwrap.TextWrapper(maxchar).wrap
+    wrap_desc = textwrap.TextWrapper(maxchar_desc).wrap
+
+    font_size = 12
+    row_height = 14
+    ytop = ymax - 40  # first row of a page
+    nrows = int((ytop - ymin) // row_height) + 1  # rows per page
+
+    page = Page()
+    pages = [page]
+    page.strings.append((20, xmin, ymax - 10, calname))
+    page.strings.append((6, xmin + 700, ymax, "Autogenerated"))
+    page.strings.append((6, xmin + 700, ymax - 8, timestamp))
+
+    j = 0  # row on current page
+    _start_date_old = None
+    _last_page = page  # page and y position of the last row of the previous event
+    _last_y = ytop
+
+    for ev in events:
+        if isinstance(ev.dtstart, datetime.datetime):
+            _dt = to_local(ev.dtstart)
+            _start_time = _dt.strftime("%H:%M")
+        else:  # all-day event, without times
+            _dt = ev.dtstart
+            _start_time = None
         _start_date = _dt.strftime("%a, %d %b")
-        _start_time = _dt.strftime("%H:%M")
 
-        if "LOCATION" in _c:
-            _location = _c['LOCATION']
-        if "DTEND" in _c:
-            _dt = utc_to_local(_c['DTEND'].dt)
-            _stop_time = _dt.strftime("%H:%M")
+        if isinstance(ev.dtend, datetime.datetime):
+            _stop_time = to_local(ev.dtend).strftime("%H:%M")
         else:
             _stop_time = None
 
-        if "DESCRIPTION" in _c:
-            _description = _c['DESCRIPTION']
+        if len(ev.summary) > maxchar:
+            _names = wrap_name(ev.summary)
         else:
-            _description = None
+            _names = [ev.summary]
 
-        if i == 0:
-            _start_date_old = _start_date
+        if not ev.description:
+            _descs = []
+        elif len(ev.description) > maxchar_desc:
+            _descs = wrap_desc(ev.description)
+        else:
+            _descs = [ev.description]
 
-        if _start_date != _start_date_old:
-            c.line(xmin, ypos-2, xmax, ypos-2)
+        nlines = max(len(_names), len(_descs), 1)
 
+        # line below the previous event, if this is a new day
+        if _start_date_old is not None and _start_date != _start_date_old:
+            _last_page.lines.append((xmin, xmax, _last_y - 2))
         _start_date_old = _start_date
 
-        ypos = ymax - 40 - (j * 14)
-
-        if ypos < ymin:  # new page and reset counter
-            c.showPage()
+        if j > 0 and j + nlines > nrows:  # does not fit, new page and reset counter
+            page = Page()
+            pages.append(page)
             j = 0
-            ypos = ymax - 40 - (j * 14)
 
-        c.drawString(xmin + xoff_date, ypos, _start_date)
-        c.drawString(xmin + xoff_start_time, ypos, _start_time)
+        ypos = ytop - j * row_height
+        strings = page.strings
+        strings.append((font_size, xmin + xoff_date, ypos, _start_date))
+        if _start_time:
+            strings.append((font_size, xmin + xoff_start_time, ypos, _start_time))
         if _stop_time:
-            c.drawString(xmin + xoff_stop_time, ypos, _stop_time)
-        if _location:
-            c.drawString(xmin + xoff_location, ypos, _location[:3])
-
-        if len(_name) > maxchar:
-            import textwrap
-            lines = textwrap.wrap(_name, maxchar)
-            j -= 1
-            for line in lines:
-                j += 1
-                ypos = ymax - 40 - (j * 14)
-                c.drawString(xmin + xoff_name, ypos, line)
-        else:
-            c.drawString(xmin + xoff_name, ypos, _name)
-
-        if _description:
-            if len(_description) > maxchar_desc:
-                import textwrap
-                lines = textwrap.wrap(_description, maxchar_desc)
-                j -= 1
-                for line in lines:
-                    j += 1
-                    ypos = ymax - 40 - (j * 14)
-                    c.drawString(xmin + xoff_desc, ypos, line)
-        else:
-            c.drawString(xmin + xoff_name, ypos, _description)
-
-        j += 1
+            strings.append((font_size, xmin + xoff_stop_time, ypos, _stop_time))
+        if ev.location:
+            strings.append((font_size, xmin + xoff_location, ypos, ev.location[:3]))
+        for k, line in enumerate(_names):
+            strings.append((font_size, xmin + xoff_name, ypos - k * row_height, line))
+        for k, line in enumerate(_descs):
+            strings.append((font_size, xmin + xoff_desc, ypos - k * row_height, line))
+
+        j += nlines
+        _last_page = page
+        _last_y = ypos - (nlines - 1) * row_height
 
     j += 2  # more newlines
 
     for line in caldesc.split("\n"):
-        ypos = ymax - 40 - (j * 14)
-        c.drawString(xmin, ypos, line)
-
-        if ypos < ymin:  # new page and reset counter
-            c.showPage()
+        if j >= nrows:  # new page and reset counter
+            page = Page()
+            pages.append(page)
             j = 0
-            ypos = ymax - 40 - (j * 14)
-
+        page.strings.append((font_size, xmin, ytop - j * row_height, line))
         j += 1
+
+    return pages
+
+
+def render(fn_out, pages, pagesize=PAGESIZE):
+    """
+    Draw the Pages computed by layout() to the PDF file fn_out.
+
+    All strings of a page are drawn with a single text object. Returns the number of pages written.
+    """
+    from reportlab.pdfgen import canvas  # reportlab takes a while to import, and is only needed here
+
+    c = canvas.Canvas(fn_out, pagesize=pagesize)
+
+    for page in pages:
+        t = c.beginText()
+        _size = None
+        for size, x, y, text in page.strings:
+            if size != _size:
+                t.setFont('Helvetica', size)
+                _size = size
+            t.setTextOrigin(x, y)
+            t.textOut(text)
+        c.drawText(t)
+        for x0, x1, y in page.lines:
+            c.line(x0, y, x1, y)
+        c.showPage()
+
+    npages = c.getPageNumber() - 1
     c.save()
+    return npages
+
+
+def write_pdf(fn_out, calname, caldesc, events):
+    """
+    Write the schedule of the events to the PDF file fn_out, and return the number of pages.
+    """
+    timestamp = datetime.datetime.now().strftime("%m.%d.%Y-%H:%M")
+    return render(fn_out, layout(calname, caldesc, events, timestamp))
+
+
+class Watcher():
+    """
+    Writes the PDF of an iCal file again whenever the file changes, unless the schedule stays the same.
+    """
+
+    def __init__(self, fn_in, fn_out, start=None, end=None):
+        self.fn_in = fn_in
+        self.fn_out = fn_out
+        self.start = start
+        self.end = end
+        self.rendered = None  # everything shown in the PDF, as it was last written
+
+    def update(self, mtime=None):
+        """
+        Read the iCal file and write the PDF, if anything shown in it has changed.
+
+        mtime: modification time of the input file, to report the latency from the change.
+        """
+        calname, caldesc, events = read_calendar(self.fn_in, start=self.start, end=self.end)
+        shown = collections.Counter(tuple(getattr(ev, a) for a in Event.__slots__) for ev in events)
+        if self.rendered is None:
+            added = removed = 0
+        else:
+            added = sum((shown - self.rendered[2]).values())
+            removed = sum((self.rendered[2] - shown).values())
+
+        if (calname, caldesc, shown) != self.rendered:
+            write_pdf(self.fn_out, calname, caldesc, events)
+            self.rendered = (calname, caldesc, shown)
+            if mtime is not None:
+                rendered = "rendered {} {:.3f} s after the change".format(self.fn_out, time.time() - mtime)
+        else:
+            rendered = "nothing to render"
+
+        if mtime is not None:
+            print("{}: {} added, {} removed events, {}".format(self.fn_in, added, removed, rendered), file=sys.stderr)
+
+
+def main(args=sys.argv[1:]):
+    """
+    Read an iCal calendar file and convert it to a PDF which is ready to be handed out to students.
+
+    Note: locations should be a 3-letter code which is elaborated in the calendar description.
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("inputfile", help="iCal file from which PDF schedule will be produced.", type=str)
+    parser.add_argument("-v", "--verbosity", action='count',
+                        help="increase output verbosity",
+                        default=0)
+    parser.add_argument("--from", dest="start", type=str,
+                        help="only include events from this date on, in DD.MM.YYYY format")
+    parser.add_argument("--to", dest="end", type=str,
+                        help="only include events until and including this date, in DD.MM.YYYY format")
+    parser.add_argument("--watch", action='store_true',
+                        help="keep running, and write the PDF again whenever the input file changes")
+    parser.add_argument("--clashes", action='store_true',
+                        help="report locations which are booked twice at the same time, on standard error")
+    parser.add_argument("--no-cache", action='store_true', help="do not use the parse cache")
+    parser.add_argument("--clear-cache", action='store_true', help="clear the parse cache before converting")
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.verbosity == 1:
+        logging.basicConfig(level=logging.INFO)
+    elif parsed_args.verbosity > 1:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig()
+
+    fn_in = parsed_args.inputfile
+    fn_out = fn_in.replace("ics", "pdf")
+
+    start = end = None
+    if parsed_args.start:
+        start = datetime.datetime.strptime(parsed_args.start, '%d.%m.%Y').date()
+    if parsed_args.end:
+        end = datetime.datetime.strptime(parsed_args.end, '%d.%m.%Y').date() + datetime.timedelta(days=1)
+
+    if parsed_args.watch:
+        w = Watcher(fn_in, fn_out, start, end)
+        w.update()
+        filewatch.watch(fn_in, w.update)
+        return
+
+    if parsed_args.no_cache:
+        cache = None
+    else:
+        cache = parsecache.ParseCache()
+        if parsed_args.clear_cache:
+            cache.clear()
+
+    calname, caldesc, events = read_calendar(fn_in, cache, start, end)
+    if cache:
+        logger.info(cache.stats())
+
+    write_pdf(fn_out, calname, caldesc, events)
+
+    if parsed_args.clashes:
+        index = clashes.ClashIndex()
+        index.add_events(events, calname)
+        n = clashes.print_report(index.clashes(), f=sys.stderr)
+        print("{} clashes of locations".format(n), file=sys.stderr)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,227 @@
+"""
+Streaming reader for the events of iCal (.ics) files.
+
+The file is scanned line by line, and only the few event properties which the tools need are decoded.
+This is much faster than a full parse with icalendar, and memory does not grow with the file size.
+"""
+import re
+import logging
+import datetime
+import functools
+
+import localtime
+
+logger = logging.getLogger(__name__)
+
+EVENT_PROPERTIES = (b'DTSTART', b'DTEND', b'SUMMARY', b'LOCATION', b'DESCRIPTION')
+
+_unescape_re = re.compile(r'\\([\\;,nN])')
+_unescape = {'\\': '\\', ';': ';', ',': ',', 'n': '\n', 'N': '\n'}
+
+
+class Event():
+    """
+    The properties of a VEVENT which are needed for the schedule.
+    """
+    __slots__ = ('summary', 'dtstart', 'dtend', 'location', 'description')
+
+    def __init__(self, summary="", dtstart=None, dtend=None, location=None, description=None):
+        self.summary = summary
+        self.dtstart = dtstart
+        self.dtend = dtend
+        self.location = location
+        self.description = description
+
+
+def unfold(f):
+    """
+    Generator of the unfolded content lines of the binary file object f, as bytes without line ending.
+    """
+    line = None
+    for raw in f:
+        raw = raw.rstrip(b"\r\n")
+        if raw[:1] in (b" ", b"\t"):  # continuation of a folded line
+            if line is not None:
+                line += raw[1:]
+            continue
+        if line:
+            yield line
+        line = raw
+    if line:
+        yield line
+
+
+def split_line(line):
+    """
+    Split a content line into name, parameters and value.
+
+    Returns the upper case name as bytes, a dict of parameters as str and the value as bytes.
+    """
+    colon = line.find(b":")
+    if colon < 0:
+        return line.upper(), {}, b""
+    semi = line.find(b";", 0, colon)
+    if semi < 0:
+        return line[:colon].upper(), {}, line[colon + 1:]
+
+    if b'"' in line[semi:colon]:
+        # parameter values may be quoted and contain colons, find the first colon outside quotes
+        quoted = False
+        for colon in range(semi, len(line)):
+            c = line[colon:colon + 1]
+            if c == b'"':
+                quoted = not quoted
+            elif c == b":" and not quoted:
+                break
+
+    params = {}
+    for param in line[semi + 1:colon].decode('utf-8', 'replace').split(";"):
+        key, _, value = param.partition("=")
+        params[key.upper()] = value.strip('"')
+    return line[:semi].upper(), params, line[colon + 1:]
+
+
+def line_name(line):
+    """
+    Returns the upper case name of a content line, without parsing the rest of it, or None if it is invalid.
+    """
+    colon = line.find(b":")
+    if colon < 0:
+        return None
+    semi = line.find(b";", 0, colon)
+    if semi >= 0:
+        colon = semi
+    return line[:colon].upper()
+
+
+def decode_text(value):
+    """
+    Decode a TEXT value.
+    """
+    s = value.decode('utf-8', 'replace')
+    if "\\" in s:
+        s = _unescape_re.sub(lambda m: _unescape[m.group(1)], s)
+    return s
+
+
+@functools.lru_cache(maxsize=None)
+def _timezone(tzid):
+    import pytz
+
+    try:
+        return pytz.timezone(tzid)
+    except pytz.UnknownTimeZoneError:
+        logger.warning("Unknown TZID {}, using {}".format(tzid, localtime.local_tz))
+        return localtime.local_tz
+
+
+def decode_datetime(value, params):
+    """
+    Decode a DATE-TIME or DATE value.
+
+    UTC times and times with a TZID are returned as timezone aware datetimes, floating times as naive datetimes
+    and dates as datetime.date.
+    """
+    s = value.decode('ascii').strip()
+    if params.get('VALUE') == 'DATE' or len(s) == 8:
+        return datetime.date(int(s[0:4]), int(s[4:6]), int(s[6:8]))
+    dt = datetime.datetime(int(s[0:4]), int(s[4:6]), int(s[6:8]), int(s[9:11]), int(s[11:13]), int(s[13:15]))
+    if s.endswith('Z'):
+        return dt.replace(tzinfo=datetime.timezone.utc)
+    tzid = params.get('TZID')
+    if tzid:
+        return _timezone(tzid).localize(dt)
+    return dt
+
+
+def local_date(dt):
+    """
+    Returns the date of dt in local time, or dt itself if it is a date.
+    """
+    if isinstance(dt, datetime.datetime):
+        return localtime.to_local(dt).date()
+    return dt
+
+
+def sort_key(dt):
+    """
+    Returns a key which orders DATE and DATE-TIME values by local date and time of day,
+    with dates at the start of their day.
+    """
+    if isinstance(dt, datetime.datetime):
+        dt = localtime.to_local(dt)
+        return dt.date(), dt.time()
+    return dt, datetime.time.min
+
+
+def make_event(lines, start=None, end=None):
+    """
+    Returns an Event from the raw content lines of a VEVENT, a dict by property name.
+
+    The start time is decoded first, and None is returned without decoding anything else if the event
+    does not start in the date range [start, end), or has no start time.
+    """
+    if b'DTSTART' not in lines:
+        logger.warning("Skipping VEVENT without DTSTART")
+        return None
+    _, params, value = split_line(lines[b'DTSTART'])
+    dtstart = decode_datetime(value, params)
+    if start is not None or end is not None:
+        d = local_date(dtstart)
+        if (start is not None and d < start) or (end is not None and d >= end):
+            return None
+
+    ev = Event(dtstart=dtstart)
+    if b'DTEND' in lines:
+        _, params, value = split_line(lines[b'DTEND'])
+        ev.dtend = decode_datetime(value, params)
+    if b'SUMMARY' in lines:
+        ev.summary = decode_text(split_line(lines[b'SUMMARY'])[2])
+    if b'LOCATION' in lines:
+        ev.location = decode_text(split_line(lines[b'LOCATION'])[2])
+    if b'DESCRIPTION' in lines:
+        ev.description = decode_text(split_line(lines[b'DESCRIPTION'])[2])
+    return ev
+
+
+def iter_events(source, start=None, end=None, calprops=None):
+    """
+    Generator of the Events of an iCal file, in the order of the file.
+
+    source: filename or binary file object.
+    start, end: optional datetime.date, only events starting (in local time) on or after start and
+                before end are decoded and returned.
+    calprops: optional dict, which is filled with the properties of the VCALENDAR itself as text,
+              such as X-WR-CALNAME.
+    """
+    if hasattr(source, "read"):
+        f = source
+    else:
+        f = open(source, 'rb')
+
+    stack = []  # names of the components the current line is in
+    lines = None  # raw content lines of the wanted properties of the current VEVENT
+
+    try:
+        for line in unfold(f):
+            head = line[:6].upper()
+            if head == b"BEGIN:":
+                stack.append(line[6:].strip().upper())
+                if stack[-1] == b"VEVENT":
+                    lines = {}
+            elif head[:4] == b"END:":
+                if stack and stack.pop() == b"VEVENT" and lines is not None:
+                    ev = make_event(lines, start, end)
+                    lines = None
+                    if ev:
+                        yield ev
+            elif stack and stack[-1] == b"VEVENT":
+                name = line_name(line)
+                if name in EVENT_PROPERTIES:
+                    lines[name] = line
+            elif calprops is not None and stack and stack[-1] == b"VCALENDAR":
+                name, _, value = split_line(line)
+                calprops[name.decode('utf-8', 'replace')] = decode_text(value)
+    finally:
+        if f is not source:
+            f.close()
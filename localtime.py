@@ -0,0 +1,121 @@
+"""
+Conversion of UTC timestamps to local time, shared by athena2xlsx, icalpdf and icalnewcourse.
+
+The DST transition table of local_tz is looked up directly, which gives the same results as
+pytz astimezone() + normalize(), but much faster. Repeated timestamps are memoized.
+
+Loading pytz and the time zone takes longer than starting Python, so it is only done when local_tz or
+a conversion is first used.
+"""
+import bisect
+import datetime
+import functools
+
+TZ_NAME = 'Europe/Stockholm'  # beware of daylight saving
+
+DT_STR = '%Y-%m-%dT%H:%M:%S'  # date time string format in Athena XML files
+
+_epoch = datetime.datetime(1970, 1, 1)
+
+# UTC times (naive) when the local time offset changes, and the tzinfo which is valid from then on
+_transitions = _tzinfos = _offsets = None
+
+# the same table as epoch seconds, for the vectorized conversion
+_transitions_epoch = _offsets_seconds = None
+
+
+def _load():
+    """
+    Load local_tz and its DST transition tables.
+    """
+    global local_tz, _transitions, _tzinfos, _offsets, _transitions_epoch, _offsets_seconds
+    import pytz
+
+    local_tz = pytz.timezone(TZ_NAME)
+    _tzinfos = [local_tz._tzinfos[info] for info in local_tz._transition_info]
+    _offsets = [info[0] for info in local_tz._transition_info]
+    _transitions_epoch = [(t - _epoch).total_seconds() for t in local_tz._utc_transition_times]
+    _offsets_seconds = [o.total_seconds() for o in _offsets]
+    _transitions = local_tz._utc_transition_times  # last, it marks the tables as loaded
+
+
+def __getattr__(name):
+    # local_tz is only made on first access, after which it is a plain module attribute
+    if name == 'local_tz':
+        _load()
+        return local_tz
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def parse(s):
+    """
+    Parse a string in DT_STR format to a naive datetime, without the overhead of strptime.
+    """
+    if len(s) != 19 or s[10] != 'T':
+        return datetime.datetime.strptime(s, DT_STR)  # let strptime deal with odd strings and errors
+    return datetime.datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
+
+
+def utc_to_local(utc_dt):
+    """
+    Returns utc_dt as timezone aware datetime in local time.
+
+    Naive datetimes are taken to be in UTC.
+    """
+    if utc_dt.tzinfo is not None:
+        utc_dt = utc_dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return _utc_to_local(utc_dt)
+
+
+def to_local(dt):
+    """
+    Returns dt as timezone aware datetime in local time.
+
+    Naive datetimes, such as iCal floating times, are taken to be in local time already.
+    """
+    if dt.tzinfo is not None:
+        return utc_to_local(dt)
+    if _transitions is None:
+        _load()
+    return local_tz.localize(dt)
+
+
+@functools.lru_cache(maxsize=65536)
+def _utc_to_local(utc_dt):
+    if _transitions is None:
+        _load()
+    i = bisect.bisect_right(_transitions, utc_dt) - 1
+    return (utc_dt + _offsets[i]).replace(tzinfo=_tzinfos[i])
+
+
+@functools.lru_cache(maxsize=65536)
+def str_to_local(s):
+    """
+    Returns the local datetime of a UTC time string in DT_STR format.
+    """
+    return _utc_to_local(parse(s))
+
+
+def epoch_to_local(t):
+    """
+    Returns the local datetime of UTC epoch seconds t.
+    """
+    return _utc_to_local(_epoch + datetime.timedelta(seconds=t))
+
+
+def epochs_to_local(epochs):
+    """
+    Vectorized epoch_to_local(), for an array of UTC epoch seconds.
+
+    Returns a list of local datetimes, with None where epochs is NaN.
+    """
+    import numpy as np
+
+    if _transitions is None:
+        _load()
+    t = np.asarray(epochs, dtype=float)
+    nan = np.isnan(t)
+    t = np.where(nan, 0.0, t)
+    idx = np.searchsorted(_transitions_epoch, t, side='right') - 1
+    local = (t + np.take(_offsets_seconds, idx)).astype('int64').astype('datetime64[s]').tolist()
+    return [None if n else dt.replace(tzinfo=_tzinfos[i]) for dt, i, n in zip(local, idx.tolist(), nan.tolist())]
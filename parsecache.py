@@ -0,0 +1,139 @@
+"""
+On-disk cache of parsed input files, so repeated runs on unchanged files can skip parsing.
+"""
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def default_dir():
+    """
+    Returns the default cache directory, ~/.cache/msftools or below $XDG_CACHE_HOME.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'msftools')
+
+
+class ParseCache():
+    """
+    Cache of parsed files, keyed by the hash of the file content and the name and version of the parser.
+
+    Each entry is a pickle file in the cache directory. When the total size exceeds max_size bytes,
+    the least recently used entries are removed.
+    """
+
+    def __init__(self, directory=None, max_size=256 * 1024**2):
+        self.directory = directory or default_dir()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, filename, parser):
+        """
+        Returns the cache key of filename parsed by parser.
+        """
+        import hashlib  # hashlib, pickle and tempfile are imported on use, so --no-cache runs start faster
+
+        h = hashlib.sha256(parser.encode())
+        with open(filename, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def load(self, filename, parse, parser):
+        """
+        Returns parse(filename), taken from the cache if filename was parsed before by the same parser.
+
+        parser: name and version of the parse function, e.g. "athena2xlsx 1". Change the version whenever
+                the parse function returns something different, so old entries are not used.
+        """
+        import pickle
+
+        path = os.path.join(self.directory, self.key(filename, parser) + ".pickle")
+        try:
+            with open(path, 'rb') as f:
+                result = pickle.load(f)
+        except FileNotFoundError:
+            pass
+        except Exception as e:  # a broken entry is just a miss
+            logger.warning("Ignoring broken parse cache entry {}: {}".format(path, e))
+        else:
+            self.hits += 1
+            logger.info("Parse cache hit for {}".format(filename))
+            try:
+                os.utime(path)  # mark as recently used
+            except OSError:
+                pass
+            return result
+
+        self.misses += 1
+        logger.info("Parse cache miss for {}".format(filename))
+        result = parse(filename)
+        self.store(path, result)
+        return result
+
+    def store(self, path, result):
+        """
+        Write result to the cache entry path, and evict old entries.
+        """
+        import pickle
+        import tempfile
+
+        tmp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)  # atomic, so other processes never see a partial entry
+        except (OSError, pickle.PicklingError) as e:
+            logger.warning("Could not write parse cache entry {}: {}".format(path, e))
+            if tmp and os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        self.evict()
+
+    def entries(self):
+        """
+        Returns a list of (last use, size, path) of all cache entries.
+        """
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for de in os.scandir(self.directory):
+            if de.name.endswith(".pickle"):
+                try:
+                    st = de.stat()
+                except FileNotFoundError:  # removed by another process
+                    continue
+                entries.append((st.st_mtime, st.st_size, de.path))
+        return entries
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is not larger than max_size.
+        """
+        entries = self.entries()
+        total = sum(e[1] for e in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Remove all cache entries.
+        """
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        return "Parse cache: {} hits, {} misses".format(self.hits, self.misses)
@@ -0,0 +1,240 @@
+"""
+Common schedule model and conversion pipeline of the tools.
+
+A schedule is a list of athena2xlsx Lessons, sorted by start time, plus a dict of information about the
+course or calendar. Readers make a schedule from an input file, writers write it to an output, and any
+input can be converted to any set of outputs with a single parse:
+
+    python schedule.py FK5031.xml -o FK5031.xlsx -o iuliana:FK5031_iuliana.xlsx -o FK5031.pdf -o -
+
+Readers and writers are looked up by file suffix, or the format can be given as FORMAT:FILENAME.
+More of them can be added with register_reader() and register_writer().
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import datetime
+
+import localtime
+import athena2xlsx
+import icalreader
+
+logger = logging.getLogger(__name__)
+
+READERS = {}  # file suffix: function(filename, info, cache) returning an iterable of Lessons
+WRITERS = {}  # format name: function(filename, lessons, info)
+SUFFIXES = {}  # file suffix: format name of the writer
+
+
+def register_reader(suffix, read):
+    """
+    Register a reader for files with suffix, e.g. ".xml".
+
+    read(filename, info, cache) returns an iterable of Lessons, and may fill the dict info with the keys
+    'name', 'code' and 'description' of the course or calendar. cache is an optional ParseCache.
+    """
+    READERS[suffix] = read
+
+
+def register_writer(name, write, suffixes=()):
+    """
+    Register a writer as format name, which is also used for output files with one of suffixes.
+
+    write(filename, lessons, info) writes the list of Lessons sorted by start time, where info is the dict
+    filled by the reader, and 'source' is the input filename. filename "-" means standard out, if the writer
+    supports it.
+    """
+    WRITERS[name] = write
+    for suffix in suffixes:
+        SUFFIXES[suffix] = name
+
+
+def _times(dt):
+    """
+    Returns the local time and the UTC time string, as in Lesson.dt_start and Lesson.start, of an iCal
+    DATE or DATE-TIME. Dates are taken as local midnight, floating times as local time.
+    """
+    if dt is None:
+        return None, ""
+    if not isinstance(dt, datetime.datetime):
+        dt = datetime.datetime(dt.year, dt.month, dt.day)
+    local = localtime.to_local(dt)
+    return local, local.astimezone(datetime.timezone.utc).strftime(localtime.DT_STR)
+
+
+def lesson_from_event(ev):
+    """
+    Returns an icalreader Event as Lesson, with the location as room. Events with a date as start are
+    all-day lessons from local midnight.
+    """
+    cl = athena2xlsx.Lesson()
+    cl.name = ev.summary
+    cl.description = ev.description or ""
+    cl.room = ev.location or ""
+    cl.dt_start, cl.start = _times(ev.dtstart)
+    cl.dt_stop, cl.stop = _times(ev.dtend)
+    cl.all_day = not isinstance(ev.dtstart, datetime.datetime)
+    return cl
+
+
+def event_from_lesson(cl):
+    """
+    Returns a Lesson as icalreader Event, with the room as location. All-day lessons have dates as start and end.
+    """
+    dtstart, dtend = cl.dt_start, cl.dt_stop
+    if cl.all_day:
+        dtstart = dtstart.date()
+        dtend = dtend and dtend.date()
+    return icalreader.Event(summary=cl.name, dtstart=dtstart, dtend=dtend, location=cl.room,
+                            description=cl.description)
+
+
+def read_athena(filename, info, cache=None):
+    return athena2xlsx.read_lessons(filename, cache)
+
+
+def read_ical(filename, info, cache=None):
+    calprops = {}
+    events = icalreader.iter_events(filename, calprops=calprops)
+    lessons = [lesson_from_event(ev) for ev in events]
+    info.setdefault('name', calprops.get("X-WR-CALNAME", ""))
+    info.setdefault('description', calprops.get("X-WR-CALDESC", ""))
+    return lessons
+
+
+def write_text(filename, lessons, info):
+    if filename == "-":
+        athena2xlsx.StdoutWriter(lessons)
+        return
+    with open(filename, 'w', encoding='utf-8') as f:
+        athena2xlsx.StdoutWriter(lessons, f=f)
+
+
+def write_xlsx(filename, lessons, info):
+    athena2xlsx.ExcelWriter(filename, lessons)
+
+
+def write_iuliana(filename, lessons, info):
+    athena2xlsx.IulianaWriter(filename, lessons, course_name=info.get('name', ""), course_code=info.get('code', ""))
+
+
+def write_pdf(filename, lessons, info):
+    import icalpdf  # reportlab is only needed for PDF output
+
+    calname = " ".join(s for s in (info.get('code'), info.get('name')) if s)
+    icalpdf.write_pdf(filename, calname, info.get('description', ""), [event_from_lesson(cl) for cl in lessons])
+
+
+def write_ical(filename, lessons, info):
+    athena2xlsx.ICSWriter(filename, lessons, course_name=info.get('name', ""), course_code=info.get('code', ""),
+                          description=info.get('description', ""), source=info.get('source', ""))
+
+
+register_reader(".xml", read_athena)
+register_reader(".ics", read_ical)
+register_writer("text", write_text, (".txt",))
+register_writer("xlsx", write_xlsx, (".xlsx",))
+register_writer("iuliana", write_iuliana)
+register_writer("pdf", write_pdf, (".pdf",))
+register_writer("ical", write_ical, (".ics",))
+
+
+def parse_target(target):
+    """
+    Returns (format name, filename) of an output target, which is a filename, FORMAT:FILENAME,
+    or "-" for text on standard out.
+    """
+    name, sep, filename = target.partition(":")
+    if sep and name in WRITERS:
+        return name, filename
+    if target == "-":
+        return "text", "-"
+    suffix = os.path.splitext(target)[1].lower()
+    if suffix not in SUFFIXES:
+        raise ValueError("Unknown output format of {}, use one of {} as FORMAT:{}".format(
+            target, ", ".join(sorted(WRITERS)), target))
+    return SUFFIXES[suffix], target
+
+
+def read(filename, info=None, cache=None):
+    """
+    Read a schedule with the reader of the file suffix.
+
+    Returns the list of Lessons sorted by start time. The dict info is filled as described in register_reader().
+    """
+    suffix = os.path.splitext(filename)[1].lower()
+    if suffix not in READERS:
+        raise ValueError("Unknown input format of {}, known are {}".format(filename, ", ".join(sorted(READERS))))
+    lessons = READERS[suffix](filename, {} if info is None else info, cache)
+    return sorted(lessons, key=lambda cl: cl.start)
+
+
+def convert(infile, targets, info=None, cache=None):
+    """
+    Read the schedule from infile once, and write it to all targets.
+
+    targets: list of (format name, filename) as from parse_target().
+    info: optional dict of 'name', 'code' and 'description' of the course. Given values take precedence
+          over those of the input file.
+    Returns the list of Lessons.
+    """
+    info = dict(info or {})
+    info.setdefault('source', infile)
+    t = time.perf_counter()
+    lessons = read(infile, info, cache)
+    logger.info("Read {} lessons from {} in {:.3f} s".format(len(lessons), infile, time.perf_counter() - t))
+    for name, filename in targets:
+        t = time.perf_counter()
+        WRITERS[name](filename, lessons, info)
+        logger.info("Wrote {} {} in {:.3f} s".format(name, filename, time.perf_counter() - t))
+    return lessons
+
+
+def main(args=sys.argv[1:]):
+    """
+    Convert a schedule to several output formats.
+    """
+    parser = argparse.ArgumentParser(description="Convert an Athena XML export or an iCal calendar to several "
+                                     + "output formats, with a single parse.",
+                                     epilog="Output formats: text (.txt, or - for standard out), xlsx (.xlsx), "
+                                     + "iuliana, pdf (.pdf), ical (.ics). Give the format as FORMAT:FILENAME "
+                                     + "if the suffix does not tell it, e.g. iuliana:FK5031.xlsx")
+    parser.add_argument("infile", help="input file, Athena XML (.xml) or iCal (.ics)", type=str)
+    parser.add_argument("-o", "--output", action='append', type=str,
+                        help="output file, can be given several times, default is text on standard out")
+    parser.add_argument("-c", "--course-code", help="Course code, e.g. FK5031", type=str)
+    parser.add_argument("-n", "--course-name", help="Course name, e.g. Radiation Dosimetry", type=str)
+    parser.add_argument("-v", "--verbosity", action='count', help="increase output verbosity", default=0)
+    parser.add_argument("--no-cache", action='store_true', help="do not use the parse cache")
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.verbosity == 1:
+        logging.basicConfig(level=logging.INFO)
+    elif parsed_args.verbosity > 1:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig()
+
+    try:
+        targets = [parse_target(target) for target in parsed_args.output or ["-"]]
+    except ValueError as e:
+        parser.error(str(e))
+
+    info = {}
+    if parsed_args.course_code:
+        info['code'] = parsed_args.course_code
+    if parsed_args.course_name:
+        info['name'] = parsed_args.course_name
+
+    cache = None
+    if not parsed_args.no_cache:
+        import parsecache
+        cache = parsecache.ParseCache()
+
+    convert(parsed_args.infile, targets, info, cache)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,117 @@
+"""
+Exponential integrals E_n(x) = int_1^inf exp(-x t) / t^n dt, evaluated for whole arrays at once.
+
+The power series is used for x <= 1 and the continued fraction for x > 1 (Numerical Recipes, sec. 6.3),
+both iterated on all elements together until every element has converged to a relative error of EPS.
+The continued fraction gives exp(x) E_n(x) directly, so the scaled form x exp(x) E_n(x) is also accurate
+where exp(x) overflows or E_n(x) underflows, e.g. at x = 1000.
+"""
+import numpy as np
+
+EULER = 0.5772156649015329  # Euler-Mascheroni constant
+EPS = 1e-15  # relative error at which the iterations stop
+MAXIT = 1000
+_TINY = 1e-300
+
+
+def _harmonic(n):
+    """
+    Returns the harmonic numbers 1 + 1/2 + ... + 1/n for an integer array n >= 0.
+    """
+    top = int(n.max()) if n.size else 0
+    h = np.concatenate(([0.0], np.cumsum(1.0 / np.arange(1, top + 1))))
+    return h[n]
+
+
+def _series(n, x):
+    """
+    E_n(x) for 0 < x <= 1 and n >= 1, arrays of the same shape.
+    """
+    nm1 = n - 1
+    # first term, and psi(n) for the term i == n - 1
+    with np.errstate(divide='ignore'):
+        ans = np.where(nm1 != 0, 1.0 / np.maximum(nm1, 1), -np.log(x) - EULER)
+    psi = -EULER + _harmonic(nm1)
+    fact = np.ones_like(x)
+    active = np.arange(x.size)
+    for i in range(1, MAXIT + 1):
+        fact *= -x[active] / i
+        k = nm1[active]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            term = np.where(k != i, -fact / (i - k), fact * (-np.log(x[active]) + psi[active]))
+        ans[active] += term
+        done = np.abs(term) < np.abs(ans[active]) * EPS
+        if done.all():
+            break
+        keep = ~done
+        active = active[keep]
+        fact = fact[keep]
+    return ans
+
+
+def _fraction(n, x):
+    """
+    exp(x) E_n(x) for x > 1 and n >= 1, arrays of the same shape. Modified Lentz method.
+    """
+    b = x + n
+    c = np.full_like(x, 1.0 / _TINY)
+    d = 1.0 / b
+    h = d.copy()
+    active = np.arange(x.size)
+    for i in range(1, MAXIT + 1):
+        an = -i * (n[active] - 1.0 + i)
+        b = b + 2.0
+        d = 1.0 / (an * d + b)
+        c = b + an / c
+        delta = c * d
+        h[active] *= delta
+        done = np.abs(delta - 1.0) < EPS
+        if done.all():
+            break
+        keep = ~done
+        active, b, c, d = active[keep], b[keep], c[keep], d[keep]
+    return h
+
+
+def _evaluate(n, x, scaled):
+    n, x = np.broadcast_arrays(np.asarray(n), np.asarray(x, dtype=float))
+    shape = x.shape
+    n = n.astype(np.int64).ravel()
+    x = x.ravel()
+    if (n < 0).any() or (x < 0).any():
+        raise ValueError("expint needs n >= 0 and x >= 0")
+    out = np.empty_like(x)
+
+    # E_0(x) = exp(-x) / x, and x exp(x) E_0(x) = 1
+    zero = n == 0
+    with np.errstate(divide='ignore'):
+        out[zero] = 1.0 if scaled else np.exp(-x[zero]) / x[zero]
+
+    # E_n(0) = 1 / (n - 1), infinite for n = 1, and the scaled form is 0 for n > 1
+    at0 = (x == 0) & ~zero
+    with np.errstate(divide='ignore'):
+        out[at0] = np.where(n[at0] > 1, 0.0 if scaled else 1.0 / (n[at0] - 1.0), np.inf)
+
+    small = (x > 0) & (x <= 1) & ~zero
+    e = _series(n[small], x[small])
+    out[small] = e * x[small] * np.exp(x[small]) if scaled else e
+
+    large = (x > 1) & ~zero
+    h = _fraction(n[large], x[large])
+    out[large] = h * x[large] if scaled else h * np.exp(-x[large])
+    return out.reshape(shape)[()]  # a scalar for scalar arguments
+
+
+def expint(n, x):
+    """
+    Returns the exponential integral E_n(x) for integer n >= 0 and x >= 0, scalars or arrays which are
+    broadcast against each other. E_n(x) underflows to 0 for x > about 700.
+    """
+    return _evaluate(n, x, scaled=False)
+
+
+def expint_scaled(n, x):
+    """
+    Returns x exp(x) E_n(x), which tends to 1 for large x, without overflow.
+    """
+    return _evaluate(n, x, scaled=True)
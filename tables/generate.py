@@ -0,0 +1,255 @@
+"""
+Generate large tables of the Sievert integral and the exponential integrals, in parallel and resumable.
+
+The grid is split into chunks of b (or x) values, which a pool of processes computes with sievert_grid()
+and expint(). Each chunk is saved to its own .npy file when it is done, so a run which was interrupted is
+resumed by starting it again with the same grid: finished chunks are kept and only the missing ones are
+computed. At the end all chunks are merged into one table, which is written with tablewriter, e.g. as .npz
+file with the axes and the values.
+
+Each value is computed as sievert_grid() or expint() computes it for the whole grid at once, so the results
+are bit-identical to that, whatever the chunk size and the number of processes.
+
+example: python generate.py sievert -b 0:75:0.01 -d 0:90:0.1 -o sievert.npz -j 8
+"""
+import os
+import sys
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import tempfile
+import concurrent.futures
+from decimal import Decimal
+
+import numpy as np
+
+from expint import expint, expint_scaled
+from sievert import sievert_grid
+from tablewriter import SievertResult, ExpintResult, write, parse_target
+
+logger = logging.getLogger(__name__)
+
+# the grids of table_sievert_integral.py and table_exp_integral.py
+SIEVERT_B = "0,0.01,0.05,0.1,0.2,0.4,0.6,0.8,1,1.25,1.5,1.75,2,2.5,3,3.5,4,5,6,8,10,12,15,20,25,35,50,60,75"
+SIEVERT_DEGREES = "0,1,2.5,5,7.5,10,12.5,15,20,30,35,40,45,50,60,70,80,90"
+EXPINT_N = "1,2"
+
+
+def expint_x():
+    """
+    Returns the x values of table_exp_integral.py.
+    """
+    base_x = np.array([1.0, 1.5, 2.0, 2.5, 3, 4, 5, 6, 7, 8, 9])
+    x = np.array([])
+    for i in np.arange(-2, 2, 1, dtype=np.longdouble):
+        x = np.append(x, (10.0**i) * base_x)
+    return np.append(x, np.array([100, 150, 200, 500, 1000]))
+
+
+def parse_values(spec):
+    """
+    Returns an array of the values in spec, a comma separated list of numbers and ranges start:stop:step,
+    including stop. Range values are computed in decimal, so 0:1:0.1 gives the same numbers as 0,0.1,...,1.
+    """
+    values = []
+    for item in spec.split(","):
+        parts = item.strip().split(":")
+        if len(parts) == 1:
+            values.append(float(parts[0]))
+        elif len(parts) == 3:
+            start, stop, step = (Decimal(p) for p in parts)
+            if step <= 0 or stop < start:
+                raise ValueError("bad range {}".format(item))
+            count = int((stop - start) / step)
+            values.extend(float(start + k * step) for k in range(count + 1))
+        else:
+            raise ValueError("bad value or range {}".format(item))
+    return np.array(values)
+
+
+def deg2rad(x):
+    return (x / 180.0) * np.pi
+
+
+def sievert_chunk(bs, thetas):
+    """
+    Returns the Sievert integrals and their error estimates for bs and all thetas, shape (2, len(bs), len(thetas)).
+    """
+    return np.stack(sievert_grid(bs, thetas))
+
+
+def expint_chunk(xs, ns):
+    """
+    Returns E_n(x) and x exp(x) E_n(x) for all ns and xs, shape (2, len(ns), len(xs)).
+    """
+    n = ns[:, None].astype(np.int64)
+    return np.stack((expint(n, xs), expint_scaled(n, xs)))
+
+
+# kind: (chunk function, axis of the chunks in its result)
+KINDS = {
+    "sievert": (sievert_chunk, 1),
+    "expint": (expint_chunk, 2),
+}
+
+
+def _save(path, write):
+    """
+    Write the file path with write(f), atomically, so a partly written file is never left behind.
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def _chunk_job(job):
+    """
+    Compute one chunk and save it, in a worker process.
+    """
+    kind, path, split, other = job
+    t = time.perf_counter()
+    result = KINDS[kind][0](split, other)
+    _save(path, lambda f: np.save(f, result))
+    return path, time.perf_counter() - t
+
+
+def _load_chunk(path, shape):
+    """
+    Returns the chunk saved in path, or None if it is missing or does not have the expected shape.
+    """
+    try:
+        chunk = np.load(path, mmap_mode='r')
+    except Exception:  # missing or damaged, it is computed again
+        return None
+    if not isinstance(chunk, np.ndarray):
+        return None
+    return chunk if chunk.shape == shape else None
+
+
+def generate(kind, split, other, chunk_size=100, jobs=None, chunk_dir="."):
+    """
+    Compute the table kind ("sievert" or "expint") in chunks of chunk_size values of split, the b values or
+    the x values, with a pool of jobs processes (default: one per CPU). other are the theta values in rad,
+    or the n values.
+
+    The chunks are saved below chunk_dir, in a directory named after the grid, and chunks already there are
+    not computed again. Returns the directory and the two merged result arrays.
+    """
+    axis = KINDS[kind][1]
+    key = hashlib.sha1(repr((kind, split.tolist(), other.tolist(), chunk_size)).encode()).hexdigest()[:16]
+    directory = os.path.join(chunk_dir, "{}-{}".format(kind, key))
+    os.makedirs(directory, exist_ok=True)
+
+    starts = range(0, split.size, chunk_size)
+    paths = [os.path.join(directory, "chunk-{:05d}.npy".format(k)) for k in range(len(starts))]
+    jobs_todo = []
+    for path, i0 in zip(paths, starts):
+        part = split[i0:i0 + chunk_size]
+        shape = [2, other.size, other.size]
+        shape[axis] = part.size
+        if _load_chunk(path, tuple(shape)) is None:
+            jobs_todo.append((kind, path, part, other))
+    logger.info("{} table: {} chunks in {}, {} done before".format(kind, len(paths), directory,
+                                                                   len(paths) - len(jobs_todo)))
+
+    t = time.perf_counter()
+    if jobs_todo:
+        if jobs == 1:
+            results = map(_chunk_job, jobs_todo)
+            for k, (path, elapsed) in enumerate(results, 1):
+                logger.debug("{} done in {:.3f} s, {}/{}".format(path, elapsed, k, len(jobs_todo)))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+                futures = [pool.submit(_chunk_job, job) for job in jobs_todo]
+                for k, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    path, elapsed = future.result()
+                    logger.debug("{} done in {:.3f} s, {}/{}".format(path, elapsed, k, len(jobs_todo)))
+    logger.info("{} chunks computed in {:.3f} s".format(len(jobs_todo), time.perf_counter() - t))
+
+    merged = np.concatenate([np.load(path, mmap_mode='r') for path in paths], axis=axis)
+    return directory, merged[0], merged[1]
+
+
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Generate Sievert and exponential integral tables in parallel. "
+                                     "Values are comma separated lists of numbers and ranges start:stop:step.")
+    sub = parser.add_subparsers(dest="kind", required=True)
+
+    p = sub.add_parser("sievert", help="Sievert integral S(b, theta), with its error estimate")
+    p.add_argument("-b", "--b-values", default=SIEVERT_B, help="b values, default is the printed table")
+    p.add_argument("-d", "--degrees", default=SIEVERT_DEGREES, help="theta in degrees, default is the printed table")
+
+    p = sub.add_parser("expint", help="exponential integrals E_n(x), and x exp(x) E_n(x)")
+    p.add_argument("-n", "--orders", default=EXPINT_N, help="values of n, default {}".format(EXPINT_N))
+    p.add_argument("-x", "--x-values", default=None, help="x values, default is the printed table")
+
+    for p in sub.choices.values():
+        p.add_argument("-o", "--output", action='append', required=True,
+                       help="merged table, .npz, .csv or .tex file, or FORMAT:FILENAME. Can be given several times")
+        p.add_argument("-c", "--chunk-size", type=int, default=100, help="b or x values per chunk, default 100")
+        p.add_argument("-j", "--jobs", type=int, default=None,
+                       help="number of parallel processes, default is one per CPU")
+        p.add_argument("--chunk-dir", default=None,
+                       help="where the chunks are kept until the table is done, default is next to the output")
+        p.add_argument("-k", "--keep", action="store_true", help="keep the chunks after merging them")
+        p.add_argument('-v', '--verbosity', action='count', default=0, help="give more output. Option is additive")
+
+    parsed_args = parser.parse_args(args)
+
+    if parsed_args.verbosity == 1:
+        logging.basicConfig(level=logging.INFO)
+    elif parsed_args.verbosity > 1:
+        logging.basicConfig(level=logging.DEBUG)
+    else:
+        logging.basicConfig()
+
+    if parsed_args.chunk_size < 1:
+        parser.error("the chunk size must be at least 1")
+    try:
+        if parsed_args.kind == "sievert":
+            split = parse_values(parsed_args.b_values)
+            degrees = parse_values(parsed_args.degrees)
+            other = deg2rad(degrees)
+            if (degrees < 0).any() or (degrees > 90).any():
+                parser.error("theta must be from 0 to 90 degrees")
+            if (split < 0).any():
+                parser.error("b must not be negative")
+        else:
+            split = expint_x() if parsed_args.x_values is None else parse_values(parsed_args.x_values)
+            other = parse_values(parsed_args.orders)
+            if (other < 0).any() or (other != np.round(other)).any():
+                parser.error("n must be integers >= 0")
+            if (split < 0).any():
+                parser.error("x must not be negative")
+        files = [parse_target(target)[1] for target in parsed_args.output]
+    except (ValueError, ArithmeticError) as e:
+        parser.error(e)
+
+    files = [filename for filename in files if filename != "-"]
+    chunk_dir = parsed_args.chunk_dir or os.path.dirname(os.path.abspath(files[0] if files else "-"))
+    t = time.perf_counter()
+    directory, first, second = generate(parsed_args.kind, split, other, parsed_args.chunk_size, parsed_args.jobs,
+                                        chunk_dir)
+    if parsed_args.kind == "sievert":
+        table = SievertResult(split, degrees, first, second)
+    else:
+        table = ExpintResult(split, other, first, second)
+    for target in parsed_args.output:
+        write(target, table)
+    if not parsed_args.keep:
+        shutil.rmtree(directory)
+    logger.info("{} x {} table written to {} in {:.3f} s".format(split.size, other.size,
+                                                                 ", ".join(parsed_args.output),
+                                                                 time.perf_counter() - t))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
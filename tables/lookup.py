@@ -0,0 +1,228 @@
+"""
+Interpolation tables of the Sievert integral and the exponential integrals, for fast lookups from other code.
+
+The tables are computed once on dense grids, with sievert_grid() and expint(), and stored as .npy files in
+the cache directory, named after the grid parameters. Later they are memory mapped, so loading is instant
+and the pages are shared between processes.
+
+Values are interpolated with cubic Lagrange polynomials on 4 x 4 (or 4) grid points. When a table is built,
+the interpolation is compared with the exact values at the midpoints of all cells and cell edges, where its
+error is largest, and the error of each cell is stored with the table. Lookups in cells whose error is above
+the tolerance, and lookups outside the grid, are computed directly instead, with sievert_points() and expint().
+"""
+import os
+import hashlib
+import logging
+import tempfile
+
+import numpy as np
+
+from expint import expint, expint_scaled
+from sievert import sievert_grid, sievert_points
+
+logger = logging.getLogger(__name__)
+
+VERSION = 1  # increase when the stored tables change, so old files are not used
+
+
+def default_dir():
+    """
+    Returns the default table directory, ~/.cache/msftools/tables or below $XDG_CACHE_HOME.
+    """
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'msftools', 'tables')
+
+
+def _save(path, array):
+    """
+    Write array to the .npy file path, atomically, so other processes never see a partial table.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, array)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def cached(name, params, build, directory=None):
+    """
+    Returns the arrays (values, cell errors) of the table name with the grid params, memory mapped from the
+    cache directory, after calling build() to compute them if they are not there yet.
+    """
+    key = hashlib.sha1(repr((name, VERSION) + tuple(params)).encode()).hexdigest()[:16]
+    path = os.path.join(directory or default_dir(), "{}-{}".format(name, key))
+    try:
+        return np.load(path + ".npy", mmap_mode='r'), np.load(path + "-err.npy", mmap_mode='r')
+    except (OSError, ValueError):
+        pass
+    logger.info("Building {} table {}".format(name, params))
+    values, errors = build()
+    try:
+        _save(path + ".npy", values)
+        _save(path + "-err.npy", errors)
+    except OSError as e:
+        logger.warning("Could not store table {}: {}".format(path, e))
+        return values, errors
+    return np.load(path + ".npy", mmap_mode='r'), np.load(path + "-err.npy", mmap_mode='r')
+
+
+def stencil(pos, n):
+    """
+    Returns the first of 4 grid points around the fractional grid positions pos, on a grid of n points,
+    and the 4 cubic Lagrange weights of the points.
+    """
+    j0 = np.clip(np.floor(pos).astype(np.intp) - 1, 0, n - 4)
+    t = pos - j0
+    w = (-(t - 1) * (t - 2) * (t - 3) / 6, t * (t - 2) * (t - 3) / 2, -t * (t - 1) * (t - 3) / 2,
+         t * (t - 1) * (t - 2) / 6)
+    return j0, w
+
+
+def cell(pos, n):
+    """
+    Returns the grid cell of the fractional grid positions pos, on a grid of n points.
+    """
+    return np.clip(np.floor(pos).astype(np.intp), 0, n - 2)
+
+
+def interp1(table, pos):
+    j0, w = stencil(pos, table.shape[0])
+    return sum(w[c] * table[j0 + c] for c in range(4))
+
+
+def interp2(table, pi, pj):
+    i0, wi = stencil(pi, table.shape[0])
+    j0, wj = stencil(pj, table.shape[1])
+    return sum(wi[a] * sum(wj[c] * table[i0 + a, j0 + c] for c in range(4)) for a in range(4))
+
+
+class SievertTable():
+    """
+    Table of the Sievert integral S(b, theta) = int_0^theta exp(-b / cos t) dt, on a uniform grid of
+    b from 0 to b_max and theta from 0 to pi/2.
+    """
+
+    def __init__(self, b_max=100.0, nb=2001, ntheta=901, tol=1e-8, directory=None):
+        """
+        tol: largest absolute error of the interpolated values, cells with a larger error are integrated
+             directly.
+        directory: where the tables are stored, default is default_dir().
+        """
+        self.b_max = float(b_max)
+        self.nb = nb
+        self.ntheta = ntheta
+        self.tol = tol
+        self.bs = np.linspace(0.0, self.b_max, nb)
+        self.thetas = np.linspace(0.0, np.pi / 2, ntheta)
+        self.values, self.errors = cached("sievert", (self.b_max, nb, ntheta), self.build, directory)
+        self.direct = np.asarray(self.errors) > tol  # cells which are integrated instead
+        logger.info("Sievert table: {} of {} cells are integrated directly".format(self.direct.sum(),
+                                                                                   self.direct.size))
+
+    def build(self):
+        """
+        Returns the table values and the interpolation error of each cell.
+        """
+        values = sievert_grid(self.bs, self.thetas)[0]
+        bm = (self.bs[:-1] + self.bs[1:]) / 2
+        tm = (self.thetas[:-1] + self.thetas[1:]) / 2
+        ib = np.arange(self.nb, dtype=float)
+        it = np.arange(self.ntheta, dtype=float)
+
+        def error(b, t, pi, pj):
+            exact = sievert_grid(b, t)[0]
+            return np.abs(interp2(values, pi[:, None], pj[None, :]) - exact)
+
+        center = error(bm, tm, ib[:-1] + 0.5, it[:-1] + 0.5)
+        edge_b = error(self.bs, tm, ib, it[:-1] + 0.5)  # midpoints of the edges along theta
+        edge_t = error(bm, self.thetas, ib[:-1] + 0.5, it)
+        errors = np.maximum.reduce([center, edge_b[:-1], edge_b[1:], edge_t[:, :-1], edge_t[:, 1:]])
+        return values, errors
+
+    def __call__(self, b, theta):
+        """
+        Returns S(b, theta), b and theta are broadcast against each other.
+        """
+        b, theta = np.broadcast_arrays(np.asarray(b, dtype=float), np.asarray(theta, dtype=float))
+        if (theta < 0).any() or (theta > np.pi / 2).any():
+            raise ValueError("theta must be from 0 to pi/2")
+        if (b < 0).any():
+            raise ValueError("b must not be negative")
+        shape = b.shape
+        b, theta = b.ravel(), theta.ravel()
+        pi = b * ((self.nb - 1) / self.b_max)
+        pj = theta * ((self.ntheta - 1) / (np.pi / 2))
+        inside = b <= self.b_max
+        out = np.empty(b.shape)
+        out[inside] = interp2(self.values, pi[inside], pj[inside])
+        direct = ~inside
+        direct[inside] = self.direct[cell(pi[inside], self.nb), cell(pj[inside], self.ntheta)]
+        if direct.any():
+            out[direct] = sievert_points(b[direct], theta[direct])
+        return out.reshape(shape)[()]
+
+
+class ExpintTable():
+    """
+    Table of the exponential integrals E_n(x), n = 1 .. n_max, on a log-spaced grid of x from x_min to x_max.
+
+    The logarithm of the scaled form x exp(x) E_n(x) is stored, which is smooth in log(x).
+    """
+
+    def __init__(self, n_max=5, x_min=1e-4, x_max=1e3, nx=4001, tol=1e-10, directory=None):
+        """
+        tol: largest relative error of the interpolated values, cells with a larger error are computed
+             directly with expint().
+        directory: where the tables are stored, default is default_dir().
+        """
+        self.n_max = n_max
+        self.u_min = np.log(x_min)
+        self.u_max = np.log(x_max)
+        self.nx = nx
+        self.tol = tol
+        self.us = np.linspace(self.u_min, self.u_max, nx)
+        self.values, self.errors = cached("expint", (n_max, x_min, x_max, nx), self.build, directory)
+        self.direct = np.asarray(self.errors) > tol
+
+    def build(self):
+        """
+        Returns the table values, one row per n, and the relative interpolation error of each cell.
+        """
+        n = np.arange(1, self.n_max + 1)[:, None]
+        values = np.log(expint_scaled(n, np.exp(self.us)[None, :]))
+        um = (self.us[:-1] + self.us[1:]) / 2
+        pos = np.arange(self.nx - 1) + 0.5
+        exact = np.log(expint_scaled(n, np.exp(um)[None, :]))
+        errors = np.array([np.abs(np.expm1(interp1(values[k], pos) - exact[k])) for k in range(self.n_max)])
+        return values, errors
+
+    def __call__(self, n, x, scaled=False):
+        """
+        Returns E_n(x), or x exp(x) E_n(x) if scaled is set. n and x are broadcast against each other.
+        """
+        n, x = np.broadcast_arrays(np.asarray(n), np.asarray(x, dtype=float))
+        shape = x.shape
+        n = n.astype(np.int64).ravel()
+        x = x.ravel()
+        with np.errstate(divide='ignore'):
+            u = np.log(x)
+        pos = (u - self.u_min) * ((self.nx - 1) / (self.u_max - self.u_min))
+        inside = (n >= 1) & (n <= self.n_max) & (u >= self.u_min) & (u <= self.u_max)
+        direct = ~inside
+        direct[inside] = self.direct[n[inside] - 1, cell(pos[inside], self.nx)]
+        use = inside & ~direct
+
+        out = np.empty(x.shape)
+        j0, w = stencil(pos[use], self.nx)
+        log_scaled = sum(w[k] * self.values[n[use] - 1, j0 + k] for k in range(4))
+        if scaled:
+            out[use] = np.exp(log_scaled)
+        else:
+            out[use] = np.exp(log_scaled - u[use] - x[use])
+        if direct.any():
+            out[direct] = (expint_scaled if scaled else expint)(n[direct], x[direct])
+        return out.reshape(shape)[()]
@@ -1,6 +1,9 @@
 from math import log10
 from math import floor
 from math import fabs
+from functools import lru_cache
+
+import numpy as np
 
 
 def pretty(x, min_digits=4, exponent=2):
@@ -38,6 +41,47 @@ def pretty(x, min_digits=4, exponent=2):
     return _fmt.format(x)
 
 
+@lru_cache(maxsize=None)
+def _format(digits, kind):
+    return "{:." + str(digits) + kind + "}\0"
+
+
+def pretty_array(x, min_digits=4, exponent=2):
+    """
+    pretty() for a whole array, returns an array of strings of the same shape, or a string for a scalar.
+
+    The exponents of all values are computed at once, and the values are formatted in groups which share a
+    format. The output is identical to pretty() on each value.
+    """
+    x = np.asarray(x)
+    if not np.isfinite(x).all():  # pretty() raises on these
+        return np.array([pretty(v, min_digits, exponent) for v in x.ravel().tolist()]).reshape(x.shape)
+    flat = x.ravel()
+    a = np.abs(flat).astype(float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lg = np.log10(a)
+        # math.log10 may round differently next to integers, which changes the floor, so use it there
+        near = np.abs(lg - np.round(lg)) < 1e-9
+    lg[near] = [log10(v) for v in a[near].tolist()]
+    dd = np.where(a < 1, min_digits, min_digits - np.floor(lg) - 1)
+    dd = np.maximum(dd, 0).astype(int)
+
+    expo = ((flat > 0) & (a <= float(10**(-exponent)))) | (a >= float(10**(exponent + 1)))
+    dd[expo] = min_digits - 1
+    code = np.where(expo, -1 - dd, dd)  # one code per format, negative for exponents
+
+    out = np.empty(flat.size, dtype=object)
+    for c in np.unique(code).tolist():
+        fmt = _format(-1 - c, 'e') if c < 0 else _format(c, 'f')
+        idx = np.flatnonzero(code == c)
+        # one format call for the whole group, which is faster than one per value
+        out[idx] = (fmt * idx.size).format(*flat[idx].tolist()).split("\0")[:-1]
+    if x.ndim == 0:
+        return out[0]
+    return out.astype(str).reshape(x.shape)
+
+
 # note that funny rounding effects may happen, as 1.2345 may be stored as 1.2344999999999999999999999992519
 # which rounds to 1.234
 #
@@ -0,0 +1,124 @@
+"""
+Sievert integral S(b, theta) = int_0^theta exp(-b / cos t) dt, evaluated on whole grids of b and theta at once.
+
+All theta values are sorted and used as break points, so the integral up to each theta is the sum of the
+integrals over the sub-intervals before it, and every sub-interval is only integrated once. Sub-intervals
+are split into panels of fixed order Gauss-Legendre quadrature, with panels shrinking geometrically towards
+theta = pi/2, where the integrand drops steeply to zero for small b.
+"""
+import numpy as np
+
+ORDER = 20  # Gauss-Legendre points per panel
+MAX_PANEL = 0.05  # largest panel width in rad
+GRADING = 40  # number of geometrically shrinking panels below pi/2
+BLOCK = 256  # values of b evaluated together, to limit memory use
+
+
+def _panels(thetas):
+    """
+    Returns the panel edges from 0 to max(thetas), and the index of the edge at each of thetas.
+    """
+    top = thetas.max()
+    edges = [np.unique(np.concatenate(([0.0], thetas)))]
+    # geometric grading towards pi/2, distances pi/2 * 2^-k
+    graded = np.pi / 2 * (1.0 - 0.5**np.arange(1, GRADING + 1))
+    edges.append(graded[graded < top])
+    edges = np.unique(np.concatenate(edges))
+    # split wide panels
+    widths = np.diff(edges)
+    splits = np.maximum(1, np.ceil(widths / MAX_PANEL).astype(int))
+    fine = [edges[:1]]
+    for a, w, k in zip(edges[:-1], widths, splits):
+        fine.append(a + w * np.arange(1, k + 1) / k)
+    edges = np.concatenate(fine)
+    edges[-1] = top
+    return edges, np.searchsorted(edges, thetas)
+
+
+def _rule(edges, order):
+    """
+    Returns the nodes and weights of order point Gauss-Legendre on all panels, as (panels, order) arrays.
+    """
+    x, w = np.polynomial.legendre.leggauss(order)
+    a = edges[:-1, None]
+    h = np.diff(edges)[:, None] / 2.0
+    return a + h * (x + 1.0), h * w
+
+
+def _sum(b, sec, w):
+    """
+    Returns the panel integrals of exp(-b sec) for all b, with sec = 1 / cos of the nodes, as (len(b), panels).
+    """
+    f = np.exp(np.multiply.outer(-b, sec))  # the nodes are inside the panels, so sec is finite
+    return np.einsum('ijk,jk->ij', f, w)
+
+
+def sievert_grid(bs, thetas, order=ORDER):
+    """
+    Returns S(b, theta) for all combinations of bs and thetas (in rad, 0 to pi/2), as array of shape
+    (len(bs), len(thetas)), and an estimate of the absolute error of each value.
+
+    The error estimate is the difference to the same panels integrated with half the order, plus the rounding
+    error of the sums. It is usually much larger than the actual error, until both reach the rounding level.
+    """
+    bs = np.atleast_1d(np.asarray(bs, dtype=float))
+    thetas = np.atleast_1d(np.asarray(thetas, dtype=float))
+    if (thetas < 0).any() or (thetas > np.pi / 2).any():
+        raise ValueError("theta must be from 0 to pi/2")
+    if (bs < 0).any():
+        raise ValueError("b must not be negative")
+    if not thetas.size or not bs.size:
+        return np.zeros((bs.size, thetas.size)), np.zeros((bs.size, thetas.size))
+
+    edges, idx = _panels(thetas)
+    t, w = _rule(edges, order)
+    t2, w2 = _rule(edges, max(2, order // 2))
+    sec, sec2 = 1.0 / np.cos(t), 1.0 / np.cos(t2)
+
+    values = np.empty((bs.size, thetas.size))
+    errors = np.empty((bs.size, thetas.size))
+    for i0 in range(0, bs.size, BLOCK):
+        b = bs[i0:i0 + BLOCK]
+        panel = _sum(b, sec, w)
+        coarse = _sum(b, sec2, w2)
+        # integrals from 0 to each edge, reused by all larger theta, with the quadrature and rounding errors
+        cum = np.concatenate((np.zeros((b.size, 1)), np.cumsum(panel, axis=1)), axis=1)
+        err = np.abs(panel - coarse) + 4 * np.finfo(float).eps * np.abs(panel)
+        err = np.concatenate((np.zeros((b.size, 1)), np.cumsum(err, axis=1)), axis=1)
+        values[i0:i0 + BLOCK] = cum[:, idx]
+        errors[i0:i0 + BLOCK] = err[:, idx]
+    return values, errors
+
+
+def sievert_points(b, theta, order=ORDER):
+    """
+    Returns S(b, theta) for arrays of b and theta broadcast against each other, one value per pair, e.g. for
+    scattered points where a grid would be wasteful.
+
+    The integral is taken over t = theta s, with the same panels in s for all points, uniform up to s = 1/2
+    and shrinking geometrically towards s = 1.
+    """
+    b, theta = np.broadcast_arrays(np.asarray(b, dtype=float), np.asarray(theta, dtype=float))
+    if (theta < 0).any() or (theta > np.pi / 2).any():
+        raise ValueError("theta must be from 0 to pi/2")
+    if (b < 0).any():
+        raise ValueError("b must not be negative")
+    shape = b.shape
+    b, theta = b.ravel(), theta.ravel()
+    k = int(np.ceil(np.pi / 4 / MAX_PANEL))
+    edges = np.concatenate((np.linspace(0.0, 0.5, k + 1), 1.0 - 0.5**np.arange(2, GRADING + 1), [1.0]))
+    s, w = _rule(edges, order)
+    s, w = s.ravel(), w.ravel()
+    out = np.empty(b.shape)
+    for i0 in range(0, b.size, BLOCK):
+        th = theta[i0:i0 + BLOCK, None]
+        f = np.exp(-b[i0:i0 + BLOCK, None] / np.cos(th * s))  # s < 1, so cos is positive
+        out[i0:i0 + BLOCK] = th[:, 0] * (f @ w)
+    return out.reshape(shape)[()]
+
+
+def sievert(b, theta):
+    """
+    Returns S(b, theta) for a single b and theta.
+    """
+    return sievert_grid([b], [theta])[0][0, 0]
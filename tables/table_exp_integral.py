@@ -1,16 +1,10 @@
-import numpy as np
-from scipy.integrate import quad
-
-
-def integrand(t, n, x):
-    return np.exp(-x*t) / t**n
-
-
-def expint(n, x):
-    return quad(integrand, 1, np.inf, args=(n, x), epsrel=1e-10)[0]
+import sys
+import argparse
 
+import numpy as np
 
-vec_expint = np.vectorize(expint)
+from expint import expint, expint_scaled
+from tablewriter import ExpintResult, write, parse_target
 
 base_x = np.array([1.0, 1.5, 2.0, 2.5, 3, 4, 5, 6, 7, 8, 9])
 
@@ -21,13 +15,29 @@ for i in np.arange(-2, 2, 1, dtype=np.longdouble):
 
 x = np.append(x, np.array([100, 150, 200, 500, 1000]))
 
-n = 2
-
-e1 = vec_expint(1, x)
-e2 = vec_expint(2, x)
-
-e1_bar = e1 * x * np.exp(x)
-e2_bar = e2 * x * np.exp(x)
 
-for i, xx in enumerate(x):
-    print("{:8.3g} & {:12.5e} & {:12.5e} & {:12.7f} & {:12.6f}\\\\".format(x[i], e1[i], e2[i], e1_bar[i], e2_bar[i]))
+def main(args=sys.argv[1:]):
+    parser = argparse.ArgumentParser(description="Table of the exponential integrals E_1 and E_2.")
+    parser.add_argument("-o", "--output", action='append', default=None,
+                        help="output file, .tex, .csv or .npz, or FORMAT:FILENAME. "
+                        "Can be given several times, default is LaTeX on standard out")
+    parsed_args = parser.parse_args(args)
+    outputs = parsed_args.output or ["-"]
+    try:
+        for target in outputs:
+            parse_target(target)
+    except ValueError as e:
+        parser.error(e)
+
+    n = np.array([1, 2])
+    e = expint(n[:, None], x)
+    # scaled forms, which do not overflow for large x
+    e_bar = expint_scaled(n[:, None], x)
+    table = ExpintResult(x, n, e, e_bar)
+    for target in outputs:
+        write(target, table)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,169 @@
+"""
+Writers for computed tables, separate from the computation, so one computation can be written in all formats.
+
+A table is a SievertResult or an ExpintResult, which hold the NumPy arrays of the axes and values. The writers
+turn it into LaTeX, as printed by table_sievert_integral.py and table_exp_integral.py, CSV with values at full
+precision, or a .npz file of the arrays, which numpy.load reads directly. Each output is built in memory and
+written with a single write.
+"""
+import io
+import os
+import sys
+import csv
+
+import numpy as np
+
+from prettyfloat import pretty_array
+
+WRITERS = {}  # format name: function(table) returning the file contents as bytes
+SUFFIXES = {}  # file suffix: format name of the writer
+
+
+def register_writer(name, write, suffixes=()):
+    """
+    Register a writer as format name, which is also used for output files with one of suffixes.
+
+    write(table) returns the whole file for the SievertResult or ExpintResult table, as bytes.
+    """
+    WRITERS[name] = write
+    for suffix in suffixes:
+        SUFFIXES[suffix] = name
+
+
+class SievertResult():
+    """
+    Sievert integrals values[i, j] for b[i] and theta = degrees[j], and optionally their error estimates.
+    """
+    __slots__ = ('b', 'degrees', 'values', 'errors')
+
+    def __init__(self, b, degrees, values, errors=None):
+        self.b = np.asarray(b, dtype=float)
+        self.degrees = np.asarray(degrees, dtype=float)
+        self.values = np.asarray(values)
+        self.errors = errors
+
+    def arrays(self):
+        arrays = {"b": self.b, "degrees": self.degrees, "theta": (self.degrees / 180.0) * np.pi,
+                  "values": self.values}
+        if self.errors is not None:
+            arrays["errors"] = np.asarray(self.errors)
+        return arrays
+
+
+class ExpintResult():
+    """
+    Exponential integrals e[k, i] = E_n(x) and scaled[k, i] = x exp(x) E_n(x) for n = n[k] and x = x[i].
+    """
+    __slots__ = ('x', 'n', 'e', 'scaled')
+
+    def __init__(self, x, n, e, scaled):
+        self.x = np.asarray(x, dtype=float)
+        self.n = np.asarray(n, dtype=np.int64)
+        self.e = np.asarray(e)
+        self.scaled = np.asarray(scaled)
+
+    def arrays(self):
+        return {"n": self.n, "x": self.x, "e": self.e, "scaled": self.scaled}
+
+
+def _latex_sievert(table, f, columns=6):
+    """
+    The LaTeX table in blocks of columns angles, with rows of the degrees and radians above each block.
+    """
+    cells = pretty_array(table.values, min_digits=6)
+    heads = pretty_array(table.arrays()["theta"], min_digits=6)
+    for j0 in range(0, table.degrees.size, columns):
+        block = slice(j0, j0 + columns)
+        f.write("   $\\theta [^\\circ]\\rightarrow$ & ")
+        f.write(" & ".join("{:6.1f}$^\\circ$".format(d) for d in table.degrees[block]) + "\\\\\n")
+        f.write("    $b \\downarrow \\theta [rad] \\rightarrow$  & ")
+        f.write(" & ".join(heads[block]) + "\\\\\n")
+        f.write("\\hline\n\\hline\n")
+        for b, row in zip(table.b, cells[:, block]):
+            f.write("{:6.2f} & ".format(b) + " & ".join(row) + "\\\\\n")
+        f.write("\n\n\n")
+
+
+def _latex_expint(table, f):
+    """
+    One row per x, with E_n(x) and then x exp(x) E_n(x) for all n.
+    """
+    formats = ["{:12.5e}"] * table.n.size + ["{:12.7f}"] + ["{:12.6f}"] * (table.n.size - 1)
+    columns = np.concatenate((table.e, table.scaled)).T.tolist()
+    for x, row in zip(table.x.tolist(), columns):
+        f.write("{:8.3g} & ".format(x) + " & ".join(fmt.format(v) for fmt, v in zip(formats, row)) + "\\\\\n")
+
+
+def write_latex(table):
+    """
+    The table as printed by table_sievert_integral.py or table_exp_integral.py.
+    """
+    f = io.StringIO()
+    if isinstance(table, SievertResult):
+        _latex_sievert(table, f)
+    else:
+        _latex_expint(table, f)
+    return f.getvalue().encode()
+
+
+def write_csv(table):
+    """
+    A header line and one line per b or x. The Sievert columns are the angles in degrees.
+    """
+    f = io.StringIO()
+    writer = csv.writer(f, lineterminator="\n")
+    if isinstance(table, SievertResult):
+        writer.writerow(["b"] + table.degrees.tolist())
+        writer.writerows([b] + row for b, row in zip(table.b.tolist(), table.values.tolist()))
+    else:
+        writer.writerow(["x"] + ["E{}".format(n) for n in table.n.tolist()] +
+                        ["E{}_scaled".format(n) for n in table.n.tolist()])
+        columns = np.concatenate((table.e, table.scaled)).T.tolist()
+        writer.writerows([x] + row for x, row in zip(table.x.tolist(), columns))
+    return f.getvalue().encode()
+
+
+def write_npz(table):
+    """
+    The arrays of the table as uncompressed .npz, for numpy.load.
+    """
+    f = io.BytesIO()
+    np.savez(f, **table.arrays())
+    return f.getvalue()
+
+
+register_writer("latex", write_latex, (".tex",))
+register_writer("csv", write_csv, (".csv",))
+register_writer("npz", write_npz, (".npz",))
+
+
+def parse_target(target):
+    """
+    Returns (format name, filename) of an output target, which is a filename, FORMAT:FILENAME,
+    or "-" for LaTeX on standard out.
+    """
+    name, sep, filename = target.partition(":")
+    if sep and name in WRITERS:
+        return name, filename
+    if target == "-":
+        return "latex", "-"
+    suffix = os.path.splitext(target)[1].lower()
+    if suffix not in SUFFIXES:
+        raise ValueError("Unknown output format of {}, use one of {} as FORMAT:{}".format(
+            target, ", ".join(sorted(WRITERS)), target))
+    return SUFFIXES[suffix], target
+
+
+def write(target, table):
+    """
+    Write table to target, see parse_target(), with a single write.
+    """
+    name, filename = parse_target(target)
+    data = WRITERS[name](table)
+    if filename == "-":
+        sys.stdout.flush()
+        sys.stdout.buffer.write(data)
+        sys.stdout.buffer.flush()
+    else:
+        with open(filename, 'wb') as f:
+            f.write(data)
@@ -0,0 +1,155 @@
+"""
+Mapping of event dates from one course term to another.
+
+Each event keeps its weekday and its week relative to the first week of the course, and events which then
+fall on a Swedish public holiday are moved to the next open day, Monday to Friday. Dates are handled as numpy
+arrays of datetime64[D], so all events of a calendar are mapped at once.
+"""
+import datetime
+import functools
+
+import numpy as np
+
+_EPOCH = datetime.date(1970, 1, 1).toordinal()
+_NAT = np.datetime64('NaT').astype(np.int64)
+
+
+def easter(year):
+    """
+    Returns the date of Easter Sunday in year, Gregorian calendar (anonymous Gregorian algorithm).
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    el = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * el) // 451
+    month, day = divmod(h + el - 7 * m + 114, 31)
+    return datetime.date(year, month, day + 1)
+
+
+def _weekday_between(year, month, day, weekday):
+    """
+    Returns the first date on or after year-month-day with the given weekday, Monday is 0.
+    """
+    d = datetime.date(year, month, day)
+    return d + datetime.timedelta(days=(weekday - d.weekday()) % 7)
+
+
+def holidays(year):
+    """
+    Returns a dict of the Swedish public holidays of year, date: name.
+
+    Midsummer Eve, Christmas Eve and New Year's Eve are not public holidays by law, but are days off
+    in practice and included.
+    """
+    e = easter(year)
+    days = {
+        datetime.date(year, 1, 1): "New Year's Day",
+        datetime.date(year, 1, 6): "Epiphany",
+        e - datetime.timedelta(days=2): "Good Friday",
+        e: "Easter Sunday",
+        e + datetime.timedelta(days=1): "Easter Monday",
+        datetime.date(year, 5, 1): "May Day",
+        e + datetime.timedelta(days=39): "Ascension Day",
+        e + datetime.timedelta(days=49): "Whitsunday",
+        datetime.date(year, 6, 6): "National Day",
+        _weekday_between(year, 6, 19, 4): "Midsummer Eve",
+        _weekday_between(year, 6, 20, 5): "Midsummer Day",
+        _weekday_between(year, 10, 31, 5): "All Saints' Day",
+        datetime.date(year, 12, 24): "Christmas Eve",
+        datetime.date(year, 12, 25): "Christmas Day",
+        datetime.date(year, 12, 26): "Boxing Day",
+        datetime.date(year, 12, 31): "New Year's Eve",
+    }
+    return days
+
+
+def to_days(dates):
+    """
+    Returns a sequence of datetime.date (or None) as numpy array of datetime64[D], None becomes NaT.
+    """
+    # much faster than np.array(dates, dtype='datetime64[D]'), which converts every date on its own
+    days = np.fromiter((_NAT if d is None else d.toordinal() - _EPOCH for d in dates), dtype=np.int64,
+                       count=len(dates))
+    return days.view('datetime64[D]')
+
+
+def weekday(days):
+    """
+    Returns the weekdays of an array of datetime64[D], Monday is 0.
+    """
+    return (days.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday
+
+
+@functools.lru_cache(maxsize=None)
+def holiday_table(first_year, last_year):
+    """
+    Returns two numpy arrays for the days from January 1st of first_year to December 31st of last_year,
+    indexed by the number of days from that January 1st: whether the day is a holiday, and the number of
+    days to the next open day (0 if it is open).
+
+    Open days are Monday to Friday, except Swedish public holidays.
+    """
+    first = np.datetime64('{:04d}-01-01'.format(first_year))
+    n = (np.datetime64('{:04d}-01-01'.format(last_year + 1)) - first).astype(np.int64)
+    day = np.arange(n)
+    holiday = np.zeros(n, dtype=bool)
+    for year in range(first_year, last_year + 1):
+        holiday[(to_days(list(holidays(year))) - first).astype(np.int64)] = True
+    closed = holiday | (weekday(first + day) >= 5)
+    # index of the next open day, as running minimum from the end
+    nxt = np.where(closed, n, day)
+    nxt = np.minimum.accumulate(nxt[::-1])[::-1]
+    return holiday, nxt - day
+
+
+def skip_holidays(days):
+    """
+    Returns the array days (datetime64[D]) with the days which are holidays moved to the next open day,
+    see holiday_table().
+    """
+    known = ~np.isnat(days)
+    valid = days[known]
+    if not len(valid):
+        return days
+    first_year = int(str(valid.min().astype('datetime64[Y]')))
+    last_year = int(str(valid.max().astype('datetime64[Y]'))) + 1  # room for moving past New Year
+    holiday, wait = holiday_table(first_year, last_year)
+    idx = (valid - np.datetime64('{:04d}-01-01'.format(first_year))).astype(np.int64)
+    out = days.copy()
+    out[known] = valid + np.where(holiday[idx], wait[idx], 0).astype('timedelta64[D]')
+    return out
+
+
+def map_dates(dates, old_start, new_start, avoid_holidays=True):
+    """
+    Map the dates of a course which started on old_start to a course starting on new_start.
+
+    Each date keeps its weekday and its offset in weeks from old_start. All dates are moved by the same
+    number of whole weeks, the fewest which move old_start to new_start or later, so the first events are
+    on the first day of the new course with the weekday of old_start. With avoid_holidays, dates on a
+    holiday are moved to the next open day.
+
+    dates: array of datetime64[D], NaT for unknown dates.
+    old_start, new_start: datetime.date.
+    Returns an array of datetime64[D] of the new dates.
+    """
+    weeks = -(-(new_start - old_start).days // 7)  # rounded up, so nothing is moved before new_start
+    new = dates + np.timedelta64(7 * weeks, 'D')
+    if avoid_holidays:
+        new = skip_holidays(new)
+    return new
+
+
+def shift_days(dates, old_start, new_start, avoid_holidays=True):
+    """
+    Returns the number of days each of dates is shifted by map_dates(), as numpy integer array, 0 for NaT.
+    """
+    new = map_dates(dates, old_start, new_start, avoid_holidays)
+    delta = (new - dates).astype(np.int64)
+    delta[np.isnat(dates)] = 0
+    return delta
@@ -0,0 +1,98 @@
+"""
+Reading lessons from Athena XML exports with athena2xlsx.
+"""
+import io
+import xml.sax
+
+import pytest
+
+import athena2xlsx
+
+EXPORT = (
+    '<?xml version="1.0" encoding="utf-8"?>\n'
+    '<plan>\n<lessons>\n'
+    '<lesson>\n'
+    '  <name>Lab: Ionisationskammare &amp; elektrometer</name>\n'
+    '  <description>Dosimetri i vatten, &lt;5 % osäkerhet &#8211; se kap. 4</description>\n'
+    '  <start>2019-11-19T13:15:00</start>\n'
+    '  <stop>2019-11-19T17:00:00</stop>\n'
+    '  <objectives>\n'
+    '    <objective><name>Objective 1</name><description>Not the lesson</description>\n'
+    '      <objectives><objective><name>Nested objective</name></objective></objectives>\n'
+    '      <start>2000-01-01T00:00:00</start>\n'
+    '    </objective>\n'
+    '  </objectives>\n'
+    '  <customs>\n'
+    '    <custom colName="Room">Fysikum FA31</custom>\n'
+    '    <custom colName="Teacher">Bo Ström</custom>\n'
+    '  </customs>\n'
+    '</lesson>\n'
+    '<lesson>\n'
+    '  <name>Lecture 1: Radiation dosimetry</name>\n'
+    '  <start>2019-11-18T09:00:00</start>\n'
+    '  <stop>2019-11-18T10:45:00</stop>\n'
+    '  <customs><custom colName="Location">FB42</custom></customs>\n'
+    '</lesson>\n'
+    '</lessons>\n</plan>\n').encode('utf-8')
+
+
+def fields(lessons):
+    return [(cl.name, cl.description, cl.start, cl.stop, cl.room, cl.teacher) for cl in lessons]
+
+
+EXPECTED = [
+    ("Lab: Ionisationskammare & elektrometer", "Dosimetri i vatten, <5 % osäkerhet – se kap. 4",
+     "2019-11-19T13:15:00", "2019-11-19T17:00:00", "Fysikum FA31", "Bo Ström"),
+    ("Lecture 1: Radiation dosimetry", "", "2019-11-18T09:00:00", "2019-11-18T10:45:00", "FB42", ""),
+]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 65536])
+def test_chunks(chunk_size):
+    """
+    Text split across chunks of the file, also inside entities and multibyte characters, is joined again.
+    """
+    lessons = list(athena2xlsx.iter_lessons(io.BytesIO(EXPORT), chunk_size=chunk_size))
+    assert fields(lessons) == EXPECTED
+
+
+def test_entities():
+    name, description = EXPECTED[0][:2]
+    assert "&" in name and "&amp;" not in name
+    assert "<5" in description and "–" in description
+    lesson = athena2xlsx.read_lessons(io.BytesIO(EXPORT))[1]
+    assert (lesson.name, lesson.description) == (name, description)
+
+
+def test_objectives():
+    """
+    Nothing inside <objectives> changes the lesson, also not nested objectives, and the fields after them
+    are read.
+    """
+    lesson = next(athena2xlsx.iter_lessons(io.BytesIO(EXPORT)))
+    assert lesson.name == EXPECTED[0][0]
+    assert lesson.dt_start.strftime("%Y-%m-%d %H:%M %Z") == "2019-11-19 14:15 CET"  # exported in UTC
+    assert (lesson.room, lesson.teacher) == ("Fysikum FA31", "Bo Ström")
+
+
+def test_sorted():
+    assert [cl.name for cl in athena2xlsx.read_lessons(io.BytesIO(EXPORT))] == [e[0] for e in EXPECTED[::-1]]
+
+
+@pytest.mark.parametrize("data", [b"", b"<plan><lessons>", b"<plan></lessons>"], ids=["empty", "open", "mismatch"])
+def test_errors(data, tmp_path):
+    """
+    Empty and broken files raise the same SAXParseException as xml.sax.
+    """
+    with pytest.raises(xml.sax.SAXParseException) as expected:
+        xml.sax.parse(io.BytesIO(data), xml.sax.ContentHandler())
+    with pytest.raises(xml.sax.SAXParseException) as e:
+        list(athena2xlsx.iter_lessons(io.BytesIO(data)))
+    assert str(e.value) == str(expected.value)
+
+    filename = tmp_path / "export.xml"
+    filename.write_bytes(data)
+    with pytest.raises(xml.sax.SAXParseException) as e:
+        athena2xlsx.read_lessons(str(filename))
+    assert str(e.value).startswith(str(filename) + ":")
+    assert e.value.getMessage() == expected.value.getMessage()
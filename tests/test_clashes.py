@@ -0,0 +1,108 @@
+"""
+Room and teacher double-bookings found by clashes.ClashIndex.
+"""
+import os
+import random
+import datetime
+
+import clashes
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+DAY = datetime.datetime(2019, 11, 18)
+
+
+def at(hours):
+    return DAY + datetime.timedelta(hours=hours)
+
+
+def found(index):
+    """
+    Returns the clashes of index as sorted list of (kind, resource, first name, second name).
+    """
+    return sorted((c.kind, c.resource, c.first.name, c.second.name) for c in index.clashes())
+
+
+def test_resources():
+    assert clashes.resources("A, B och C") == ["A", "B", "C"]
+    assert clashes.resources("A/B") == ["A", "B"]
+    assert clashes.resources(" FA31 and FB41; FB42 & FB43 ") == ["FA31", "FB41", "FB42", "FB43"]
+    assert clashes.resources("") == []
+
+
+def test_touching():
+    """
+    A booking which starts when the other ends does not clash with it.
+    """
+    index = clashes.ClashIndex()
+    index.add("FK5031", "first", at(8), at(10), ["A"])
+    index.add("FK5032", "second", at(10), at(12), ["A"])
+    index.add("FK5033", "third", at(12), at(12), ["A"])  # no duration, ignored
+    assert found(index) == []
+
+
+def test_several_resources():
+    index = clashes.ClashIndex()
+    index.add("FK5031", "first", at(8), at(10), clashes.resources("A, B och C"), ["Smith"])
+    index.add("FK5032", "second", at(9), at(11), clashes.resources("A/B"), ["smith"])
+    index.add("FK5033", "third", at(10), at(11), clashes.resources("C, c"))  # C once, in any case
+    assert found(index) == [("room", "A", "first", "second"), ("room", "B", "first", "second"),
+                            ("teacher", "Smith", "first", "second")]
+    c = next(c for c in index.clashes() if c.resource == "A")
+    assert (c.dt_start.hour, c.dt_stop.hour) == (9, 10)
+
+
+def test_against_all_pairs():
+    """
+    The sweep finds the same clashes as comparing all pairs of bookings.
+    """
+    rng = random.Random(1)
+    index = clashes.ClashIndex()
+    bookings = []
+    for k in range(300):
+        start = rng.randrange(0, 48) / 4
+        stop = start + rng.choice([0.75, 1, 1.75, 2])
+        rooms = rng.sample(["A", "B", "C", "D"], rng.choice([1, 1, 2]))
+        index.add("course", str(k), at(start), at(stop), rooms)
+        bookings.append((str(k), start, stop, rooms))
+
+    expected = []
+    for i, (n1, s1, e1, r1) in enumerate(bookings):
+        for n2, s2, e2, r2 in bookings[i + 1:]:
+            for room in set(r1) & set(r2):
+                if s1 < e2 and s2 < e1:
+                    expected.append(("room", room, tuple(sorted((n1, n2)))))
+    assert expected
+    assert sorted((kind, room, tuple(sorted(names))) for kind, room, *names in found(index)) == sorted(expected)
+
+
+def test_overlapping():
+    index = clashes.ClashIndex()
+    index.add("FK5031", "long", at(8), at(17), ["A"])
+    index.add("FK5031", "morning", at(8), at(10), ["A"])
+    index.add("FK5031", "noon", at(12), at(13), ["A"])
+    index.add("FK5031", "evening", at(18), at(19), ["A", "B"])
+
+    def names(start, stop, resource="A", kind="room"):
+        return sorted(b.name for b in index.overlapping(kind, resource, at(start), at(stop)))
+
+    assert names(10, 12) == ["long"]  # touching at both ends
+    assert names(9, 12.5) == ["long", "morning", "noon"]
+    assert names(16.5, 18.5) == ["evening", "long"]
+    assert names(17, 18) == []
+    assert names(18, 19, "b") == ["evening"]
+    assert names(8, 19, "C") == []
+    assert names(8, 19, "A", "teacher") == []
+
+    index.add("FK5032", "late", at(16), at(20), ["A"])  # the index is built again after adding
+    assert names(17, 18) == ["late"]
+
+
+def test_calendar():
+    """
+    Events of an iCal file, where the floating lab at 08:00 and the briefing at 08:30 share the lab.
+    All-day events do not book their location.
+    """
+    index = clashes.index_files([os.path.join(DATA, "course.ics")])
+    assert found(index) == [("room", "Lab", "Lab (floating time)", "Lab safety briefing")]
+    assert "Aula" not in index.names
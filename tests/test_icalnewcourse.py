@@ -0,0 +1,190 @@
+"""
+Shifting calendars to a new course start with icalnewcourse.
+"""
+import io
+import os
+import shutil
+import datetime
+
+import pytest
+
+import icalnewcourse
+import icalreader
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+SHIFT_INPUT = (
+    b"BEGIN:VCALENDAR\r\n"
+    b"VERSION:2.0\r\n"
+    b"X-WR-CALNAME:FK5031 2018\r\n"
+    b"BEGIN:VTIMEZONE\r\n"
+    b"TZID:Europe/Stockholm\r\n"
+    b"BEGIN:STANDARD\r\n"
+    b"DTSTART:19701025T030000\r\n"
+    b"TZOFFSETFROM:+0200\r\n"
+    b"TZOFFSETTO:+0100\r\n"
+    b"END:STANDARD\r\n"
+    b"END:VTIMEZONE\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART:20181119T080000Z\r\n"
+    b"DTEND:20181119T094500Z\r\n"
+    b"DTSTAMP:20180101T000000Z\r\n"
+    b"SUMMARY:UTC\\, with DTSTART:20181119T080000Z in the text\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART;TZID=Europe/Stockholm:20181231T230000\r\n"
+    b"DTEND;TZID=Europe/Stockholm:20190101T010000\r\n"
+    b"SUMMARY:TZID\\, across new year\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART;VALUE=DATE:20190228\r\n"
+    b"DTEND;VALUE=DATE:20190301\r\n"
+    b"SUMMARY:All day\\, across the end of February\r\n"
+    b"BEGIN:VALARM\r\n"
+    b"TRIGGER;VALUE=DATE-TIME:20190227T120000Z\r\n"
+    b"END:VALARM\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART;X-PARAM=\"a;b:c\";TZID=\"Europe/Stockholm\":20181120T1\r\n"
+    b" 00000\r\n"
+    b"SUMMARY:Quoted parameters\\, folded\r\n"
+    b"DTEND;TZID=Europe/Stockholm:20181120T120000\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART:20181121T080000\r\n"
+    b"DTEND:20181121T100000\n"
+    b"SUMMARY:Floating time\\, LF line ending\r\n"
+    b"END:VEVENT\r\n"
+    b"END:VCALENDAR\r\n")
+
+# SHIFT_INPUT shifted by 366 days, with DTSTAMP 2019-06-01 12:00 UTC
+SHIFT_OUTPUT = (
+    b"BEGIN:VCALENDAR\r\n"
+    b"VERSION:2.0\r\n"
+    b"X-WR-CALNAME:FK5031 2019\r\n"
+    b"BEGIN:VTIMEZONE\r\n"
+    b"TZID:Europe/Stockholm\r\n"
+    b"BEGIN:STANDARD\r\n"
+    b"DTSTART:19701025T030000\r\n"
+    b"TZOFFSETFROM:+0200\r\n"
+    b"TZOFFSETTO:+0100\r\n"
+    b"END:STANDARD\r\n"
+    b"END:VTIMEZONE\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART:20191120T080000Z\r\n"
+    b"DTEND:20191120T094500Z\r\n"
+    b"DTSTAMP:20190601T120000Z\r\n"
+    b"SUMMARY:UTC\\, with DTSTART:20181119T080000Z in the text\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART;TZID=Europe/Stockholm:20200101T230000\r\n"
+    b"DTEND;TZID=Europe/Stockholm:20200102T010000\r\n"
+    b"SUMMARY:TZID\\, across new year\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART;VALUE=DATE:20200229\r\n"
+    b"DTEND;VALUE=DATE:20200301\r\n"
+    b"SUMMARY:All day\\, across the end of February\r\n"
+    b"BEGIN:VALARM\r\n"
+    b"TRIGGER;VALUE=DATE-TIME:20190227T120000Z\r\n"
+    b"END:VALARM\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART;X-PARAM=\"a;b:c\";TZID=\"Europe/Stockholm\":20191121T100000\r\n"
+    b"SUMMARY:Quoted parameters\\, folded\r\n"
+    b"DTEND;TZID=Europe/Stockholm:20191121T120000\r\n"
+    b"END:VEVENT\r\n"
+    b"BEGIN:VEVENT\r\n"
+    b"DTSTART:20191122T080000\r\n"
+    b"DTEND:20191122T100000\n"
+    b"SUMMARY:Floating time\\, LF line ending\r\n"
+    b"END:VEVENT\r\n"
+    b"END:VCALENDAR\r\n")
+
+DTSTAMP = datetime.datetime(2019, 6, 1, 12, 0, 0)
+
+
+def test_find_start():
+    assert icalnewcourse.find_start(SHIFT_INPUT) == datetime.date(2018, 11, 19)
+    assert icalnewcourse.Template(SHIFT_INPUT).start == datetime.date(2018, 11, 19)
+
+
+def test_shift_calendar():
+    """
+    Only the dates of DTSTART, DTEND and DTSTAMP of the events change, on UTC, TZID, all-day and folded
+    values, and all other bytes are kept.
+    """
+    out = io.BytesIO()
+    assert icalnewcourse.shift_calendar(SHIFT_INPUT, out, 366, 2018, 2019, DTSTAMP) == 5
+    assert out.getvalue() == SHIFT_OUTPUT
+
+
+def test_template():
+    """
+    A Template shifts as shift_calendar(), also when it is written several times.
+    """
+    template = icalnewcourse.Template(SHIFT_INPUT)
+    for _ in range(2):
+        out = io.BytesIO()
+        assert template.write(out, 366, 2018, 2019, DTSTAMP) == 5
+        assert out.getvalue() == SHIFT_OUTPUT
+
+
+def test_times_kept():
+    """
+    The events of the shifted calendar keep their times of day and their length.
+    """
+    old = list(icalreader.iter_events(io.BytesIO(SHIFT_INPUT)))
+    new = list(icalreader.iter_events(io.BytesIO(SHIFT_OUTPUT)))
+    assert len(new) == len(old) == 5
+    for a, b in zip(old, new):
+        assert b.dtstart - a.dtstart == datetime.timedelta(days=366)
+        assert b.dtend - b.dtstart == a.dtend - a.dtstart
+
+
+def test_shift_file(tmp_path):
+    """
+    shift_file() from the input file to the output file, starting on the new start date.
+    """
+    fn_in = str(tmp_path / "old.ics")
+    fn_out = str(tmp_path / "new.ics")
+    with open(fn_in, 'wb') as f:
+        f.write(SHIFT_INPUT)
+    assert icalnewcourse.shift_file(fn_in, fn_out, datetime.date(2019, 11, 20), dtstamp=DTSTAMP) == 5
+    with open(fn_out, 'rb') as f:
+        assert f.read() == SHIFT_OUTPUT
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_batch_errors(tmp_path, capsys, caplog, jobs):
+    """
+    Inputs which cannot be shifted are reported, and do not stop the other inputs of the batch.
+    """
+    shutil.copy(os.path.join(DATA, "term.ics"), str(tmp_path / "term.ics"))
+    (tmp_path / "empty.ics").write_bytes(b"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nEND:VCALENDAR\r\n")
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("empty.ics,20.11.2019\n"
+                        "missing.ics,20.11.2019\n"
+                        "term.ics,18.11.2019,term_a.ics\n"
+                        "term.ics,20.01.2020,term_b.ics\n")
+
+    assert icalnewcourse.main(["-m", str(manifest), "-j", str(jobs)]) == 1
+    out, err = capsys.readouterr()
+    assert "2 of 3 files failed" in err
+    assert "No events found in {}".format(tmp_path / "empty.ics") in caplog.text
+    assert "No such file or directory: '{}'".format(tmp_path / "missing.ics") in caplog.text
+    for name in ("term_a.ics", "term_b.ics"):
+        assert "term.ics -> {}: 60 events".format(tmp_path / name) in out
+        assert len(list(icalreader.iter_events(str(tmp_path / name)))) == 60
+    assert not (tmp_path / "empty_20191120.ics").exists()
+
+
+def test_batch(tmp_path):
+    """
+    A batch without errors writes the default output name and exits with status 0.
+    """
+    shutil.copy(os.path.join(DATA, "term.ics"), str(tmp_path / "term.ics"))
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text("term.ics,18.11.2019\n")
+    assert not icalnewcourse.main(["-m", str(manifest), "-j", "1"])
+    assert (tmp_path / "term_20191118.ics").exists()
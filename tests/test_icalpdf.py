@@ -0,0 +1,41 @@
+"""
+Order and layout of the PDF schedule of icalpdf.
+"""
+import os
+
+import clashes
+import icalpdf
+import schedule
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def rows(pages):
+    """
+    Returns the strings of the pages as list of rows, each the strings in one line of the schedule.
+    """
+    out = []
+    for page in pages:
+        row = {}
+        for _, x, y, text in page.strings:
+            row.setdefault(y, []).append(text)
+        out.extend(row[y] for y in sorted(row, reverse=True))
+    return out
+
+
+def test_floating_time():
+    """
+    Times without a time zone are local times, in the PDF as in schedule.py and clashes.py.
+    """
+    _, _, events = icalpdf.read_calendar(os.path.join(DATA, "course.ics"))
+    summaries = [ev.summary for ev in events]
+    # the floating 08:00 lab is before the briefing at 07:30 UTC, 08:30 in Stockholm
+    assert summaries.index("Lab (floating time)") + 1 == summaries.index("Lab safety briefing")
+
+    lab = [row for row in rows(icalpdf.layout("", "", events)) if "Lab (floating time)" in row]
+    assert lab == [["Fri, 22 Nov", "08:00", "10:00", "Lab", "Lab (floating time)"]]
+
+    ev = events[summaries.index("Lab (floating time)")]
+    cl = schedule.lesson_from_event(ev)
+    assert cl.dt_start.strftime("%H:%M %z") == "08:00 +0100"
+    assert clashes._local(ev.dtstart) == cl.dt_start
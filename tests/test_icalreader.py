@@ -0,0 +1,81 @@
+"""
+The streaming iCal reader against a full parse with icalendar, on the sample calendars in data/.
+"""
+import os
+import re
+import glob
+import datetime
+
+import pytest
+
+import icalpdf
+import icalreader
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CALENDARS = sorted(glob.glob(os.path.join(DATA, "*.ics")))
+
+
+def read_icalendar(filename):
+    """
+    Returns the calendar properties and the events of filename, parsed with icalendar.
+    """
+    from icalendar import Calendar
+
+    with open(filename, 'rb') as f:
+        gcal = Calendar.from_ical(f.read())
+    calprops = {name: unescape(value.to_ical().decode()) for name, value in gcal.items()}
+    events = [(str(c.get('SUMMARY', "")), c.decoded('dtstart'), c.decoded('dtend') if 'DTEND' in c else None,
+               str(c['LOCATION']) if 'LOCATION' in c else None,
+               str(c['DESCRIPTION']) if 'DESCRIPTION' in c else None)
+              for c in gcal.walk('VEVENT')]
+    return calprops, events
+
+
+def unescape(text):
+    """
+    Returns the iCal TEXT value text without escapes. icalendar leaves X- properties such as X-WR-CALDESC
+    escaped, so all properties are unescaped from their iCal form.
+    """
+    return re.sub(r"\\([\\;,nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), text)
+
+
+def as_tuples(events):
+    return [(ev.summary, ev.dtstart, ev.dtend, ev.location, ev.description) for ev in events]
+
+
+@pytest.mark.parametrize("filename", CALENDARS)
+def test_events(filename):
+    _, reference = read_icalendar(filename)
+    assert reference
+    assert as_tuples(icalreader.iter_events(filename)) == reference
+
+
+@pytest.mark.parametrize("filename", CALENDARS)
+def test_calprops(filename):
+    reference, _ = read_icalendar(filename)
+    calprops = {}
+    for _ in icalreader.iter_events(filename, calprops=calprops):
+        pass
+    assert calprops == reference
+
+    calname, caldesc, _ = icalpdf.read_calendar(filename)
+    assert calname == reference["X-WR-CALNAME"]
+    assert caldesc == reference["X-WR-CALDESC"]
+
+
+@pytest.mark.parametrize("filename", CALENDARS)
+@pytest.mark.parametrize("first, last", [("18.11.2019", "21.11.2019"), ("25.11.2019", "25.11.2019"),
+                                         ("01.12.2019", "15.01.2020"), ("01.01.2018", "31.12.2018")])
+def test_date_range(filename, first, last):
+    """
+    Events in the range of icalpdf --from first --to last, which includes both dates in local time.
+    """
+    start = datetime.datetime.strptime(first, '%d.%m.%Y').date()
+    end = datetime.datetime.strptime(last, '%d.%m.%Y').date() + datetime.timedelta(days=1)
+    _, reference = read_icalendar(filename)
+    reference = [ev for ev in reference if start <= icalreader.local_date(ev[1]) < end]
+
+    assert as_tuples(icalreader.iter_events(filename, start, end)) == reference
+    _, _, events = icalpdf.read_calendar(filename, start=start, end=end)
+    assert sorted(as_tuples(events), key=lambda ev: icalreader.sort_key(ev[1])) == as_tuples(events)
+    assert sorted(as_tuples(events), key=repr) == sorted(reference, key=repr)
@@ -0,0 +1,71 @@
+"""
+iCal output of athena2xlsx.ICSWriter, read back with icalreader.
+"""
+import os
+import datetime
+
+import athena2xlsx
+import icalreader
+import localtime
+import schedule
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def read_back(filename):
+    calprops = {}
+    events = list(icalreader.iter_events(filename, calprops=calprops))
+    with open(filename, encoding='utf-8') as f:
+        uids = [line.strip()[4:] for line in f if line.startswith("UID:")]
+    return calprops, events, uids
+
+
+def fields(ev):
+    """
+    Returns the fields of the Event ev, with times as local times, so times in UTC, with a TZID or floating
+    compare equal if they are the same time. Dates stay dates.
+    """
+    def local(dt):
+        if isinstance(dt, datetime.datetime):
+            return localtime.to_local(dt)
+        return dt
+
+    return ev.summary, local(ev.dtstart), local(ev.dtend), ev.location, ev.description
+
+
+def test_round_trip(tmp_path):
+    """
+    schedule.py from iCal to iCal keeps the events, the calendar name and the description.
+    """
+    fn_in = os.path.join(DATA, "course.ics")
+    fn_out = str(tmp_path / "course.ics")
+    schedule.convert(fn_in, [("ical", fn_out)])
+
+    calprops_in, events_in, _ = read_back(fn_in)
+    calprops, events, uids = read_back(fn_out)
+    assert calprops["X-WR-CALNAME"] == calprops_in["X-WR-CALNAME"]
+    assert calprops["X-WR-CALDESC"] == calprops_in["X-WR-CALDESC"]
+    assert len(events) == len(events_in)
+    events_in = sorted(events_in, key=lambda ev: (icalreader.sort_key(ev.dtstart), ev.summary))
+    for a, b in zip(events_in, events):
+        assert fields(b) == fields(a)
+        assert type(b.dtstart) is type(a.dtstart)
+        assert type(b.dtend) is type(a.dtend)
+    assert len(set(uids)) == len(uids) == len(events_in)
+
+
+def test_uids(tmp_path):
+    """
+    UIDs come from the course code, or without one from the input file name.
+    """
+    lessons = schedule.read(os.path.join(DATA, "term.ics"))
+
+    def uids(source, course_code=None):
+        fn = str(tmp_path / "out.ics")
+        athena2xlsx.ICSWriter(fn, lessons, course_code=course_code, source=source)
+        return read_back(fn)[2]
+
+    assert uids("a/FK5031.xml") == uids("b/FK5031.xml")
+    assert uids("FK5031.xml") != uids("FK5032.xml")
+    assert uids("FK5031.xml", "FK5031") == uids("FK5032.xml", "FK5031")
+    assert uids("FK5031.xml") != uids("FK5031.xml", "FK5031")
@@ -0,0 +1,88 @@
+"""
+localtime against pytz astimezone() + normalize(), around the DST transitions of Europe/Stockholm.
+"""
+import math
+import datetime
+
+import pytest
+import pytz
+
+import localtime
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def reference(utc_dt):
+    """
+    The former conversion of naive UTC datetimes, with pytz.
+    """
+    return localtime.local_tz.normalize(utc_dt.replace(tzinfo=pytz.utc).astimezone(localtime.local_tz))
+
+
+def utc_times(transition):
+    """
+    Returns naive UTC datetimes every 15 minutes from 3 hours before to 3 hours after transition, in UTC.
+    """
+    return [transition + datetime.timedelta(minutes=15 * k) for k in range(-12, 13)]
+
+
+def same(a, b):
+    return (a, a.utcoffset(), a.tzname()) == (b, b.utcoffset(), b.tzname())
+
+
+# the transitions of 2019 happen at 01:00 UTC: 02:00 CET to 03:00 CEST in March, 03:00 CEST to 02:00 CET
+# in October
+MARCH = datetime.datetime(2019, 3, 31, 1, 0)
+OCTOBER = datetime.datetime(2019, 10, 27, 1, 0)
+
+
+@pytest.mark.parametrize("transition", [MARCH, OCTOBER], ids=["march", "october"])
+def test_transitions(transition):
+    times = utc_times(transition)
+    expected = [reference(t) for t in times]
+    epochs = [(t - EPOCH).total_seconds() for t in times]
+
+    assert all(same(localtime.str_to_local(t.strftime(localtime.DT_STR)), e) for t, e in zip(times, expected))
+    assert all(same(localtime.utc_to_local(t), e) for t, e in zip(times, expected))
+    assert all(same(localtime.utc_to_local(t.replace(tzinfo=datetime.timezone.utc)), e)
+               for t, e in zip(times, expected))
+    assert all(same(localtime.epoch_to_local(s), e) for s, e in zip(epochs, expected))
+    assert all(same(a, e) for a, e in zip(localtime.epochs_to_local(epochs), expected))
+
+
+def test_nonexistent_hour():
+    """
+    No UTC time becomes a local time from 02:00 to 03:00 on the last Sunday of March.
+    """
+    local = [localtime.utc_to_local(t) for t in utc_times(MARCH)]
+    assert not [dt for dt in local if dt.hour == 2]
+    assert local[11].strftime("%H:%M %Z") == "01:45 CET"
+    assert local[12].strftime("%H:%M %Z") == "03:00 CEST"
+
+
+def test_ambiguous_hour():
+    """
+    Local times from 02:00 to 03:00 on the last Sunday of October happen twice, first in summer time.
+    """
+    local = [localtime.utc_to_local(t) for t in utc_times(OCTOBER)]
+    twice = [dt.strftime("%H:%M %Z") for dt in local if dt.hour == 2]
+    assert twice == ["02:00 CEST", "02:15 CEST", "02:30 CEST", "02:45 CEST",
+                     "02:00 CET", "02:15 CET", "02:30 CET", "02:45 CET"]
+    # naive local times are taken as standard time, as pytz localize() does
+    naive = datetime.datetime(2019, 10, 27, 2, 30)
+    assert same(localtime.to_local(naive), localtime.local_tz.localize(naive))
+    assert localtime.to_local(naive).tzname() == "CET"
+
+
+def test_epochs_nan_and_empty():
+    assert localtime.epochs_to_local([]) == []
+    t = (OCTOBER - EPOCH).total_seconds()
+    result = localtime.epochs_to_local([math.nan, t, math.nan])
+    assert result[0] is None and result[2] is None
+    assert same(result[1], reference(OCTOBER))
+
+
+def test_parse():
+    assert localtime.parse("2019-10-27T02:30:00") == datetime.datetime(2019, 10, 27, 2, 30)
+    with pytest.raises(ValueError):
+        localtime.parse("2019-10-27 02:30")
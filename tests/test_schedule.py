@@ -0,0 +1,36 @@
+"""
+Conversions of schedule.py, from iCal to the other formats.
+"""
+import os
+
+import athena2xlsx
+import schedule
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def test_all_day(tmp_path):
+    """
+    All-day events stay all-day lessons, without times, in every output.
+    """
+    lessons = schedule.read(os.path.join(DATA, "course.ics"))
+    study = [cl for cl in lessons if cl.name == "Study day"]
+    assert len(study) == 1 and study[0].all_day
+    assert [cl.name for cl in lessons if cl.all_day] == ["Study day", "Written exam"]
+
+    table = athena2xlsx.LessonTable(reversed(lessons))
+    table.sort()
+    fields = [(cl.name, cl.all_day, cl.dt_start) for cl in lessons]
+    assert [(cl.name, cl.all_day, cl.dt_start) for cl in table] == fields
+
+    fn_txt = str(tmp_path / "out.txt")
+    fn_ics = str(tmp_path / "out.ics")
+    schedule.convert(os.path.join(DATA, "course.ics"), [("text", fn_txt), ("ical", fn_ics)])
+    with open(fn_txt) as f:
+        text = f.read()
+    assert "2019-11-20 Wed                Study day" in text
+    assert "00:00-00:00" not in text
+    with open(fn_ics) as f:
+        ics = f.read()
+    assert "DTSTART;VALUE=DATE:20191120\nDTEND;VALUE=DATE:20191121\n" in ics
+    assert "DTSTART;VALUE=DATE:20191129\nSUMMARY:Written exam\n" in ics
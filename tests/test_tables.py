@@ -0,0 +1,172 @@
+"""
+The numerical engines behind the tables in tables/, against the per-value integrations of
+table_exp_integral.py and table_sievert_integral.py which they replace.
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import special
+from scipy.integrate import quad
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tables"))
+
+from expint import expint, expint_scaled  # noqa: E402
+from sievert import sievert, sievert_grid, sievert_points  # noqa: E402
+from lookup import SievertTable, ExpintTable  # noqa: E402
+from prettyfloat import pretty, pretty_array  # noqa: E402
+from generate import expint_x, parse_values, deg2rad, SIEVERT_B, SIEVERT_DEGREES  # noqa: E402
+
+
+def expint_quad(n, x):
+    """
+    E_n(x) as table_exp_integral.py computed it, one adaptive integration per x.
+    """
+    return quad(lambda t: np.exp(-x * t) / t**n, 1, np.inf, epsrel=1e-10)[0]
+
+
+def expint_scaled_quad(n, x):
+    """
+    Reference for x exp(x) E_n(x) = x int_1^inf exp(-x (t - 1)) / t^n dt, which does not overflow.
+    The integrand is split at t = 1 + 50 / x, where it has dropped by exp(-50).
+    """
+    def f(t):
+        return x * np.exp(-x * (t - 1.0)) / t**n
+
+    t1 = 1.0 + 50.0 / x
+    return quad(f, 1, t1, epsabs=0, epsrel=1e-13, limit=200)[0] + quad(f, t1, np.inf, epsabs=0, epsrel=1e-13)[0]
+
+
+def test_expint():
+    """
+    E_n(x) against scipy.special.expn, for x from 1e-2 to 1e3 and n = 0 .. 5.
+    """
+    x = np.logspace(-2, 3, 501)
+    for n in range(6):
+        ref = special.expn(n, x)
+        ok = ref > 1e-290  # E_n underflows for large x
+        assert np.max(np.abs(expint(n, x[ok]) / ref[ok] - 1.0)) < 1e-13
+        assert expint(n, 1000.0) == 0.0 or n == 0
+
+
+def test_expint_special_values():
+    assert expint(1, 0.0) == np.inf
+    assert expint(3, 0.0) == 0.5
+    assert expint(0, 2.0) == np.exp(-2.0) / 2.0
+    assert expint_scaled(2, 0.0) == 0.0
+    assert expint_scaled(0, 5.0) == 1.0
+    assert expint(np.array([1, 2]), 1.0).shape == (2,)
+
+
+def test_exp_integral_table():
+    """
+    The E_1 and E_2 table of table_exp_integral.py, against the integrations it used before.
+
+    These lose accuracy above x = 5 and give 0 for the scaled form at x = 1000, so there the new values are
+    compared with scipy.special.expn and with the integral of the scaled form instead.
+    """
+    x = expint_x().astype(float)
+    for n in (1, 2):
+        old = np.array([expint_quad(n, xx) for xx in x])
+        new = expint(n, x)
+        low = x <= 5
+        assert np.max(np.abs(new[low] / old[low] - 1.0)) < 1e-9  # quad misses epsrel by a little
+        high = ~low & (x < 700)
+        assert np.max(np.abs(new[high] / special.expn(n, x[high]) - 1.0)) < 1e-13
+
+        scaled = expint_scaled(n, x)
+        assert np.max(np.abs(scaled[low] / (old[low] * x[low] * np.exp(x[low])) - 1.0)) < 1e-9
+        ref = np.array([expint_scaled_quad(n, xx) for xx in x])
+        assert np.max(np.abs(scaled / ref - 1.0)) < 1e-12
+
+
+def sievert_quad(b, theta, **kwargs):
+    """
+    S(b, theta) as table_sievert_integral.py computed it, one adaptive integration per cell.
+    kwargs are passed on to quad, e.g. for tighter tolerances.
+    """
+    return quad(lambda t: np.exp(-b / np.cos(t)), 0, theta, **kwargs)[0]
+
+
+def test_sievert_table():
+    """
+    The table of table_sievert_integral.py, against the integrations it used before, as values and as printed.
+    """
+    bs = parse_values(SIEVERT_B)
+    thetas = deg2rad(parse_values(SIEVERT_DEGREES))
+    values, errors = sievert_grid(bs, thetas)
+    old = np.array([[sievert_quad(b, th) for th in thetas] for b in bs])
+    assert np.max(np.abs(values - old)) < 1e-10
+    assert [[pretty(v, min_digits=6) for v in row] for row in values.tolist()] == \
+        [[pretty(v, min_digits=6) for v in row] for row in old.tolist()]
+    assert np.all(errors < 1e-10)
+
+
+def test_sievert():
+    """
+    sievert_grid and sievert_points against tight integrations, also near pi/2 and on random points.
+    """
+    rng = np.random.default_rng(1)
+    bs = np.concatenate(([0.0, 0.001, 0.01, 0.1, 0.5, 1, 2, 5, 10, 20, 50, 75], rng.uniform(0, 75, 5)))
+    thetas = np.concatenate((np.radians([0, 1, 2.5, 10, 45, 80, 89, 89.9, 90]), rng.uniform(0, np.pi / 2, 5)))
+    ref = np.array([[sievert_quad(b, th, epsabs=0, epsrel=1e-13, limit=500) for th in thetas] for b in bs])
+    tiny = np.maximum(ref, 1e-300)
+
+    values = sievert_grid(bs, thetas)[0]
+    assert np.max(np.abs(values - ref) / tiny) < 1e-10
+    points = sievert_points(bs[:, None], thetas[None, :])
+    assert np.max(np.abs(points - ref) / tiny) < 1e-10
+    assert sievert(0.0, np.pi / 2) == pytest.approx(np.pi / 2, rel=1e-14)
+    with pytest.raises(ValueError):
+        sievert_grid([1.0], [2.0])
+
+
+def test_sievert_lookup(tmp_path):
+    """
+    A SievertTable is built once and loaded from its directory, and interpolates within its tolerance, also
+    where it falls back to direct integration.
+    """
+    table = SievertTable(b_max=20.0, nb=201, ntheta=91, directory=str(tmp_path))
+    assert len(os.listdir(str(tmp_path))) == 2
+    loaded = SievertTable(b_max=20.0, nb=201, ntheta=91, directory=str(tmp_path))
+    assert isinstance(loaded.values, np.memmap)
+    assert np.array_equal(loaded.values, table.values)
+
+    rng = np.random.default_rng(1)
+    b = np.concatenate((rng.uniform(0, 30, 20000), [0.0, 20.0, 25.0]))  # also outside the grid
+    theta = np.concatenate((rng.uniform(0, np.pi / 2, 20000), [np.pi / 2, 0.0, 1.0]))
+    assert np.max(np.abs(loaded(b, theta) - sievert_points(b, theta))) < loaded.tol
+    assert loaded(1.0, 0.5) == pytest.approx(sievert(1.0, 0.5), abs=loaded.tol)
+    with pytest.raises(ValueError):
+        loaded(1.0, -0.1)
+
+
+def test_expint_lookup(tmp_path):
+    """
+    An ExpintTable interpolates E_n and the scaled form within its relative tolerance.
+    """
+    table = ExpintTable(n_max=3, x_min=1e-3, x_max=1e3, nx=1001, directory=str(tmp_path))
+    rng = np.random.default_rng(1)
+    n = rng.integers(1, 5, 20000)  # n = 4 is not in the table
+    x = np.concatenate((np.exp(rng.uniform(np.log(1e-4), np.log(2e3), 19998)), [1e-3, 1e3]))
+    ref = expint(n, x)
+    ok = ref > 1e-300  # E_n underflows for large x
+    assert np.max(np.abs(table(n, x)[ok] / ref[ok] - 1.0)) < table.tol
+    assert np.max(np.abs(table(n, x, scaled=True) / expint_scaled(n, x) - 1.0)) < table.tol
+
+
+@pytest.mark.parametrize("min_digits, exponent", [(4, 2), (6, 2), (3, -1)])
+def test_pretty_array(min_digits, exponent):
+    """
+    pretty_array gives the strings of pretty on each value, over many decades and next to the powers of ten,
+    where the number of digits changes.
+    """
+    rng = np.random.default_rng(1)
+    powers = 10.0**np.arange(-12, 13)
+    x = np.concatenate((10**rng.uniform(-10, 10, 5000) * rng.choice([-1, 1], 5000), [0.0, -1.0, 1.0],
+                        powers, np.nextafter(powers, 0), np.nextafter(powers, np.inf), -powers))
+    expected = [pretty(v, min_digits=min_digits, exponent=exponent) for v in x.tolist()]
+    assert pretty_array(x, min_digits=min_digits, exponent=exponent).tolist() == expected
+    assert pretty_array(x[:5000].reshape(-1, 5), min_digits, exponent).tolist() == \
+        np.reshape(expected[:5000], (-1, 5)).tolist()
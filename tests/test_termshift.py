@@ -0,0 +1,70 @@
+"""
+Mapping of course dates to a new term, with termshift and icalnewcourse --weekdays.
+"""
+import os
+import datetime
+
+import numpy as np
+import pytest
+
+import icalnewcourse
+import icalreader
+import termshift
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+def dates(*days):
+    return termshift.to_days([datetime.date(*d) if d else None for d in days])
+
+
+def test_holidays():
+    assert [termshift.easter(y) for y in (2019, 2020, 2024, 2025)] == [
+        datetime.date(2019, 4, 21), datetime.date(2020, 4, 12), datetime.date(2024, 3, 31), datetime.date(2025, 4, 20)]
+    h = termshift.holidays(2025)
+    assert h[datetime.date(2025, 5, 29)] == "Ascension Day" and h[datetime.date(2025, 6, 20)] == "Midsummer Eve"
+
+
+def test_map_dates():
+    old = dates((2019, 4, 15), (2019, 4, 12), (2019, 4, 13), (2018, 12, 31), None)
+    new = termshift.map_dates(old, datetime.date(2019, 4, 15), datetime.date(2020, 4, 13))
+    # Easter Monday and Good Friday 2020 move to Tuesday, Saturdays are kept unless they are holidays
+    assert [str(d) for d in new] == ["2020-04-14", "2020-04-14", "2020-04-11", "2019-12-30", "NaT"]
+
+
+@pytest.mark.parametrize("new_start, first", [((2019, 11, 18), (2019, 11, 18)), ((2019, 11, 20), (2019, 11, 25)),
+                                              ((2019, 11, 24), (2019, 11, 25)), ((2019, 11, 25), (2019, 11, 25)),
+                                              ((2019, 10, 16), (2019, 10, 21)), ((2019, 9, 1), (2019, 9, 2))])
+def test_map_dates_start(new_start, first):
+    """
+    A course starting on a Monday is moved to the first Monday from new_start on, also if that is not a Monday.
+    """
+    old = dates((2019, 10, 21), (2019, 10, 24), (2019, 10, 28))
+    new = termshift.map_dates(old, datetime.date(2019, 10, 21), datetime.date(*new_start), avoid_holidays=False)
+    assert new[0] == np.datetime64(datetime.date(*first))
+    assert list(termshift.weekday(new)) == [0, 3, 0]
+    assert new[2] - new[0] == np.timedelta64(7, 'D')
+
+
+@pytest.mark.parametrize("weekdays", [False, True])
+def test_icalnewcourse(tmp_path, weekdays):
+    """
+    icalnewcourse on a course which started on Monday 21.10.2019, with a new start on Wednesday 20.11.2019.
+    """
+    fn_in = os.path.join(DATA, "term.ics")
+    fn_out = str(tmp_path / "new.ics")
+    args = [fn_in, "20.11.2019", fn_out] + (["--weekdays"] if weekdays else [])
+    assert not icalnewcourse.main(args)
+
+    old = [icalreader.local_date(ev.dtstart) for ev in icalreader.iter_events(fn_in)]
+    new = [icalreader.local_date(ev.dtstart) for ev in icalreader.iter_events(fn_out)]
+    assert len(new) == len(old)
+    assert min(new) >= datetime.date(2019, 11, 20)
+    if weekdays:
+        # five weeks later, or the next open day after a holiday
+        moved = [o + datetime.timedelta(weeks=5) for o in old]
+        assert min(new) == datetime.date(2019, 11, 25)
+        assert all(n == m or (m in termshift.holidays(m.year) and n > m) for n, m in zip(new, moved))
+        assert any(n != m for n, m in zip(new, moved))
+    else:
+        assert min(new) == datetime.date(2019, 11, 20)